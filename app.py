@@ -1,10 +1,26 @@
 # app.py
+from services.startup_timing import mark_first_render, timed_import
+from services.rerun_profiler import profile_rerun
+from services.memory_report import track_session
+from services.metrics_registry import RERUN_SECONDS, start_exporters
+
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Só a tela de login é importada de início; as demais páginas (e com elas
+# pandas / Firestore) são carregadas na primeira navegação.
+render_login_page = timed_import("ui.login_view").render_login_page
+
+PAGES = {
+    "Home": ("ui.home_view", "render_home_page"),
+    "Cadastrar Lead": ("ui.lead_create_view", "render_lead_create_page"),
+    "Leads (Pipeline)": ("ui.leads_view", "render_leads_page"),
+}
+
 
-from ui.login_view import render_login_page
-from ui.home_view import render_home_page
-from ui.lead_create_view import render_lead_create_page
-from ui.leads_view import render_leads_page
+def _load_page(page: str):
+    module_name, func_name = PAGES[page]
+    return getattr(timed_import(module_name), func_name)
 
 
 st.set_page_config(
@@ -238,8 +254,8 @@ def render_shell():
 
         page = st.radio(
             "Navegação",
-            ["Home", "Cadastrar Lead", "Leads (Pipeline)"],
-            index=["Home", "Cadastrar Lead", "Leads (Pipeline)"].index(st.session_state.page),
+            list(PAGES),
+            index=list(PAGES).index(st.session_state.page),
             label_visibility="collapsed",
         )
         st.session_state.page = page
@@ -274,22 +290,34 @@ def render_shell():
 
     user = st.session_state.user
 
-    if st.session_state.page == "Home":
-        render_home_page(user)
-    elif st.session_state.page == "Cadastrar Lead":
-        render_lead_create_page(user)
-    elif st.session_state.page == "Leads (Pipeline)":
-        render_leads_page(user)
+    _load_page(st.session_state.page)(user)
 
     st.markdown("</div>", unsafe_allow_html=True)
 
 
 def main():
+    # Endpoint/arquivo OpenMetrics, se configurados (services/metrics_registry.py)
+    start_exporters()
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        # Quanto esta sessão guarda (relatório em services/memory_report.py)
+        track_session(ctx.session_id, st.session_state)
+
     user = st.session_state.user
-    if user is None:
-        render_login_page()
-    else:
-        render_shell()
+    # Só perfila com LEAD_SYSTEM_PROFILE_DIR definido (ver services/rerun_profiler.py)
+    with profile_rerun() as tags, RERUN_SECONDS.time(page="Login") as rotulos:
+        if user is None:
+            tags.update(page="Login", role="anonimo")
+            render_login_page()
+            mark_first_render("Login")
+        else:
+            tags.update(page=st.session_state.page, role=user.get("role", "user"))
+            rotulos["page"] = st.session_state.page
+            render_shell()
+            # Página final (a navegação pode ter trocado durante o rerun)
+            tags.update(page=st.session_state.page)
+            rotulos["page"] = st.session_state.page
+            mark_first_render(st.session_state.page)
 
 
 if __name__ == "__main__":
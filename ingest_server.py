@@ -0,0 +1,177 @@
+# ingest_server.py
+"""
+Serviço HTTP (sem UI) para receber leads das integrações.
+
+    python ingest_server.py --port 8600
+
+POST /leads           JSON com um lead ou uma lista de leads.
+                      Header opcional Idempotency-Key (ou campo
+                      "idempotency_key" em cada lead).
+                      202 = aceito para gravação; 429 = fila cheia, tentar
+                      de novo após Retry-After; 400 = nenhum lead válido.
+GET  /leads/<id>      Situação de um lead recebido (queued/created/...).
+GET  /metrics         Contadores, profundidade da fila, vazão, latência,
+                      totais do pipeline (contador distribuído) e
+                      prazos/retentativas/circuit breaker do Firestore.
+GET  /metrics/openmetrics
+                      Latências, leituras/escritas e caches no formato
+                      OpenMetrics (services/metrics_registry.py).
+GET  /healthz
+
+Exige "Authorization: Bearer <token>" com o token de LEAD_INGEST_TOKEN
+(exceto /healthz). Sem token o serviço não sobe, a não ser com --insecure
+(só para testes locais: qualquer um que alcance a porta grava leads).
+"""
+import argparse
+import hmac
+import json
+import os
+import signal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from services.ingest_service import IngestQueue
+from services.leads_service import get_pipeline_totals
+from services.metrics_registry import CONTENT_TYPE, render_openmetrics
+from services.resilience import resilience_metrics
+from services.single_flight import single_flight_metrics
+
+_MAX_BODY_BYTES = 1024 * 1024
+_MAX_LEADS_POR_REQUISICAO = 500
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    ingest: IngestQueue = None
+    token: str = ""
+
+    def log_message(self, format, *args):
+        # Sem log por requisição: em rajada de campanha isso vira gargalo
+        pass
+
+    def _send_json(self, status: int, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self) -> bool:
+        if not self.token:
+            return True
+        recebido = self.headers.get("Authorization", "")
+        return hmac.compare_digest(recebido, f"Bearer {self.token}")
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self._send_json(200, {"ok": True})
+        elif not self._authorized():
+            self._send_json(401, {"error": "Não autorizado."})
+        elif self.path == "/metrics":
+            metricas = self.ingest.metrics_snapshot()
+            try:
+                metricas["pipeline"] = get_pipeline_totals()
+            except Exception as e:
+                metricas["pipeline"] = {"error": str(e)}
+            metricas["firestore"] = resilience_metrics()
+            metricas["single_flight"] = single_flight_metrics()
+            self._send_json(200, metricas)
+        elif self.path == "/metrics/openmetrics":
+            data = render_openmetrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif self.path.startswith("/leads/"):
+            resultado = self.ingest.status(self.path[len("/leads/"):])
+            if resultado is None:
+                self._send_json(404, {"error": "Lead não encontrado entre os recentes."})
+            else:
+                self._send_json(200, resultado)
+        else:
+            self._send_json(404, {"error": "Rota não encontrada."})
+
+    def do_POST(self):
+        if self.path != "/leads":
+            self._send_json(404, {"error": "Rota não encontrada."})
+            return
+        if not self._authorized():
+            self._send_json(401, {"error": "Não autorizado."})
+            return
+
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        if tamanho <= 0 or tamanho > _MAX_BODY_BYTES:
+            self._send_json(413 if tamanho else 400, {"error": "Corpo vazio ou grande demais."})
+            return
+        try:
+            payload = json.loads(self.rfile.read(tamanho))
+        except (ValueError, UnicodeDecodeError):
+            self._send_json(400, {"error": "JSON inválido."})
+            return
+
+        leads = payload if isinstance(payload, list) else [payload]
+        if not leads or len(leads) > _MAX_LEADS_POR_REQUISICAO:
+            self._send_json(
+                400, {"error": f"Envie de 1 a {_MAX_LEADS_POR_REQUISICAO} leads por requisição."}
+            )
+            return
+
+        aceita, itens = self.ingest.submit(leads, self.headers.get("Idempotency-Key"))
+        if not aceita:
+            self._send_json(429, {"error": "Fila cheia.", "items": itens}, {"Retry-After": "1"})
+        elif all(i["status"] == "invalid" for i in itens):
+            self._send_json(400, {"items": itens})
+        else:
+            self._send_json(202, {"items": itens})
+
+
+def _raise_interrupt(*_):
+    # SIGTERM (deploy/restart) segue o mesmo caminho do Ctrl+C
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço HTTP de ingestão de leads.")
+    parser.add_argument("--host", default=os.getenv("LEAD_INGEST_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("LEAD_INGEST_PORT", "8600")))
+    parser.add_argument("--capacity", type=int, default=10_000, help="Tamanho máximo da fila.")
+    parser.add_argument("--batch-size", type=int, default=100, help="Leads por commit.")
+    parser.add_argument("--flush-ms", type=float, default=50.0, help="Espera máxima do lote.")
+    parser.add_argument(
+        "--insecure",
+        action="store_true",
+        help="Aceita requisições sem token (só para testes locais).",
+    )
+    args = parser.parse_args()
+
+    token = os.getenv("LEAD_INGEST_TOKEN", "")
+    if not token and not args.insecure:
+        parser.error("defina LEAD_INGEST_TOKEN (ou use --insecure em testes locais).")
+
+    IngestHandler.ingest = IngestQueue(
+        capacity=args.capacity,
+        batch_size=args.batch_size,
+        flush_interval_s=args.flush_ms / 1000,
+    ).start()
+    IngestHandler.token = token
+
+    server = ThreadingHTTPServer((args.host, args.port), IngestHandler)
+    server.daemon_threads = True
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    print(f"Ingestão de leads ouvindo em http://{args.host}:{args.port}")
+    if not token:
+        print("ATENÇÃO: --insecure, requisições sem autenticação.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        # Grava o que já foi aceito antes de sair
+        IngestHandler.ingest.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# services/archive_service.py
+"""
+Job de arquivamento de leads fechados (faturado/perdido) antigos.
+
+Uso:
+    python -m services.archive_service                # só conta o que seria arquivado
+    python -m services.archive_service --run          # arquiva (padrão: 180 dias)
+    python -m services.archive_service --run --dias 365 --lote 200
+
+Cada lead fechado há mais de N dias (status_changed_at; created_at para
+leads antigos sem esse campo) é copiado para leads_arquivados e removido
+de leads no mesmo batch, junto com a lápide (o snapshot do sync o tira do
+Kanban) e os contadores: o pipeline perde o lead e o contador "arquivo"
+guarda quantidade e valor por status. O histórico de status fica onde
+está (subcoleção), então o funil continua completo.
+
+Os lotes são independentes: interromper o job não deixa nada pela metade
+e rodar de novo continua de onde parou (o que já foi movido não aparece
+mais na consulta).
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from google.api_core.exceptions import Conflict, FailedPrecondition
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from services.leads_service import (
+    ARCHIVE_COUNTER,
+    LEADS_ARCHIVE_COLLECTION,
+    LEADS_COLLECTION,
+    LEADS_TOMBSTONES_COLLECTION,
+    PIPELINE_COUNTER,
+    STATUS_ARQUIVAVEIS,
+    db,
+    get_archive_totals,
+)
+from services.metrics_registry import record_reads, record_writes
+from services.resilience import call_with_deadline, rpc_timeout
+
+DIAS_PADRAO = int(os.getenv("LEAD_SYSTEM_ARCHIVE_AFTER_DAYS", "180"))
+
+# 3 escritas por lead (arquivo, remoção, lápide) + 2 incrementos de contador
+_LOTE_MAX = (500 - 2) // 3
+_LOTE_PADRAO = 100
+
+
+def _valor(lead: Dict) -> float:
+    try:
+        return max(float(lead.get("valor_previsto") or 0), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _candidatos(campo: str, limite: datetime, lote: int, depois=None):
+    q = (
+        db.collection(LEADS_COLLECTION)
+        .where(filter=FieldFilter("status", "in", STATUS_ARQUIVAVEIS))
+        .where(filter=FieldFilter(campo, "<", limite))
+        .order_by(campo)
+    )
+    if depois is not None:
+        q = q.start_after(depois)
+    snaps = list(q.limit(lote).stream(timeout=rpc_timeout()))
+    record_reads(LEADS_COLLECTION, len(snaps))
+    return snaps
+
+
+def _arquivar_lote(snaps: List, agora: datetime) -> int:
+    """Move um lote num único batch (tudo ou nada). Devolve quantos foram movidos."""
+    if not snaps:
+        return 0
+    leads_ref = db.collection(LEADS_COLLECTION)
+    arquivo_ref = db.collection(LEADS_ARCHIVE_COLLECTION)
+    batch = db.batch()
+    pipeline = {"total": -len(snaps)}
+    arquivo: Dict[str, float] = {"total": len(snaps)}
+    for snap in snaps:
+        lead = snap.to_dict()
+        status = lead.get("status")
+        # create: dois jobs simultâneos não arquivam o mesmo lead duas vezes
+        batch.create(arquivo_ref.document(snap.id), {**lead, "archived_at": agora})
+        # Só remove se o lead não mudou desde a consulta: uma mudança de
+        # status ou edição no meio do caminho não é perdida
+        batch.delete(
+            leads_ref.document(snap.id),
+            option=db.write_option(last_update_time=snap.update_time),
+        )
+        batch.set(
+            db.collection(LEADS_TOMBSTONES_COLLECTION).document(snap.id),
+            {"removed_at": agora, "archived": True},
+        )
+        pipeline[status] = pipeline.get(status, 0) - 1
+        arquivo[status] = arquivo.get(status, 0) + 1
+        arquivo[f"valor_{status}"] = arquivo.get(f"valor_{status}", 0.0) + _valor(lead)
+    PIPELINE_COUNTER.stage_increment(batch, pipeline)
+    ARCHIVE_COUNTER.stage_increment(batch, arquivo)
+    record_writes("archive_batch", len(batch))
+    batch.commit(timeout=rpc_timeout())
+    return len(snaps)
+
+
+def archive_closed_leads(
+    dias: int = DIAS_PADRAO,
+    lote: int = _LOTE_PADRAO,
+    max_leads: Optional[int] = None,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """
+    Arquiva leads fechados há mais de `dias` dias, em lotes de até `lote`.
+    Com dry_run só conta. Devolve {"arquivados": n, "conflitos": n}.
+    """
+    lote = max(1, min(lote, _LOTE_MAX))
+    agora = datetime.utcnow()
+    limite = agora - timedelta(days=dias)
+    resultado = {"arquivados": 0, "conflitos": 0}
+
+    def restante() -> int:
+        if max_leads is None:
+            return lote
+        return min(lote, max_leads - resultado["arquivados"])
+
+    def mover(snaps: List) -> None:
+        if dry_run:
+            resultado["arquivados"] += len(snaps)
+            return
+        try:
+            resultado["arquivados"] += call_with_deadline(
+                "archive_batch", _arquivar_lote, snaps, agora, deadline_s=30, retries=0
+            )
+        except (Conflict, FailedPrecondition):
+            # Outro job arquivou parte do lote, ou um lead mudou depois da
+            # consulta; a próxima consulta já vem sem eles ou com o lead atual
+            resultado["conflitos"] += 1
+
+    # 1) Pelo instante do fechamento. Como cada lote sai da coleção, a mesma
+    #    consulta devolve o próximo lote (no dry run avança com cursor).
+    ultimo = None
+    while restante() > 0:
+        snaps = call_with_deadline(
+            "archive_scan", _candidatos, "status_changed_at", limite, restante(),
+            ultimo if dry_run else None,
+        )
+        if not snaps:
+            break
+        mover(snaps)
+        ultimo = snaps[-1]
+        if resultado["conflitos"] > 3:
+            break
+
+    # 2) Leads de antes do status_changed_at existir: pela data de criação,
+    #    com cursor (os que têm status_changed_at recente ficam para trás).
+    ultimo = None
+    while restante() > 0:
+        snaps = call_with_deadline(
+            "archive_scan", _candidatos, "created_at", limite, lote, ultimo
+        )
+        if not snaps:
+            break
+        ultimo = snaps[-1]
+        sem_data = [s for s in snaps if not s.to_dict().get("status_changed_at")]
+        mover(sem_data[: restante()])
+
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arquivamento de leads fechados antigos.")
+    parser.add_argument("--run", action="store_true", help="Arquiva (sem isso, só conta).")
+    parser.add_argument(
+        "--dias", type=int, default=DIAS_PADRAO,
+        help=f"Idade mínima do fechamento, em dias (padrão {DIAS_PADRAO}).",
+    )
+    parser.add_argument(
+        "--lote", type=int, default=_LOTE_PADRAO,
+        help=f"Leads por batch (máximo {_LOTE_MAX}).",
+    )
+    parser.add_argument("--max", type=int, default=None, help="Para depois de N leads.")
+    args = parser.parse_args()
+
+    resultado = archive_closed_leads(args.dias, args.lote, args.max, dry_run=not args.run)
+    if args.run:
+        print(f"{resultado['arquivados']} lead(s) arquivado(s); {resultado['conflitos']} lote(s) em conflito.")
+        print(f"Arquivo: {get_archive_totals(max_age_s=0)}")
+    else:
+        print(f"{resultado['arquivados']} lead(s) seriam arquivados (use --run).")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,18 @@ from datetime import datetime
 import bcrypt
 from typing import Tuple, Optional, Dict
 from services.firebase_init import db
+from services.metrics_registry import LOGIN_ATTEMPTS, LOGIN_FAILURES, record_reads, record_writes, timed
+from services.resilience import FirestoreIndisponivel, call_with_deadline, firestore_call, rpc_timeout
 
-from config.firebase import get_db
-
-db = get_db()
+_MSG_INDISPONIVEL = "Serviço temporariamente indisponível. Tente novamente em instantes."
 
 
+@firestore_call("get_user_by_email")
 def get_user_by_email(email: str):
     """Busca usuário pelo email (ID do documento)."""
     doc_ref = db.collection("usuarios").document(email)
-    doc = doc_ref.get()
+    doc = doc_ref.get(timeout=rpc_timeout())
+    record_reads("usuarios", 1)
     if doc.exists:
         return doc_ref, doc.to_dict()
     return None, None
@@ -20,7 +22,10 @@ def get_user_by_email(email: str):
 
 def create_user(email: str, password: str, nome: str = "") -> Tuple[bool, str]:
     """Cria usuário com senha hasheada."""
-    doc_ref, existing = get_user_by_email(email)
+    try:
+        doc_ref, existing = get_user_by_email(email)
+    except FirestoreIndisponivel:
+        return False, _MSG_INDISPONIVEL
     if existing:
         return False, "Usuário já cadastrado."
 
@@ -30,28 +35,41 @@ def create_user(email: str, password: str, nome: str = "") -> Tuple[bool, str]:
     if not doc_ref:
         doc_ref = db.collection("usuarios").document(email)
 
-    doc_ref.set({
-        "email": email,
-        "nome": nome,
-        "password_hash": password_hash,
-        "role": "user",
-        "created_at": datetime.utcnow(),
-    })
+    try:
+        call_with_deadline("create_user", lambda: doc_ref.set({
+            "email": email,
+            "nome": nome,
+            "password_hash": password_hash,
+            "role": "user",
+            "created_at": datetime.utcnow(),
+        }, timeout=rpc_timeout()), retries=0)
+    except FirestoreIndisponivel:
+        return False, _MSG_INDISPONIVEL
+    record_writes("create_user", 1)
 
     return True, "Usuário criado com sucesso."
 
 
+@timed("check_login")
 def check_login(email: str, password: str) -> Tuple[bool, Optional[Dict]]:
     """Valida email/senha."""
-    _, user_data = get_user_by_email(email)
+    LOGIN_ATTEMPTS.inc()
+    try:
+        _, user_data = get_user_by_email(email)
+    except FirestoreIndisponivel:
+        LOGIN_FAILURES.inc(reason="unavailable")
+        return False, {"error": _MSG_INDISPONIVEL}
     if not user_data:
+        LOGIN_FAILURES.inc(reason="unknown_user")
         return False, {"error": "Usuário não encontrado."}
 
     stored_hash = user_data.get("password_hash")
     if not stored_hash:
+        LOGIN_FAILURES.inc(reason="no_password")
         return False, {"error": "Usuário sem senha configurada."}
 
     if bcrypt.checkpw(password.encode("utf-8"), stored_hash.encode("utf-8")):
         return True, user_data
 
+    LOGIN_FAILURES.inc(reason="wrong_password")
     return False, {"error": "Senha incorreta."}
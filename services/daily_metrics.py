@@ -0,0 +1,267 @@
+# services/daily_metrics.py
+"""
+Métricas diárias para os gráficos de tendência.
+
+Um documento por dia em metricas_diarias (ID = "AAAA-MM-DD"): contagem e
+valor por status no fim do dia (toda a base e por vendedor) e o fluxo do
+dia (leads criados, faturados e perdidos). O gráfico de N dias lê N
+documentos pequenos em vez de varrer a coleção de leads.
+
+Uso (cron diário, perto da meia-noite UTC):
+    python -m services.daily_metrics                  # grava o dia de hoje
+    python -m services.daily_metrics --dia 2026-10-18 # logo após a meia-noite
+
+Os totais por status são sempre os do momento em que o job roda; --dia
+escolhe o documento e o dia do fluxo.
+
+O job carrega a coleção uma vez (um snapshot próprio, sem o arquivo
+local). Enquanto o job não grava o dia corrente, o app grava esse
+documento com parcial=True a partir do snapshot compartilhado e o
+regrava (no máximo a cada _PARCIAL_INTERVALO_S) quando o snapshot muda;
+documento do job (sem "parcial") nunca é sobrescrito pelo app. No
+gráfico o dia de hoje é sempre calculado na hora. Onde agendar o job:
+ver README.md.
+"""
+import argparse
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from google.api_core.exceptions import Conflict, FailedPrecondition
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from services.leads_service import STATUS_PIPELINE, db
+from services.metrics_registry import record_reads, record_writes
+from services.resilience import FirestoreIndisponivel, firestore_call, rpc_timeout
+from services.single_flight import single_flight
+from services.streaming_stats import LeadStats
+
+METRICS_COLLECTION = "metricas_diarias"
+
+# Dias passados não mudam; só o job do fim do dia reescreve o último
+_CACHE_TTL_S = 600.0
+# Intervalo mínimo entre regravações do documento parcial de hoje
+_PARCIAL_INTERVALO_S = 300.0
+
+_CAMPOS_STATUS = ("total", "por_status", "valor_por_status")
+
+
+def _dia_de(valor) -> Optional[date]:
+    if not isinstance(valor, datetime):
+        return None
+    if valor.tzinfo is not None:
+        valor = valor.astimezone(timezone.utc)
+    return valor.date()
+
+
+def _fluxo_vazio() -> Dict[str, float]:
+    return {"criados": 0, "faturados": 0, "perdidos": 0, "valor_faturado": 0.0}
+
+
+def build_daily_metrics(leads: Iterable[Mapping], dia: date) -> Dict:
+    """Documento do dia `dia` a partir dos leads atuais (uma passada)."""
+    stats = LeadStats(STATUS_PIPELINE, sketch_por_vendedor=False)
+    fluxo: Dict[str, Dict[str, float]] = {}
+    for lead in leads:
+        stats.add(lead)
+        vendedor = lead.get("vendedor_email") or ""
+        criado = _dia_de(lead.get("created_at")) == dia
+        fechado = _dia_de(lead.get("status_changed_at")) == dia and lead.get("status") in (
+            "faturado",
+            "perdido",
+        )
+        if not (criado or fechado):
+            continue
+        for chave in ("", vendedor) if vendedor else ("",):
+            f = fluxo.setdefault(chave, _fluxo_vazio())
+            if criado:
+                f["criados"] += 1
+            if fechado and lead["status"] == "faturado":
+                f["faturados"] += 1
+                try:
+                    f["valor_faturado"] += max(float(lead.get("valor_previsto") or 0), 0.0)
+                except (TypeError, ValueError):
+                    pass
+            elif fechado:
+                f["perdidos"] += 1
+
+    resumo = stats.summary()
+    doc = {campo: resumo[campo] for campo in _CAMPOS_STATUS}
+    doc.update(fluxo.get("", _fluxo_vazio()))
+    # Lista, não mapa: emails têm "." e viram caminhos de campo no Firestore
+    doc["por_vendedor"] = [
+        {
+            "email": email,
+            **{campo: r[campo] for campo in _CAMPOS_STATUS},
+            **fluxo.get(email, _fluxo_vazio()),
+        }
+        for email, r in sorted(resumo["por_vendedor"].items())
+        if email
+    ]
+    doc["dia"] = dia.isoformat()
+    doc["gerado_em"] = datetime.utcnow()
+    return doc
+
+
+@firestore_call("write_daily_metrics")
+def write_daily_metrics(doc: Dict) -> None:
+    # set(): rodar de novo no mesmo dia só atualiza o documento
+    db.collection(METRICS_COLLECTION).document(doc["dia"]).set(doc, timeout=rpc_timeout())
+    record_writes("write_daily_metrics", 1)
+
+
+@firestore_call("write_partial_daily_metrics", retries=0)
+def write_partial_daily_metrics(doc: Dict) -> bool:
+    """
+    Grava `doc` com parcial=True, a menos que o job já tenha gravado o dia.
+    Devolve False se o documento do dia já é o final.
+    """
+    ref = db.collection(METRICS_COLLECTION).document(doc["dia"])
+    snap = ref.get(timeout=rpc_timeout())
+    record_reads(METRICS_COLLECTION, 1)
+    if snap.exists and not snap.get("parcial"):
+        return False
+    dados = {**doc, "parcial": True}
+    try:
+        if snap.exists:
+            # Só se o job não gravou entre a leitura e aqui
+            ref.update(
+                dados,
+                option=db.write_option(last_update_time=snap.update_time),
+                timeout=rpc_timeout(),
+            )
+        else:
+            ref.create(dados, timeout=rpc_timeout())
+    except (Conflict, FailedPrecondition):
+        return False
+    record_writes("write_partial_daily_metrics", 1)
+    return True
+
+
+@single_flight("read_daily_metrics")
+@firestore_call("read_daily_metrics")
+def read_daily_metrics(desde: str) -> List[Dict]:
+    """Documentos com dia >= `desde` ("AAAA-MM-DD"), em ordem de dia."""
+    q = (
+        db.collection(METRICS_COLLECTION)
+        .where(filter=FieldFilter("dia", ">=", desde))
+        .order_by("dia")
+    )
+    docs = [d.to_dict() for d in q.stream(timeout=rpc_timeout())]
+    record_reads(METRICS_COLLECTION, len(docs))
+    return docs
+
+
+class _Tendencia:
+    """Dias passados em cache; o de hoje sai do snapshot (refeito quando ele muda)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._desde: Optional[str] = None
+        self._docs: List[Dict] = []
+        self._lido_em = float("-inf")
+        self._atual: Optional[Dict] = None
+        self._atual_chave = None  # (versão do snapshot, dia)
+        self._parcial_chave = None  # _atual_chave do último parcial gravado
+        self._parcial_em = float("-inf")
+        self._final: Optional[str] = None  # dia que o job já gravou
+
+    def _passados(self, desde: str) -> List[Dict]:
+        with self._lock:
+            if self._desde is not None and self._desde <= desde:
+                if time.monotonic() - self._lido_em < _CACHE_TTL_S:
+                    return [d for d in self._docs if d["dia"] >= desde]
+        try:
+            docs = read_daily_metrics(desde)
+        except FirestoreIndisponivel:
+            with self._lock:
+                return [d for d in self._docs if d["dia"] >= desde]
+        with self._lock:
+            self._desde, self._docs, self._lido_em = desde, docs, time.monotonic()
+        return docs
+
+    def trend(self, dias: int) -> List[Dict]:
+        # Import tardio: o job (CLI) não precisa do snapshot compartilhado
+        from services.leads_sync import get_snapshot
+
+        hoje = datetime.utcnow().date()
+        desde = (hoje - timedelta(days=dias - 1)).isoformat()
+        passados = self._passados(desde)
+        snapshot = get_snapshot()
+        with self._lock:
+            if self._atual_chave != (snapshot.version, hoje):
+                self._atual = build_daily_metrics(snapshot.leads(), hoje)
+                self._atual_chave = (snapshot.version, hoje)
+            atual, chave = self._atual, self._atual_chave
+            if any(d["dia"] == atual["dia"] and not d.get("parcial") for d in passados):
+                self._final = atual["dia"]
+            gravar = (
+                self._final != atual["dia"]
+                and self._parcial_chave != chave
+                and time.monotonic() - self._parcial_em >= _PARCIAL_INTERVALO_S
+            )
+            if gravar:
+                # Marca já: outras sessões não gravam o mesmo parcial em paralelo
+                self._parcial_chave, self._parcial_em = chave, time.monotonic()
+
+        if gravar:
+            # O job ainda não rodou hoje: deixa este ponto gravado como parcial
+            try:
+                if not write_partial_daily_metrics(atual):
+                    self._final = atual["dia"]
+            except FirestoreIndisponivel:
+                pass
+        return [d for d in passados if d["dia"] != atual["dia"]] + [atual]
+
+
+_tendencia = _Tendencia()
+
+
+def get_daily_trend(dias: int = 30) -> List[Dict]:
+    """
+    Últimos `dias` documentos diários (dias sem documento ficam de fora),
+    terminando no de hoje, calculado na hora.
+    """
+    return _tendencia.trend(dias)
+
+
+def seller_view(doc: Dict, email: str) -> Dict:
+    """O recorte de um vendedor num documento diário (zeros se não houver)."""
+    for v in doc.get("por_vendedor") or []:
+        if v.get("email") == email:
+            return {**v, "dia": doc["dia"], "parcial": doc.get("parcial", False)}
+    return {
+        "dia": doc["dia"],
+        "parcial": doc.get("parcial", False),
+        "total": 0,
+        "por_status": {s: 0 for s in STATUS_PIPELINE},
+        "valor_por_status": {s: 0.0 for s in STATUS_PIPELINE},
+        **_fluxo_vazio(),
+    }
+
+
+def main():
+    from services.leads_sync import LeadsSnapshot
+
+    parser = argparse.ArgumentParser(description="Grava as métricas diárias dos leads.")
+    parser.add_argument(
+        "--dia", default=None, help="Dia (AAAA-MM-DD, UTC) do documento; padrão: hoje."
+    )
+    args = parser.parse_args()
+    dia = date.fromisoformat(args.dia) if args.dia else datetime.utcnow().date()
+
+    snapshot = LeadsSnapshot()
+    snapshot.sync(force=True)
+    if snapshot.last_error:
+        raise SystemExit(f"Firestore indisponível: {snapshot.last_error}")
+    doc = build_daily_metrics(snapshot.leads(), dia)
+    write_daily_metrics(doc)
+    print(
+        f"{doc['dia']}: {doc['total']} leads, {doc['criados']} criados, "
+        f"{doc['faturados']} faturados, {doc['perdidos']} perdidos."
+    )
+
+
+if __name__ == "__main__":
+    main()
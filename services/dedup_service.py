@@ -0,0 +1,183 @@
+# services/dedup_service.py
+"""
+Job de deduplicação de leads já cadastrados.
+
+Uso:
+    python -m services.dedup_service                 # só lista os clusters
+    python -m services.dedup_service --rebuild-index # recria o leads_index
+    python -m services.dedup_service --merge         # mescla cada cluster
+
+Os totais do pipeline são recalculados pelo services/pipeline_totals.py.
+"""
+import argparse
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from services.leads_service import (
+    LEADS_COLLECTION,
+    LEADS_INDEX_COLLECTION,
+    LEADS_TOMBSTONES_COLLECTION,
+    PIPELINE_COUNTER,
+    STATUS_PIPELINE,
+    db,
+    dedup_keys,
+)
+
+# Limite de operações por batch do Firestore
+_BATCH_LIMIT = 500
+
+
+def _load_leads() -> List[Dict]:
+    leads = []
+    for d in db.collection(LEADS_COLLECTION).stream():
+        data = d.to_dict()
+        data["id"] = d.id
+        leads.append(data)
+    return leads
+
+
+def find_duplicate_clusters() -> List[List[Dict]]:
+    """
+    Varre a coleção uma única vez e agrupa leads que compartilham email ou
+    telefone normalizado (union-find: A~B por email e B~C por telefone
+    formam um único cluster). Cada cluster vem ordenado do mais antigo
+    para o mais novo.
+    """
+    leads = _load_leads()
+    parent = list(range(len(leads)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    dono_da_chave = {}
+    for i, lead in enumerate(leads):
+        for key in dedup_keys(lead.get("email"), lead.get("telefone")):
+            j = dono_da_chave.setdefault(key, i)
+            if j != i:
+                parent[find(i)] = find(j)
+
+    grupos: Dict[int, List[Dict]] = {}
+    for i, lead in enumerate(leads):
+        grupos.setdefault(find(i), []).append(lead)
+
+    clusters = [g for g in grupos.values() if len(g) > 1]
+    for g in clusters:
+        g.sort(key=lambda l: str(l.get("created_at") or ""))
+    return clusters
+
+
+def merge_leads(principal_id: str, duplicados_ids: List[str]) -> Tuple[bool, str]:
+    """
+    Mescla os duplicados no lead principal: campos vazios do principal são
+    preenchidos, observações são concatenadas, fica o maior valor previsto.
+    Os duplicados são removidos e o índice passa a apontar para o principal.
+    """
+    duplicados_ids = [i for i in duplicados_ids if i != principal_id]
+    if not duplicados_ids:
+        return False, "Nenhum duplicado para mesclar."
+
+    leads_ref = db.collection(LEADS_COLLECTION)
+    refs = [leads_ref.document(i) for i in [principal_id] + duplicados_ids]
+    snaps = list(db.get_all(refs))
+    por_id = {s.id: s.to_dict() for s in snaps if s.exists}
+    principal = por_id.get(principal_id)
+    if principal is None:
+        return False, "Lead principal não encontrado."
+
+    duplicados = [(i, por_id[i]) for i in duplicados_ids if i in por_id]
+    campos = {}
+    observacoes = [principal.get("observacoes") or ""]
+    maior_valor = principal.get("valor_previsto")
+    for _, dup in duplicados:
+        for campo in ("nome", "email", "telefone", "origem", "vendedor_email"):
+            if not principal.get(campo) and not campos.get(campo) and dup.get(campo):
+                campos[campo] = dup[campo]
+        if dup.get("observacoes"):
+            observacoes.append(dup["observacoes"])
+        try:
+            if float(dup.get("valor_previsto") or 0) > float(maior_valor or 0):
+                maior_valor = dup.get("valor_previsto")
+        except (TypeError, ValueError):
+            pass
+
+    campos["observacoes"] = "\n---\n".join(o for o in observacoes if o)
+    campos["valor_previsto"] = maior_valor
+    campos["merged_ids"] = sorted(
+        set((principal.get("merged_ids") or []) + [i for i, _ in duplicados])
+    )
+    agora = datetime.utcnow()
+    campos["updated_at"] = agora
+
+    batch = db.batch()
+    batch.update(leads_ref.document(principal_id), campos)
+    deltas = {"total": -len(duplicados)}
+    for _, dup in duplicados:
+        if dup.get("status") in STATUS_PIPELINE:
+            deltas[dup["status"]] = deltas.get(dup["status"], 0) - 1
+    PIPELINE_COUNTER.stage_increment(batch, deltas)
+    for dup_id, dup in duplicados:
+        batch.delete(leads_ref.document(dup_id))
+        batch.set(
+            db.collection(LEADS_TOMBSTONES_COLLECTION).document(dup_id),
+            {"removed_at": agora, "merged_into": principal_id},
+        )
+        for key in dedup_keys(dup.get("email"), dup.get("telefone")):
+            batch.set(
+                db.collection(LEADS_INDEX_COLLECTION).document(key),
+                {"lead_id": principal_id},
+                merge=True,
+            )
+    batch.commit()
+
+    return True, f"{len(duplicados)} lead(s) mesclado(s) em {principal_id}."
+
+
+def rebuild_index() -> int:
+    """Recria o leads_index a partir dos leads existentes (o mais antigo vence)."""
+    leads = sorted(_load_leads(), key=lambda l: str(l.get("created_at") or ""))
+    vistos = set()
+    batch = db.batch()
+    pendentes = 0
+    for lead in leads:
+        for key in dedup_keys(lead.get("email"), lead.get("telefone")):
+            if key in vistos:
+                continue
+            vistos.add(key)
+            batch.set(
+                db.collection(LEADS_INDEX_COLLECTION).document(key),
+                {"lead_id": lead["id"], "created_at": lead.get("created_at")},
+            )
+            pendentes += 1
+            if pendentes == _BATCH_LIMIT:
+                batch.commit()
+                batch = db.batch()
+                pendentes = 0
+    if pendentes:
+        batch.commit()
+    return len(vistos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicação de leads.")
+    parser.add_argument("--merge", action="store_true", help="Mescla cada cluster no lead mais antigo.")
+    parser.add_argument("--rebuild-index", action="store_true", help="Recria o índice de email/telefone.")
+    args = parser.parse_args()
+
+    if args.rebuild_index:
+        print(f"Índice recriado com {rebuild_index()} chaves.")
+
+    clusters = find_duplicate_clusters()
+    print(f"{len(clusters)} cluster(s) de leads duplicados.")
+    for cluster in clusters:
+        principal, *duplicados = cluster
+        print(f"- {principal['id']} ({principal.get('nome')}) <- {[d['id'] for d in duplicados]}")
+        if args.merge:
+            ok, msg = merge_leads(principal["id"], [d["id"] for d in duplicados])
+            print(f"  {msg}")
+
+
+if __name__ == "__main__":
+    main()
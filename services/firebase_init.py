@@ -1,14 +1,13 @@
 # services/firebase_init.py
 import os
 import json
-import firebase_admin
-from firebase_admin import credentials, firestore
+import threading
 
 try:
     import streamlit as st
 except ImportError:
     st = None  # permite rodar sem streamlit (ex.: testes)
-    
+
 
 def _load_cred_dict():
     # 1) Tenta via variável de ambiente FIREBASE_CREDENTIALS (produção / Docker / Render)
@@ -36,10 +35,42 @@ def _load_cred_dict():
         return json.load(f)
 
 
-# Inicializa o Firebase uma única vez
-if not firebase_admin._apps:
-    cred_dict = _load_cred_dict()
-    cred = credentials.Certificate(cred_dict)
-    firebase_admin.initialize_app(cred)
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_db():
+    """
+    Cliente Firestore, criado só no primeiro uso. Importar este módulo não
+    carrega firebase_admin nem lê credenciais, para a tela de login abrir
+    sem pagar esse custo.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import firebase_admin
+                from firebase_admin import credentials, firestore
+
+                # Inicializa o Firebase uma única vez
+                if not firebase_admin._apps:
+                    cred = credentials.Certificate(_load_cred_dict())
+                    firebase_admin.initialize_app(cred)
+                _client = firestore.client()
+    return _client
+
+
+def set_db(client) -> None:
+    """Substitui o cliente (ex.: Firestore falso no harness de carga)."""
+    global _client
+    _client = client
+
+
+class _LazyClient:
+    """Repassa tudo para o cliente real, criado no primeiro acesso."""
+
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
 
-db = firestore.client()
+db = _LazyClient()
@@ -0,0 +1,253 @@
+# services/followup_service.py
+"""
+Leads parados e lembretes de follow-up por vendedor.
+
+Um lead em aberto está parado quando passou PRAZOS_DIAS[status] sem
+nenhuma atualização (updated_at). find_stale_leads() encontra esses leads
+com consultas de intervalo em updated_at por status (índices em
+firestore.indexes.json), sem varrer a coleção.
+
+FollowUpScheduler mantém um heap com o próximo vencimento de cada lead
+acompanhado. A cada _RECARGA_S ele é recarregado com consultas por
+status, trazendo os leads que vencem até _JANELA_S à frente; entre uma
+recarga e outra, update_lead_status/update_lead_fields avisam o
+scheduler (touch) e só aquele lead é reagendado. Quando o vencimento
+chega, o lead vira lembrete do seu vendedor até ser atualizado.
+"""
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from google.cloud.firestore_v1 import Query
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from services.leads_service import LEADS_COLLECTION, db
+from services.metrics_registry import record_reads
+from services.resilience import FirestoreIndisponivel, firestore_call, rpc_timeout
+
+# Dias sem atualização até o lead precisar de follow-up, por etapa aberta
+PRAZOS_DIAS = {"novo": 2, "atendimento": 5, "negociacao": 7}
+
+_RECARGA_S = 15 * 60
+# Vencimentos até esse horizonte entram no heap; > _RECARGA_S para que
+# nada vença entre duas recargas sem estar agendado
+_JANELA_S = 60 * 60
+# Por status e por ponta (mais antigos / mais recentes), na recarga
+_MAX_POR_STATUS = 2000
+
+_CAMPOS = ["nome", "status", "vendedor_email", "updated_at"]
+
+
+def _utc(valor) -> Optional[datetime]:
+    """updated_at como datetime UTC sem fuso (o Firestore devolve com fuso)."""
+    if not isinstance(valor, datetime):
+        return None
+    if valor.tzinfo is None:
+        return valor
+    return valor.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@firestore_call("find_stale_leads")
+def find_stale_leads(
+    status: str,
+    vendedor_email: Optional[str] = None,
+    antes_de: Optional[datetime] = None,
+    limit: int = 200,
+    recentes_primeiro: bool = False,
+) -> List[Dict]:
+    """
+    Leads em `status` sem atualização desde `antes_de` (padrão: agora menos
+    o prazo do status), do mais parado para o mais recente, ou o contrário
+    com recentes_primeiro.
+    """
+    if antes_de is None:
+        antes_de = datetime.utcnow() - timedelta(days=PRAZOS_DIAS[status])
+    q = db.collection(LEADS_COLLECTION).where(filter=FieldFilter("status", "==", status))
+    if vendedor_email:
+        q = q.where(filter=FieldFilter("vendedor_email", "==", vendedor_email))
+    q = (
+        q.where(filter=FieldFilter("updated_at", "<", antes_de))
+        .order_by("updated_at", direction=Query.DESCENDING if recentes_primeiro else Query.ASCENDING)
+        .select(_CAMPOS)
+        .limit(limit)
+    )
+    leads = []
+    for doc in q.stream(timeout=rpc_timeout()):
+        data = doc.to_dict()
+        data["id"] = doc.id
+        leads.append(data)
+    record_reads(LEADS_COLLECTION, len(leads))
+    return leads
+
+
+class _Item:
+    __slots__ = ("lead_id", "nome", "status", "vendedor_email", "updated_at", "vence_em", "seq")
+
+    def __init__(self, lead_id, nome, status, vendedor_email, updated_at, seq):
+        self.lead_id = lead_id
+        self.nome = nome
+        self.status = status
+        self.vendedor_email = vendedor_email or ""
+        self.updated_at = updated_at
+        self.vence_em = updated_at + timedelta(days=PRAZOS_DIAS[status])
+        self.seq = seq
+
+    def lembrete(self, agora: datetime) -> Dict:
+        return {
+            "lead_id": self.lead_id,
+            "nome": self.nome,
+            "status": self.status,
+            "vendedor_email": self.vendedor_email,
+            "parado_dias": (agora - self.updated_at).days,
+            "vencido_em": self.vence_em,
+        }
+
+
+class FollowUpScheduler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._agenda: Dict[str, _Item] = {}  # lead_id -> item válido
+        self._heap: List[Tuple[datetime, int, str]] = []  # (vence_em, seq, lead_id)
+        self._vencidos: Dict[str, Dict[str, _Item]] = {}  # vendedor -> lead_id -> item
+        self._carregado_em = float("-inf")
+        # touch durante uma recarga: reaplicados depois dela (a consulta pode
+        # ter lido o lead antes da gravação)
+        self._durante_recarga: Optional[Dict[str, Tuple]] = None
+        self.last_error: Optional[str] = None
+
+    # ---------- agenda (sempre sob self._lock) ----------
+
+    def _agendar(self, lead_id: str, nome, status: str, vendedor_email, updated_at: datetime) -> None:
+        item = _Item(lead_id, nome, status, vendedor_email, updated_at, next(self._seq))
+        self._agenda[lead_id] = item
+        heapq.heappush(self._heap, (item.vence_em, item.seq, lead_id))
+
+    def _desagendar(self, lead_id: str) -> Optional[_Item]:
+        # A entrada no heap fica para trás e é descartada ao sair (seq não bate)
+        item = self._agenda.pop(lead_id, None)
+        if item is not None:
+            self._vencidos.get(item.vendedor_email, {}).pop(lead_id, None)
+        return item
+
+    def _vencer(self, agora: datetime) -> None:
+        """Move para os lembretes tudo que venceu até agora."""
+        heap = self._heap
+        while heap and heap[0][0] <= agora:
+            _, seq, lead_id = heapq.heappop(heap)
+            item = self._agenda.get(lead_id)
+            if item is None or item.seq != seq:
+                continue
+            self._vencidos.setdefault(item.vendedor_email, {})[lead_id] = item
+
+    # ---------- carga ----------
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Recarrega do Firestore a cada _RECARGA_S, com duas consultas por
+        status: os mais parados e os que vencem por último (recém-vencidos e
+        os que vencem até o horizonte). Só a primeira, com limite, deixaria
+        de fora justamente os que acabaram de vencer quando há mais de
+        _MAX_POR_STATUS leads parados.
+        """
+        with self._lock:
+            if not force and time.monotonic() - self._carregado_em < _RECARGA_S:
+                return
+            # Marca já: outras sessões não disparam a mesma recarga em paralelo
+            self._carregado_em = time.monotonic()
+            self._durante_recarga = {}
+
+        agora = datetime.utcnow()
+        horizonte = agora + timedelta(seconds=_JANELA_S)
+        try:
+            por_status = {}
+            for status, dias in PRAZOS_DIAS.items():
+                antes_de = horizonte - timedelta(days=dias)
+                antigos = find_stale_leads(status, antes_de=antes_de, limit=_MAX_POR_STATUS)
+                if len(antigos) < _MAX_POR_STATUS:
+                    por_status[status] = antigos
+                    continue
+                recentes = find_stale_leads(
+                    status, antes_de=antes_de, limit=_MAX_POR_STATUS, recentes_primeiro=True
+                )
+                por_status[status] = list({l["id"]: l for l in antigos + recentes}.values())
+        except FirestoreIndisponivel as e:
+            # Segue com a agenda atual; os touch continuam valendo
+            self.last_error = str(e)
+            with self._lock:
+                self._durante_recarga = None
+            return
+        self.last_error = None
+
+        with self._lock:
+            self._agenda, self._heap, self._vencidos = {}, [], {}
+            for status, leads in por_status.items():
+                for lead in leads:
+                    updated_at = _utc(lead.get("updated_at"))
+                    if updated_at is not None:
+                        self._agendar(
+                            lead["id"], lead.get("nome"), status, lead.get("vendedor_email"), updated_at
+                        )
+            tocados, self._durante_recarga = self._durante_recarga or {}, None
+            for lead_id, dados in tocados.items():
+                self._touch_locked(lead_id, *dados)
+            self._vencer(agora)
+
+    # ---------- consultas e avisos ----------
+
+    def touch(
+        self,
+        lead_id: str,
+        status: Optional[str] = None,
+        vendedor_email: Optional[str] = None,
+        nome: Optional[str] = None,
+        agora: Optional[datetime] = None,
+    ) -> None:
+        """
+        O lead acabou de ser atualizado: reagenda a partir de agora. Sem
+        status, mantém o que a agenda conhecia (se não conhecia, o lead está
+        longe de vencer e nada muda).
+        """
+        agora = agora or datetime.utcnow()
+        with self._lock:
+            self._touch_locked(lead_id, status, vendedor_email, nome, agora)
+            if self._durante_recarga is not None:
+                self._durante_recarga[lead_id] = (status, vendedor_email, nome, agora)
+
+    def _touch_locked(self, lead_id, status, vendedor_email, nome, agora) -> None:
+        anterior = self._desagendar(lead_id)
+        if anterior is not None:
+            status = status or anterior.status
+            vendedor_email = vendedor_email or anterior.vendedor_email
+            nome = nome or anterior.nome
+        if status in PRAZOS_DIAS:
+            self._agendar(lead_id, nome, status, vendedor_email, agora)
+
+    def reminders(self, vendedor_email: Optional[str] = None) -> List[Dict]:
+        """Lembretes vencidos (de um vendedor ou de todos), do mais parado ao menos."""
+        agora = datetime.utcnow()
+        with self._lock:
+            self._vencer(agora)
+            if vendedor_email is None:
+                itens = [i for grupo in self._vencidos.values() for i in grupo.values()]
+            else:
+                itens = list(self._vencidos.get(vendedor_email, {}).values())
+        itens.sort(key=lambda i: i.updated_at)
+        return [i.lembrete(agora) for i in itens]
+
+
+_scheduler = FollowUpScheduler()
+
+
+def get_followup_scheduler() -> FollowUpScheduler:
+    """Scheduler do processo, recarregado do Firestore a cada _RECARGA_S."""
+    _scheduler.refresh()
+    return _scheduler
+
+
+def note_lead_touched(lead_id: str, **dados) -> None:
+    """Chamado pelo leads_service depois de gravar: reagenda só este lead."""
+    _scheduler.touch(lead_id, **dados)
@@ -0,0 +1,204 @@
+# services/funnel_analytics.py
+"""
+Velocidade do funil: tempo médio em cada etapa e conversão etapa -> etapa.
+
+O agregado fica em um único documento (analytics/funil_velocidade) junto
+com o watermark do último evento de status já processado. Cada chamada de
+fold_new_events() lê apenas os eventos novos do histórico (até _MAX_PAGES
+páginas) e soma no agregado, gravando-o a cada página, sem nunca
+reprocessar o histórico inteiro.
+
+Requer o índice de collection group em status_history.at
+(ver firestore.indexes.json).
+
+get_funnel_aggregate() guarda o agregado no processo por _AGREGADO_TTL_S:
+a home não faz RPC a cada rerun. Vencido o prazo, devolve o que tem e
+dispara uma passada em background (uma por vez); só a primeira chamada
+do processo espera a passada. Se o Firestore não responder, segue com o
+último agregado calculado.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+
+from google.api_core.exceptions import Conflict, FailedPrecondition
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from services.leads_service import (
+    STATUS_HISTORY_SUBCOLLECTION,
+    STATUS_PIPELINE,
+    db,
+)
+from services.resilience import FirestoreIndisponivel, firestore_call, rpc_timeout
+
+ANALYTICS_COLLECTION = "analytics"
+FUNNEL_DOC = "funil_velocidade"
+
+# Eventos mais novos que isso ainda podem chegar fora de ordem (relógio de
+# outro servidor); ficam para a próxima passada.
+_FOLD_LAG = timedelta(seconds=30)
+_PAGE_SIZE = 500
+# Páginas por chamada de fold_new_events; o resto fica para a próxima
+_MAX_PAGES = 10
+
+# Por quanto tempo o agregado em memória vale sem nova passada
+_AGREGADO_TTL_S = 60.0
+
+_lock = threading.Lock()
+_ultimo_agregado: Dict = {}
+_agregado_em = float("-inf")
+_dobrando = False
+
+
+def _empty_aggregate() -> Dict:
+    return {
+        "watermark": None,
+        "watermark_ids": [],
+        "estagios": {
+            s: {"dwell_total_s": 0.0, "dwell_count": 0, "entradas": 0, "saidas": 0}
+            for s in STATUS_PIPELINE
+        },
+        "transicoes": {s: {} for s in STATUS_PIPELINE},
+    }
+
+
+def fold_events(agg: Dict, eventos: Iterable[Dict]) -> Dict:
+    """Soma eventos de status no agregado (in-place). Não mexe no watermark."""
+    estagios = agg["estagios"]
+    transicoes = agg["transicoes"]
+    for ev in eventos:
+        de, para = ev.get("de"), ev.get("para")
+        if para in estagios:
+            estagios[para]["entradas"] += 1
+        if de not in estagios:
+            continue
+        estagios[de]["saidas"] += 1
+        if ev.get("dwell_s") is not None:
+            estagios[de]["dwell_total_s"] += float(ev["dwell_s"])
+            estagios[de]["dwell_count"] += 1
+        if para:
+            transicoes[de][para] = transicoes[de].get(para, 0) + 1
+    return agg
+
+
+@firestore_call("fold_new_events", deadline_s=15)
+def fold_new_events() -> Dict:
+    """
+    Processa os eventos posteriores ao watermark e persiste o agregado a
+    cada página. No máximo _MAX_PAGES páginas por chamada: um atraso grande
+    (primeira execução, backfill) é recuperado ao longo de várias chamadas,
+    sem perder o que já foi somado se uma delas estourar o prazo.
+    """
+    ref = db.collection(ANALYTICS_COLLECTION).document(FUNNEL_DOC)
+    snap = ref.get(timeout=rpc_timeout())
+    agg = snap.to_dict() if snap.exists else _empty_aggregate()
+    update_time = snap.update_time if snap.exists else None
+
+    query = db.collection_group(STATUS_HISTORY_SUBCOLLECTION).where(
+        filter=FieldFilter("at", "<=", datetime.utcnow() - _FOLD_LAG)
+    )
+    if agg.get("watermark") is not None:
+        # >= + ids já vistos: eventos com o mesmo timestamp não se perdem
+        query = query.where(filter=FieldFilter("at", ">=", agg["watermark"]))
+    query = query.order_by("at").limit(_PAGE_SIZE)
+
+    ja_vistos = set(agg.get("watermark_ids") or [])
+    cursor = None
+    for _ in range(_MAX_PAGES):
+        page = list((query.start_after(cursor) if cursor else query).stream(timeout=rpc_timeout()))
+        eventos = []
+        for doc in page:
+            if doc.id in ja_vistos:
+                continue
+            ev = doc.to_dict()
+            eventos.append(ev)
+            if ev["at"] != agg.get("watermark"):
+                agg["watermark"] = ev["at"]
+                ja_vistos = set()
+            ja_vistos.add(doc.id)
+
+        if eventos:
+            fold_events(agg, eventos)
+            agg["watermark_ids"] = sorted(ja_vistos)
+            try:
+                if update_time is not None:
+                    # Só grava se ninguém atualizou o agregado desde a leitura
+                    resultado = ref.update(
+                        agg,
+                        option=db.write_option(last_update_time=update_time),
+                        timeout=rpc_timeout(),
+                    )
+                else:
+                    resultado = ref.create(agg, timeout=rpc_timeout())
+            except (Conflict, FailedPrecondition):
+                # Outra sessão processou os mesmos eventos; o agregado em memória
+                # continua correto para exibição e a próxima passada relê do banco.
+                return agg
+            update_time = resultado.update_time
+
+        if len(page) < _PAGE_SIZE:
+            break
+        cursor = page[-1]
+    return agg
+
+
+def _dobrar() -> None:
+    global _ultimo_agregado, _agregado_em, _dobrando
+    agg = None
+    try:
+        agg = fold_new_events()
+    except FirestoreIndisponivel:
+        pass
+    finally:
+        with _lock:
+            if agg is not None:
+                _ultimo_agregado = agg
+            # Também na falha: a próxima tentativa espera o TTL
+            _agregado_em = time.monotonic()
+            _dobrando = False
+
+
+def get_funnel_aggregate() -> Dict:
+    """Agregado ("estagios" e "transicoes") com até _AGREGADO_TTL_S de atraso."""
+    global _dobrando
+    with _lock:
+        disparar = not _dobrando and time.monotonic() - _agregado_em >= _AGREGADO_TTL_S
+        if disparar:
+            _dobrando = True
+        primeira = not _ultimo_agregado
+    if disparar:
+        if primeira:
+            _dobrar()
+        else:
+            threading.Thread(target=_dobrar, name="funnel-fold", daemon=True).start()
+    return _ultimo_agregado or _empty_aggregate()
+
+
+def get_funnel_velocity() -> List[Dict]:
+    """
+    Uma linha por etapa: tempo médio na etapa (dias), quantos leads saíram
+    dela, % que avançou para a etapa seguinte e % que foi para perdido.
+    """
+    agg = get_funnel_aggregate()
+    linhas = []
+    for idx, status in enumerate(STATUS_PIPELINE):
+        if status in ("faturado", "perdido"):
+            continue
+        est = agg["estagios"].get(status, {})
+        trans = agg["transicoes"].get(status, {})
+        saidas = est.get("saidas", 0)
+        proximo = STATUS_PIPELINE[idx + 1]
+        dwell_count = est.get("dwell_count", 0)
+        linhas.append(
+            {
+                "etapa": status,
+                "tempo_medio_dias": (
+                    est.get("dwell_total_s", 0.0) / dwell_count / 86400 if dwell_count else 0.0
+                ),
+                "saidas": saidas,
+                "conversao_proxima": (trans.get(proximo, 0) / saidas * 100) if saidas else 0.0,
+                "perda": (trans.get("perdido", 0) / saidas * 100) if saidas else 0.0,
+            }
+        )
+    return linhas
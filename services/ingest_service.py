@@ -0,0 +1,355 @@
+# services/ingest_service.py
+"""
+Fila de ingestão de leads vindos de integrações (landing pages, bot de
+WhatsApp), usada pelo ingest_server.py.
+
+Os leads são validados, entram numa fila em memória de tamanho limitado e
+uma thread grava em lote via create_leads_batch. Fila cheia = rejeição
+imediata (o cliente tenta de novo depois), em vez de acumular sem limite.
+Com chave de idempotência, o ID do lead é derivado da chave: reenviar o
+mesmo lead nunca cria um segundo documento.
+
+O cliente já recebeu 202 pelos leads da fila: um lote que falha ao gravar
+(prazo, circuit breaker, erro transitório) volta para a fila com backoff
+exponencial. Regravar é seguro (IDs determinísticos e índice gravado com
+create). Depois de _MAX_TENTATIVAS o lead fica com status "failed".
+"""
+import hashlib
+import heapq
+import itertools
+import logging
+import math
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from services.leads_service import (
+    MSG_JA_RECEBIDO,
+    MSG_VENDEDOR_NAO_ENCONTRADO,
+    STATUS_PIPELINE,
+    create_leads_batch,
+)
+
+logger = logging.getLogger(__name__)
+
+_CAMPOS_TEXTO = ("nome", "email", "telefone", "vendedor_email", "origem", "observacoes")
+
+_MAX_TENTATIVAS = 6
+_BACKOFF_BASE_S = 0.5
+_BACKOFF_MAX_S = 30.0
+
+
+def validate_lead(payload) -> Tuple[Optional[Dict], List[str]]:
+    """Valida um lead recebido em JSON. Retorna (lead normalizado, erros)."""
+    if not isinstance(payload, dict):
+        return None, ["Cada lead deve ser um objeto JSON."]
+
+    erros = []
+    lead = {}
+    for campo in _CAMPOS_TEXTO:
+        valor = payload.get(campo)
+        if valor is not None and not isinstance(valor, str):
+            erros.append(f"'{campo}' deve ser texto.")
+            continue
+        lead[campo] = (valor or "").strip() or None
+
+    if not lead.get("nome"):
+        erros.append("'nome' é obrigatório.")
+    if not lead.get("vendedor_email") or "@" not in lead["vendedor_email"]:
+        erros.append("'vendedor_email' é obrigatório e deve ser um email.")
+    if lead.get("email") and "@" not in lead["email"]:
+        erros.append("'email' inválido.")
+    if not lead.get("email") and not lead.get("telefone"):
+        erros.append("Informe 'email' ou 'telefone'.")
+
+    valor = payload.get("valor_previsto")
+    if valor is not None:
+        try:
+            valor = float(valor)
+            # nan/inf passariam no "< 0" e contaminariam contadores e somas
+            if not math.isfinite(valor) or valor < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            erros.append("'valor_previsto' deve ser um número >= 0.")
+            valor = None
+    lead["valor_previsto"] = valor
+
+    status = payload.get("status") or "novo"
+    if status not in STATUS_PIPELINE:
+        erros.append(f"'status' deve ser um de {STATUS_PIPELINE}.")
+    lead["status"] = status
+
+    chave = payload.get("idempotency_key")
+    if chave is not None and not isinstance(chave, str):
+        erros.append("'idempotency_key' deve ser texto.")
+        chave = None
+    lead["idempotency_key"] = chave
+
+    return (None if erros else lead), erros
+
+
+def lead_id_for_key(idempotency_key: str) -> str:
+    """ID de documento estável para uma chave de idempotência."""
+    return "ing_" + hashlib.sha1(idempotency_key.encode("utf-8")).hexdigest()[:24]
+
+
+class IngestMetrics:
+    """Contadores e latências da ingestão (enfileirado -> gravado)."""
+
+    def __init__(self, janela: int = 4096):
+        self._lock = threading.Lock()
+        self.counters = {
+            "received": 0,
+            "accepted": 0,
+            "invalid": 0,
+            "rejected_backpressure": 0,
+            "duplicate_key": 0,
+            "written": 0,
+            "already_received": 0,
+            "duplicate_contact": 0,
+            "unknown_seller": 0,
+            "write_errors": 0,
+            "write_retries": 0,
+            "failed": 0,
+            "batches": 0,
+        }
+        self._latencias_ms = deque(maxlen=janela)
+        self._gravacoes = deque(maxlen=janela)  # (timestamp, qtd)
+        self._batch_sizes = deque(maxlen=256)
+
+    def inc(self, nome: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[nome] += n
+
+    def record_batch(self, latencias_ms: List[float]) -> None:
+        with self._lock:
+            self.counters["batches"] += 1
+            self._latencias_ms.extend(latencias_ms)
+            self._gravacoes.append((time.monotonic(), len(latencias_ms)))
+            self._batch_sizes.append(len(latencias_ms))
+
+    def snapshot(self, queue_depth: int, queue_capacity: int) -> Dict:
+        with self._lock:
+            latencias = sorted(self._latencias_ms)
+            agora = time.monotonic()
+            ultimo_minuto = sum(n for t, n in self._gravacoes if agora - t <= 60)
+            batch_sizes = list(self._batch_sizes)
+            counters = dict(self.counters)
+
+        def pct(p: float) -> float:
+            if not latencias:
+                return 0.0
+            return latencias[min(len(latencias) - 1, int(p * len(latencias)))]
+
+        return {
+            **counters,
+            "queue_depth": queue_depth,
+            "queue_capacity": queue_capacity,
+            "throughput_per_s_1m": ultimo_minuto / 60.0,
+            "avg_batch_size": sum(batch_sizes) / len(batch_sizes) if batch_sizes else 0.0,
+            "latency_ms_p50": pct(0.50),
+            "latency_ms_p95": pct(0.95),
+            "latency_ms_p99": pct(0.99),
+        }
+
+
+class IngestQueue:
+    """
+    Fila limitada + thread que grava em lote. Um lote é gravado quando
+    atinge batch_size leads ou quando o mais antigo espera flush_interval_s.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 10_000,
+        batch_size: int = 100,
+        flush_interval_s: float = 0.05,
+        resultados_recentes: int = 50_000,
+    ):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.metrics = IngestMetrics()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=capacity)
+        self._submit_lock = threading.Lock()
+        # lead_id -> status do processamento (consultável pelo cliente)
+        self._resultados: "OrderedDict[str, Dict]" = OrderedDict()
+        self._max_resultados = resultados_recentes
+        # Lotes que falharam: (pode tentar em, seq, tentativas, lote)
+        self._retentativas: List[Tuple[float, int, int, List]] = []
+        # Leads nos lotes de _retentativas: ocupam capacidade como os da fila
+        self._em_retentativa = 0
+        self._seq = itertools.count()
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="lead-ingest", daemon=True)
+
+    def start(self) -> "IngestQueue":
+        self._worker.start()
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Para de aceitar e grava o que ainda está na fila."""
+        self._stop.set()
+        self._worker.join(timeout)
+
+    def depth(self) -> int:
+        """Leads aguardando gravação: na fila e nos lotes em retentativa."""
+        return self._queue.qsize() + self._em_retentativa
+
+    def status(self, lead_id: str) -> Optional[Dict]:
+        with self._submit_lock:
+            return self._resultados.get(lead_id)
+
+    def _remember(self, lead_id: str, resultado: Dict) -> None:
+        self._resultados[lead_id] = resultado
+        self._resultados.move_to_end(lead_id)
+        while len(self._resultados) > self._max_resultados:
+            self._resultados.popitem(last=False)
+
+    def submit(
+        self,
+        payloads: List,
+        idempotency_key: Optional[str] = None,
+    ) -> Tuple[bool, List[Dict]]:
+        """
+        Valida e enfileira uma requisição (um ou vários leads).
+        Retorna (aceita, itens); aceita=False quando a fila está cheia e
+        nada foi enfileirado.
+        """
+        self.metrics.inc("received", len(payloads))
+        itens = []
+        validos = []
+        for idx, payload in enumerate(payloads):
+            lead, erros = validate_lead(payload)
+            if lead is None:
+                self.metrics.inc("invalid")
+                itens.append({"index": idx, "status": "invalid", "errors": erros})
+                continue
+            chave = lead.pop("idempotency_key")
+            if chave is None and idempotency_key is not None:
+                chave = idempotency_key if len(payloads) == 1 else f"{idempotency_key}:{idx}"
+            lead["lead_id"] = lead_id_for_key(chave) if chave else uuid.uuid4().hex[:20]
+            itens.append({"index": idx, "id": lead["lead_id"]})
+            validos.append((itens[-1], lead))
+
+        with self._submit_lock:
+            novos = []
+            vistos = set()
+            for item, lead in validos:
+                anterior = self._resultados.get(lead["lead_id"])
+                # Falha definitiva libera a chave: o cliente pode reenviar
+                ja_existe = anterior is not None and anterior["status"] != "failed"
+                if ja_existe or lead["lead_id"] in vistos:
+                    self.metrics.inc("duplicate_key")
+                    item["status"] = "duplicate_key"
+                else:
+                    vistos.add(lead["lead_id"])
+                    novos.append((item, lead))
+
+            if self._stop.is_set() or self.depth() + len(novos) > self.capacity:
+                self.metrics.inc("rejected_backpressure", len(novos))
+                for item, _ in novos:
+                    item["status"] = "rejected"
+                return False, itens
+
+            enfileirado_em = time.monotonic()
+            for item, lead in novos:
+                self._queue.put_nowait((enfileirado_em, lead))
+                self._remember(lead["lead_id"], {"status": "queued"})
+                item["status"] = "accepted"
+            self.metrics.inc("accepted", len(novos))
+
+        return True, itens
+
+    def _next_batch(self) -> List[Tuple[float, Dict]]:
+        try:
+            primeiro = self._queue.get(timeout=0.2)
+        except queue.Empty:
+            return []
+        lote = [primeiro]
+        prazo = time.monotonic() + self.flush_interval_s
+        while len(lote) < self.batch_size:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._queue.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._queue.empty() and not self._retentativas):
+            if self._retentativas and self._retentativas[0][0] <= time.monotonic():
+                _, _, tentativas, lote = heapq.heappop(self._retentativas)
+                with self._submit_lock:
+                    self._em_retentativa -= len(lote)
+                self._flush(lote, tentativas)
+                continue
+            lote = self._next_batch()
+            if lote:
+                self._flush(lote)
+
+    def _flush(self, lote: List[Tuple[float, Dict]], tentativas: int = 0) -> None:
+        leads = [lead for _, lead in lote]
+        try:
+            resultados = create_leads_batch(leads)
+        except Exception as e:
+            self._retry(lote, tentativas + 1, e)
+            return
+
+        agora = time.monotonic()
+        self.metrics.record_batch([(agora - t) * 1000 for t, _ in lote])
+        with self._submit_lock:
+            for lead, (ok, msg, lead_id) in zip(leads, resultados):
+                if ok and msg == MSG_JA_RECEBIDO:
+                    self.metrics.inc("already_received")
+                    status = "already_received"
+                elif ok:
+                    self.metrics.inc("written")
+                    status = "created"
+                elif msg == MSG_VENDEDOR_NAO_ENCONTRADO:
+                    self.metrics.inc("unknown_seller")
+                    status = "unknown_seller"
+                else:
+                    self.metrics.inc("duplicate_contact")
+                    status = "duplicate_contact"
+                self._remember(
+                    lead["lead_id"],
+                    {"status": status, "message": msg, "existing_id": None if ok else lead_id},
+                )
+
+    def _retry(self, lote: List[Tuple[float, Dict]], tentativas: int, erro: Exception) -> None:
+        """Reagenda o lote com backoff; esgotadas as tentativas, marca "failed"."""
+        self.metrics.inc("write_errors", len(lote))
+        if tentativas >= _MAX_TENTATIVAS:
+            self.metrics.inc("failed", len(lote))
+            logger.error(
+                "Lote de %d leads descartado após %d tentativas: %s", len(lote), tentativas, erro
+            )
+            with self._submit_lock:
+                for _, lead in lote:
+                    self._remember(
+                        lead["lead_id"], {"status": "failed", "message": f"Erro ao gravar: {erro}"}
+                    )
+            return
+
+        self.metrics.inc("write_retries", len(lote))
+        espera = min(_BACKOFF_BASE_S * 2 ** (tentativas - 1), _BACKOFF_MAX_S)
+        logger.warning(
+            "Erro ao gravar lote de %d leads (tentativa %d), nova tentativa em %.1fs: %s",
+            len(lote), tentativas, espera, erro,
+        )
+        pode_em = time.monotonic() + espera * random.uniform(0.5, 1.5)
+        heapq.heappush(self._retentativas, (pode_em, next(self._seq), tentativas, lote))
+        with self._submit_lock:
+            self._em_retentativa += len(lote)
+            for _, lead in lote:
+                self._remember(lead["lead_id"], {"status": "queued", "attempts": tentativas})
+
+    def metrics_snapshot(self) -> Dict:
+        return self.metrics.snapshot(self.depth(), self.capacity)
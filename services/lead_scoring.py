@@ -0,0 +1,248 @@
+# services/lead_scoring.py
+"""
+Score de prioridade dos leads (0 a 100): quem o vendedor deve chamar primeiro.
+
+Combina, com pesos fixos:
+- valor previsto (escala log, relativo ao p95 dos valores da base);
+- taxa histórica de conversão da origem (faturado / fechados, suavizada
+  pela taxa geral para origens com poucos leads fechados);
+- frescor: lead recém-criado vale mais (meia-vida de _MEIA_VIDA_DIAS);
+- tempo parado: quanto mais tempo sem atualização, mais urgente.
+
+As colunas (valor, origem, status, datas) ficam em arrays NumPy e são
+atualizadas só nas linhas dos leads que mudaram no snapshot; o score da
+base inteira é uma única conta vetorizada sobre esses arrays.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from services.leads_service import STATUS_PIPELINE
+from services.leads_sync import get_snapshot
+
+PESOS = {"valor": 0.35, "conversao": 0.35, "frescor": 0.15, "parado": 0.15}
+_MEIA_VIDA_DIAS = 14.0
+_ESCALA_PARADO_DIAS = 3.0
+# Quantos leads fechados "valem" a taxa geral ao suavizar a taxa da origem
+_SUAVIZACAO = 5.0
+# Scores dependem do relógio (idade, tempo parado): refaz a conta após isso
+_SCORE_TTL_S = 60.0
+
+_STATUS_IDX = {s: i for i, s in enumerate(STATUS_PIPELINE)}
+_FATURADO = _STATUS_IDX["faturado"]
+_PERDIDO = _STATUS_IDX["perdido"]
+_DIA_S = 86400.0
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch(valor) -> float:
+    if not isinstance(valor, datetime):
+        return np.nan
+    if valor.tzinfo is None:
+        # Datas gravadas com utcnow() chegam sem fuso (são UTC)
+        return (valor - _EPOCH).total_seconds()
+    return valor.timestamp()
+
+
+def normalize_origem(valor) -> str:
+    """Origem como chave de agrupamento: sem espaços nas pontas e minúscula."""
+    return (valor or "").strip().lower()
+
+
+def _valor(lead: Dict) -> float:
+    valor = lead.get("valor_previsto")
+    if not valor:
+        return 0.0
+    try:
+        return max(float(valor), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def conversion_rates(origem: np.ndarray, status: np.ndarray, n_origens: int) -> np.ndarray:
+    """Taxa de conversão suavizada por código de origem."""
+    ganhos = np.bincount(origem[status == _FATURADO], minlength=n_origens)
+    perdas = np.bincount(origem[status == _PERDIDO], minlength=n_origens)
+    fechados = ganhos + perdas
+    total = fechados.sum()
+    geral = ganhos.sum() / total if total else 0.5
+    return (ganhos + _SUAVIZACAO * geral) / (fechados + _SUAVIZACAO)
+
+
+def compute_scores(
+    valor: np.ndarray,
+    taxa_origem: np.ndarray,
+    created: np.ndarray,
+    updated: np.ndarray,
+    agora: float,
+) -> np.ndarray:
+    """Score vetorizado; `created`/`updated` em epoch (NaN = sem data)."""
+    positivos = valor[valor > 0]
+    teto = np.log1p(np.percentile(positivos, 95)) if positivos.size else 1.0
+    f_valor = np.minimum(np.log1p(valor) / teto, 1.0)
+
+    idade = np.maximum(agora - created, 0.0) / _DIA_S
+    f_frescor = np.nan_to_num(0.5 ** (idade / _MEIA_VIDA_DIAS), nan=0.0)
+
+    ultima = np.where(np.isnan(updated), created, updated)
+    parado = np.maximum(agora - ultima, 0.0) / _DIA_S
+    f_parado = np.nan_to_num(1.0 - np.exp(-parado / _ESCALA_PARADO_DIAS), nan=1.0)
+
+    return 100.0 * (
+        PESOS["valor"] * f_valor
+        + PESOS["conversao"] * taxa_origem
+        + PESOS["frescor"] * f_frescor
+        + PESOS["parado"] * f_parado
+    )
+
+
+class LeadScorer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = -1
+        self._reset()
+
+    def _reset(self) -> None:
+        self._row: Dict[str, int] = {}
+        self._fonte: List[Dict] = []  # dict do snapshot de cada linha
+        self._origem_idx: Dict[str, int] = {}
+        self._vendedor_idx: Dict[str, int] = {}
+        self.valor = np.zeros(0)
+        self.origem = np.zeros(0, dtype=np.intp)
+        self.vendedor = np.zeros(0, dtype=np.intp)
+        self.status = np.zeros(0, dtype=np.intp)
+        self.created = np.zeros(0)
+        self.updated = np.zeros(0)
+        self._scores = np.zeros(0)
+        self._scores_em = 0.0
+
+    def _linha(self, lead: Dict):
+        origem = normalize_origem(lead.get("origem"))
+        if origem not in self._origem_idx:
+            self._origem_idx[origem] = len(self._origem_idx)
+        vendedor = lead.get("vendedor_email") or ""
+        if vendedor not in self._vendedor_idx:
+            self._vendedor_idx[vendedor] = len(self._vendedor_idx)
+        return (
+            _valor(lead),
+            self._origem_idx[origem],
+            self._vendedor_idx[vendedor],
+            _STATUS_IDX.get(lead.get("status"), -1),
+            _epoch(lead.get("created_at")),
+            _epoch(lead.get("updated_at")),
+        )
+
+    def _refresh(self, leads: List[Dict]) -> int:
+        """Atualiza só as linhas de leads novos/alterados. Retorna quantas mudaram."""
+        row, fonte = self._row, self._fonte
+        if not row:
+            alterados = leads
+        elif len({l["id"] for l in leads} & row.keys()) == len(row):
+            alterados = [l for l in leads if l["id"] not in row or fonte[row[l["id"]]] is not l]
+        else:
+            # Houve remoção: recomeça (raro; leads saem só por merge/arquivo)
+            self._reset()
+            alterados = leads
+        if not alterados:
+            return 0
+
+        novos = []
+        for lead in alterados:
+            linha = self._linha(lead)
+            i = self._row.get(lead["id"])
+            if i is None:
+                novos.append((lead, linha))
+                continue
+            self._fonte[i] = lead
+            (self.valor[i], self.origem[i], self.vendedor[i], self.status[i],
+             self.created[i], self.updated[i]) = linha
+
+        if novos:
+            base = len(self._fonte)
+            for j, (lead, _) in enumerate(novos):
+                self._row[lead["id"]] = base + j
+                self._fonte.append(lead)
+            colunas = list(zip(*(linha for _, linha in novos)))
+            self.valor = np.concatenate([self.valor, np.array(colunas[0], dtype=float)])
+            self.origem = np.concatenate([self.origem, np.array(colunas[1], dtype=np.intp)])
+            self.vendedor = np.concatenate([self.vendedor, np.array(colunas[2], dtype=np.intp)])
+            self.status = np.concatenate([self.status, np.array(colunas[3], dtype=np.intp)])
+            self.created = np.concatenate([self.created, np.array(colunas[4], dtype=float)])
+            self.updated = np.concatenate([self.updated, np.array(colunas[5], dtype=float)])
+        return len(alterados)
+
+    def _recompute(self) -> None:
+        agora = time.time()
+        taxas = conversion_rates(self.origem, self.status, len(self._origem_idx))
+        self._scores = compute_scores(
+            self.valor, taxas[self.origem], self.created, self.updated, agora
+        )
+        self._scores_em = time.monotonic()
+
+    def sync(self, snapshot) -> None:
+        """Acompanha o snapshot: relê só os leads alterados desde a última versão."""
+        with self._lock:
+            mudou = False
+            if snapshot.version != self._version:
+                mudou = self._refresh(snapshot.leads()) > 0
+                self._version = snapshot.version
+            vencido = time.monotonic() - self._scores_em > _SCORE_TTL_S
+            if mudou or vencido or len(self._scores) != len(self._fonte):
+                self._recompute()
+
+    def columns(self) -> Dict:
+        """
+        Cópia das colunas para outros cálculos vetorizados (ex.: previsão de
+        faturamento). "vendedores" traduz o código da coluna vendedor em email.
+        """
+        with self._lock:
+            return {
+                "version": self._version,
+                "valor": self.valor.copy(),
+                "origem": self.origem.copy(),
+                "vendedor": self.vendedor.copy(),
+                "status": self.status.copy(),
+                "n_origens": len(self._origem_idx),
+                "vendedores": list(self._vendedor_idx),
+            }
+
+    def score_of(self, lead_id: str) -> Optional[float]:
+        i = self._row.get(lead_id)
+        scores = self._scores
+        return float(scores[i]) if i is not None and i < len(scores) else None
+
+    def sort_leads(self, leads: Iterable[Dict]) -> List[Dict]:
+        """Ordena por score decrescente (leads fora do snapshot vão para o fim)."""
+        return sorted(leads, key=lambda l: -(self.score_of(l.get("id")) or 0.0))
+
+    def top(
+        self,
+        status: Optional[str] = None,
+        vendedor_email: Optional[str] = None,
+        k: int = 5,
+    ) -> List[Dict]:
+        """Os k leads de maior score com os filtros dados."""
+        with self._lock:
+            mascara = np.ones(len(self._fonte), dtype=bool)
+            if status:
+                mascara &= self.status == _STATUS_IDX.get(status, -2)
+            if vendedor_email:
+                mascara &= self.vendedor == self._vendedor_idx.get(vendedor_email, -1)
+            candidatos = np.flatnonzero(mascara)
+            if len(candidatos) > k:
+                parte = np.argpartition(-self._scores[candidatos], k)[:k]
+                candidatos = candidatos[parte]
+            ordem = candidatos[np.argsort(-self._scores[candidatos], kind="stable")]
+            return [self._fonte[i] for i in ordem]
+
+
+_scorer = LeadScorer()
+
+
+def get_lead_scorer() -> LeadScorer:
+    """Scorer do processo, em dia com o snapshot de leads."""
+    _scorer.sync(get_snapshot())
+    return _scorer
@@ -1,17 +1,126 @@
 # services/leads_service.py
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
-from config.firebase import get_db
+import hashlib
+import math
+import re
+from datetime import datetime, timezone
+from typing import Iterable, List, Dict, Optional, Tuple
+from google.api_core.exceptions import Conflict, FailedPrecondition
 from google.cloud.firestore_v1.base_query import FieldFilter
 from services.firebase_init import db
+from services.metrics_registry import record_reads, record_writes
+from services.resilience import (
+    FirestoreIndisponivel,
+    GravacaoIncerta,
+    call_with_deadline,
+    firestore_call,
+    rpc_timeout,
+)
+from services.seller_directory import get_seller_directory
+from services.single_flight import single_flight
+from services.sharded_counter import ShardedCounter
+from services.streaming_stats import LeadStats
 
 
-db = get_db()
-
 LEADS_COLLECTION = "leads"
 
+# Índice de deduplicação: um doc por email/telefone normalizado (ID = hash),
+# apontando para o lead dono daquele contato. Lookup O(1) por get_all.
+LEADS_INDEX_COLLECTION = "leads_index"
+
+# Lápides de leads removidos (ex: mesclados na deduplicação), para que o
+# sync incremental (services/leads_sync.py) saiba o que tirar do snapshot.
+LEADS_TOMBSTONES_COLLECTION = "leads_removidos"
+
+# Histórico append-only de mudanças de status (subcoleção de cada lead).
+# Consultado via collection_group pelo services/funnel_analytics.py.
+STATUS_HISTORY_SUBCOLLECTION = "status_history"
+
+# Leads fechados (faturado/perdido) antigos, movidos pelo
+# services/archive_service.py. Kanban e dashboards leem só a coleção
+# "quente" (leads); histórico e exportações pedem o arquivo explicitamente.
+LEADS_ARCHIVE_COLLECTION = "leads_arquivados"
+STATUS_ARQUIVAVEIS = ["faturado", "perdido"]
+
 STATUS_PIPELINE = ["novo", "atendimento", "negociacao", "faturado", "perdido"]
 
+# Totais do pipeline ("total" e um campo por status), atualizados no mesmo
+# batch de cada cadastro/mudança de status.
+PIPELINE_COUNTER = ShardedCounter("pipeline")
+
+# O que saiu do pipeline para o arquivo: "total", um campo por status e
+# "valor_<status>" (soma do valor previsto), gravados no batch que arquiva.
+ARCHIVE_COUNTER = ShardedCounter("arquivo", cache_ttl_s=60)
+
+
+def _naive_utc(valor: Optional[datetime]) -> Optional[datetime]:
+    """O Firestore devolve datetimes com tz; o app grava utcnow() sem tz."""
+    if valor is None or valor.tzinfo is None:
+        return valor
+    return valor.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _status_event(
+    lead_id: str,
+    lead: Dict,
+    de: Optional[str],
+    para: str,
+    agora: datetime,
+) -> Dict:
+    """Evento do histórico de status, com o tempo que o lead ficou na etapa anterior."""
+    desde = _naive_utc(lead.get("status_changed_at") or lead.get("created_at"))
+    dwell_s = (agora - desde).total_seconds() if de and desde else None
+    return {
+        "lead_id": lead_id,
+        "de": de,
+        "para": para,
+        "at": agora,
+        "dwell_s": dwell_s,
+        "vendedor_email": lead.get("vendedor_email"),
+        "origem": lead.get("origem"),
+    }
+
+
+# ================== NORMALIZAÇÃO / DEDUPLICAÇÃO ==================
+
+
+def normalize_email(email: Optional[str]) -> str:
+    """Email em minúsculas e sem espaços; vazio se não parecer um email."""
+    email = (email or "").strip().lower()
+    return email if "@" in email else ""
+
+
+def normalize_phone(telefone: Optional[str]) -> str:
+    """
+    Telefone só com dígitos, no formato nacional (DDD + número).
+    Remove +55 / 0055 e o zero de operadora/tronco (ex: 011...).
+    """
+    digitos = re.sub(r"\D", "", telefone or "")
+    if digitos.startswith("00"):
+        digitos = digitos[2:]
+    if digitos.startswith("55") and len(digitos) in (12, 13):
+        digitos = digitos[2:]
+    if digitos.startswith("0") and len(digitos) in (11, 12):
+        digitos = digitos[1:]
+    return digitos if len(digitos) >= 8 else ""
+
+
+def dedup_keys(email: Optional[str], telefone: Optional[str]) -> List[str]:
+    """IDs dos docs de índice (hash do contato normalizado) de um lead."""
+    keys = []
+    email_norm = normalize_email(email)
+    if email_norm:
+        keys.append("email_" + hashlib.sha1(email_norm.encode("utf-8")).hexdigest())
+    tel_norm = normalize_phone(telefone)
+    if tel_norm:
+        keys.append("tel_" + hashlib.sha1(tel_norm.encode("utf-8")).hexdigest())
+    return keys
+
+
+def _index_ref(key: str):
+    return db.collection(LEADS_INDEX_COLLECTION).document(key)
+
+
+# ================== CRUD ==================
 
 
 def create_lead(
@@ -23,113 +132,463 @@ def create_lead(
     origem: Optional[str] = None,
     observacoes: Optional[str] = None,
     status: str = "novo",
+    permitir_duplicado: bool = False,
 ) -> Tuple[bool, str]:
 
-    if status not in STATUS_PIPELINE:
-        status = "novo"
+    try:
+        ok, msg, _ = create_leads_batch(
+            [
+                {
+                    "nome": nome,
+                    "email": email,
+                    "telefone": telefone,
+                    "vendedor_email": vendedor_email,
+                    "valor_previsto": valor_previsto,
+                    "origem": origem,
+                    "observacoes": observacoes,
+                    "status": status,
+                    "permitir_duplicado": permitir_duplicado,
+                }
+            ]
+        )[0]
+    except GravacaoIncerta:
+        return False, MSG_GRAVACAO_INCERTA
+    except FirestoreIndisponivel:
+        return False, "Não foi possível salvar agora (Firestore indisponível). Tente novamente."
+    return ok, msg
+
+
+# Cada lead ocupa até 4 operações no batch (lead, histórico, 2 índices),
+# mais uma por commit para o contador; o Firestore aceita no máximo 500.
+_OPS_PER_LEAD = 4
+_MAX_LEADS_PER_COMMIT = (500 - 1) // _OPS_PER_LEAD
+
+_MSG_DUPLICADO = "Já existe um lead com este email/telefone."
+MSG_JA_RECEBIDO = "Lead já recebido."
+MSG_GRAVACAO_INCERTA = (
+    "O Firestore não respondeu a tempo e a gravação pode ter sido feita. "
+    "Confira na lista de leads antes de tentar de novo."
+)
+MSG_LEAD_ALTERADO = "O lead foi alterado em outra sessão. Atualize a página e tente de novo."
+MSG_VENDEDOR_NAO_ENCONTRADO = "Vendedor não encontrado. Escolha um usuário cadastrado."
+
+
+def _stage_new_lead(batch, doc_ref, data: Dict, index_keys: List[str], idempotente: bool):
+    """Adiciona ao batch o lead, o evento inicial do histórico e o índice."""
+    if idempotente:
+        batch.create(doc_ref, data)
+    else:
+        batch.set(doc_ref, data)
+    batch.set(
+        doc_ref.collection(STATUS_HISTORY_SUBCOLLECTION).document(),
+        _status_event(doc_ref.id, data, None, data["status"], data["created_at"]),
+    )
+    # create() falha se o doc de índice já existir: protege contra dois
+    # cadastros simultâneos do mesmo contato passarem pela checagem prévia.
+    for key in index_keys:
+        batch.create(_index_ref(key), {"lead_id": doc_ref.id, "created_at": data["created_at"]})
+
 
-    doc_ref = db.collection(LEADS_COLLECTION).document()
-    doc_ref.set(
-        {
-            "nome": nome,
-            "email": email,
-            "telefone": telefone,
-            "vendedor_email": vendedor_email,
-            "valor_previsto": valor_previsto,
-            "origem": origem,
-            "observacoes": observacoes,
+def _pipeline_deltas(datas: Iterable[Dict]) -> Dict[str, int]:
+    deltas = {"total": 0}
+    for data in datas:
+        deltas["total"] += 1
+        deltas[data["status"]] = deltas.get(data["status"], 0) + 1
+    return deltas
+
+
+@firestore_call("create_leads_batch", deadline_s=20, retries=0)
+def create_leads_batch(leads: List[Dict]) -> List[Tuple[bool, str, Optional[str]]]:
+    """
+    Cria vários leads com uma única leitura de deduplicação (get_all) e
+    commits em lote. Cada item aceita os parâmetros do create_lead e,
+    opcionalmente, "lead_id": um ID determinístico (ex.: derivado de uma
+    chave de idempotência) que torna o reenvio do mesmo lead inofensivo.
+
+    Só usuários cadastrados recebem leads: vendedor_email é trocado pelo
+    email como está no login (ignora caixa e espaços), o mesmo que os
+    filtros por vendedor usam; vendedor desconhecido é recusado.
+
+    Retorna (ok, msg, lead_id) na mesma ordem da entrada.
+    """
+    agora = datetime.utcnow()
+    leads_ref = db.collection(LEADS_COLLECTION)
+    resultados: List[Optional[Tuple[bool, str, Optional[str]]]] = [None] * len(leads)
+    diretorio = get_seller_directory()
+    vendedores: Dict[Optional[str], Optional[str]] = {}
+
+    preparados = []
+    for i, item in enumerate(leads):
+        informado = item.get("vendedor_email")
+        if informado not in vendedores:
+            vendedores[informado] = diretorio.resolve(informado)
+        if vendedores[informado] is None:
+            resultados[i] = (False, MSG_VENDEDOR_NAO_ENCONTRADO, None)
+            continue
+        status = item.get("status") or "novo"
+        if status not in STATUS_PIPELINE:
+            status = "novo"
+        lead_id = item.get("lead_id")
+        data = {
+            "nome": item.get("nome"),
+            "email": item.get("email"),
+            "telefone": item.get("telefone"),
+            "vendedor_email": vendedores[informado],
+            "valor_previsto": item.get("valor_previsto"),
+            "origem": item.get("origem"),
+            "observacoes": item.get("observacoes"),
             "status": status,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
+            "status_changed_at": agora,
+            "created_at": agora,
+            "updated_at": agora,
         }
-    )
-
-    return True, "Lead criado com sucesso."
+        preparados.append(
+            (
+                i,
+                leads_ref.document(lead_id) if lead_id else leads_ref.document(),
+                data,
+                dedup_keys(data["email"], data["telefone"]),
+                bool(item.get("permitir_duplicado")),
+                bool(lead_id),
+            )
+        )
+
+    # Uma leitura só: índices de todos os contatos + IDs determinísticos
+    refs = {}
+    for _, doc_ref, _, keys, _, idempotente in preparados:
+        for key in keys:
+            refs[("idx", key)] = _index_ref(key)
+        if idempotente:
+            refs[("lead", doc_ref.id)] = doc_ref
+    dono_do_contato = {}
+    leads_existentes = set()
+    if refs:
+        n_indice = sum(1 for tipo, _ in refs if tipo == "idx")
+        record_reads(LEADS_INDEX_COLLECTION, n_indice)
+        record_reads(LEADS_COLLECTION, len(refs) - n_indice)
+        for snap in db.get_all(list(refs.values()), timeout=rpc_timeout()):
+            if not snap.exists:
+                continue
+            if snap.reference.parent.id == LEADS_INDEX_COLLECTION:
+                dono_do_contato[snap.id] = snap.get("lead_id")
+            else:
+                leads_existentes.add(snap.id)
+
+    a_gravar = []
+    for i, doc_ref, data, keys, permitir, idempotente in preparados:
+        if idempotente and doc_ref.id in leads_existentes:
+            resultados[i] = (True, MSG_JA_RECEBIDO, doc_ref.id)
+            continue
+        dono = next((dono_do_contato[k] for k in keys if k in dono_do_contato), None)
+        if dono and not permitir:
+            resultados[i] = (
+                False,
+                f"Já existe um lead com este email/telefone (id {dono}).",
+                dono,
+            )
+            continue
+        # Contatos novos passam a ser deste lead (inclusive para os próximos do lote)
+        novos = [k for k in keys if k not in dono_do_contato]
+        for key in novos:
+            dono_do_contato[key] = doc_ref.id
+        a_gravar.append((i, doc_ref, data, novos, idempotente))
+
+    for inicio in range(0, len(a_gravar), _MAX_LEADS_PER_COMMIT):
+        lote = a_gravar[inicio : inicio + _MAX_LEADS_PER_COMMIT]
+        batch = db.batch()
+        for _, doc_ref, data, keys, idempotente in lote:
+            _stage_new_lead(batch, doc_ref, data, keys, idempotente)
+        PIPELINE_COUNTER.stage_increment(batch, _pipeline_deltas(l[2] for l in lote))
+        record_writes("create_leads_batch", len(batch))
+        try:
+            batch.commit(timeout=rpc_timeout())
+            for i, doc_ref, *_ in lote:
+                resultados[i] = (True, "Lead criado com sucesso.", doc_ref.id)
+        except Conflict:
+            # Corrida com outro cadastro: refaz um a um para isolar o conflito
+            for i, doc_ref, data, keys, idempotente in lote:
+                batch = db.batch()
+                _stage_new_lead(batch, doc_ref, data, keys, idempotente)
+                PIPELINE_COUNTER.stage_increment(batch, _pipeline_deltas([data]))
+                record_writes("create_leads_batch", len(batch))
+                try:
+                    batch.commit(timeout=rpc_timeout())
+                    resultados[i] = (True, "Lead criado com sucesso.", doc_ref.id)
+                except Conflict:
+                    if idempotente and doc_ref.get(timeout=rpc_timeout()).exists:
+                        resultados[i] = (True, MSG_JA_RECEBIDO, doc_ref.id)
+                    else:
+                        resultados[i] = (False, _MSG_DUPLICADO, None)
+
+    return resultados
+
+
+def _docs_to_leads(docs, collection: str = LEADS_COLLECTION) -> List[Dict]:
+    leads = []
+    for d in docs:
+        data = d.to_dict()
+        data["id"] = d.id
+        leads.append(data)
+    record_reads(collection, len(leads))
+    return leads
 
 
+@firestore_call("list_leads")
 def list_leads(
     status: Optional[str] = None,
     vendedor_email: Optional[str] = None,
+    incluir_arquivados: bool = False,
 ) -> List[Dict]:
+    """
+    Leads do pipeline. Com incluir_arquivados=True (histórico/exportação)
+    os leads arquivados vêm juntos, marcados com "arquivado": True.
+    """
+    colecoes = [LEADS_COLLECTION]
+    if incluir_arquivados and (not status or status in STATUS_ARQUIVAVEIS):
+        colecoes.append(LEADS_ARCHIVE_COLLECTION)
 
-    ref = db.collection(LEADS_COLLECTION)
+    leads = []
+    for colecao in colecoes:
+        ref = db.collection(colecao)
+
+        if status:
+            ref = ref.where(filter=FieldFilter("status", "==", status))
+
+        if vendedor_email:
+            ref = ref.where(filter=FieldFilter("vendedor_email", "==", vendedor_email))
+
+        docs = _docs_to_leads(ref.stream(timeout=rpc_timeout()), colecao)
+        if colecao == LEADS_ARCHIVE_COLLECTION:
+            for lead in docs:
+                lead["arquivado"] = True
+        leads.extend(docs)
+    return leads
 
-    if status:
-        ref = ref.where(filter=FieldFilter("status", "==", status))
 
+@single_flight("list_top_leads")
+@firestore_call("list_top_leads")
+def list_top_leads(
+    status: str,
+    vendedor_email: Optional[str] = None,
+    limit: int = 5,
+) -> List[Dict]:
+    """
+    Os `limit` leads mais antigos (created_at) de um status, lidos com
+    order_by + limit no Firestore (só `limit` documentos são baixados).
+    Usado pela home quando o snapshot ainda não carregou.
+    """
+    ref = db.collection(LEADS_COLLECTION).where(filter=FieldFilter("status", "==", status))
     if vendedor_email:
         ref = ref.where(filter=FieldFilter("vendedor_email", "==", vendedor_email))
+    return _docs_to_leads(ref.order_by("created_at").limit(limit).stream(timeout=rpc_timeout()))
+
 
-    docs = ref.stream()
+@single_flight("list_negociacoes_sem_valor")
+@firestore_call("list_negociacoes_sem_valor")
+def list_negociacoes_sem_valor(
+    vendedor_email: Optional[str] = None,
+    limit: int = 5,
+) -> List[Dict]:
+    """Negociações mais antigas sem valor previsto (nulo, vazio ou zero)."""
+    base = db.collection(LEADS_COLLECTION).where(
+        filter=FieldFilter("status", "==", "negociacao")
+    )
+    if vendedor_email:
+        base = base.where(filter=FieldFilter("vendedor_email", "==", vendedor_email))
 
+    # Nulo não entra no "in"; são duas consultas limitadas, mescladas aqui
+    filtros = [
+        FieldFilter("valor_previsto", "==", None),
+        FieldFilter("valor_previsto", "in", ["", 0]),
+    ]
     leads = []
-    for d in docs:
-        data = d.to_dict()
-        data["id"] = d.id
-        leads.append(data)
+    for filtro in filtros:
+        q = base.where(filter=filtro).order_by("created_at").limit(limit)
+        leads.extend(_docs_to_leads(q.stream(timeout=rpc_timeout())))
 
-    return leads
+    leads.sort(key=lambda l: _naive_utc(l.get("created_at")) or datetime.min)
+    return leads[:limit]
 
 
+@firestore_call("update_lead_status", retries=0)
 def update_lead_status(lead_id: str, new_status: str) -> Tuple[bool, str]:
     if new_status not in STATUS_PIPELINE:
         return False, "Status inválido."
 
     ref = db.collection(LEADS_COLLECTION).document(lead_id)
 
-    if not ref.get().exists:
+    snap = ref.get(timeout=rpc_timeout())
+    record_reads(LEADS_COLLECTION, 1)
+    if not snap.exists:
         return False, "Lead não encontrado."
 
-    ref.update(
+    lead = snap.to_dict()
+    status_anterior = lead.get("status")
+    if status_anterior == new_status:
+        return True, "Status atualizado com sucesso."
+
+    # Mudança de status + evento no histórico gravados juntos; o update só
+    # vale se o lead não mudou desde a leitura (senão o histórico e o
+    # contador registrariam uma transição a partir de um status antigo)
+    agora = datetime.utcnow()
+    batch = db.batch()
+    batch.update(
+        ref,
         {
             "status": new_status,
-            "updated_at": datetime.utcnow(),
-        }
+            "status_changed_at": agora,
+            "updated_at": agora,
+        },
+        option=db.write_option(last_update_time=snap.update_time),
+    )
+    batch.set(
+        ref.collection(STATUS_HISTORY_SUBCOLLECTION).document(),
+        _status_event(lead_id, lead, status_anterior, new_status, agora),
+    )
+    deltas = {new_status: 1}
+    if status_anterior in STATUS_PIPELINE:
+        deltas[status_anterior] = -1
+    PIPELINE_COUNTER.stage_increment(batch, deltas)
+    record_writes("update_lead_status", len(batch))
+    try:
+        batch.commit(timeout=rpc_timeout())
+    except (Conflict, FailedPrecondition):
+        return False, MSG_LEAD_ALTERADO
+    _lead_tocado(
+        lead_id,
+        status=new_status,
+        vendedor_email=lead.get("vendedor_email"),
+        nome=lead.get("nome"),
+        agora=agora,
     )
 
     return True, "Status atualizado com sucesso."
 
 
+_CAMPOS_STATS = ["status", "valor_previsto", "vendedor_email"]
+
+
+@firestore_call("get_leads_stats", deadline_s=15)
 def get_leads_stats(vendedor_email: Optional[str] = None) -> Dict:
     ref = db.collection(LEADS_COLLECTION)
 
     if vendedor_email:
         ref = ref.where(filter=FieldFilter("vendedor_email", "==", vendedor_email))
 
-    docs = ref.stream()
+    # Só os campos usados nas estatísticas: menos bytes por documento lido
+    ref = ref.select(_CAMPOS_STATS)
+    stats = compute_leads_stats(d.to_dict() for d in ref.stream(timeout=rpc_timeout()))
+    record_reads(LEADS_COLLECTION, stats["total"])
+    return stats
+
 
-    stats = {
-        "total": 0,
-        "por_status": {s: 0 for s in STATUS_PIPELINE},
-        "total_valor_previsto": 0.0,
+@single_flight("get_pipeline_totals")
+@firestore_call("get_pipeline_totals")
+def get_pipeline_totals(max_age_s: Optional[float] = None) -> Dict:
+    """
+    Total de leads e quantidade por status, lidos do contador distribuído
+    (alguns documentos, não a coleção). Pode estar até alguns segundos atrasado.
+    """
+    valores = PIPELINE_COUNTER.read(max_age_s)
+    return {
+        "total": int(valores.get("total", 0)),
+        "por_status": {s: int(valores.get(s, 0)) for s in STATUS_PIPELINE},
     }
 
-    for d in docs:
-        data = d.to_dict()
-        stats["total"] += 1
 
-        st = data.get("status", "novo")
-        if st in stats["por_status"]:
-            stats["por_status"][st] += 1
+@single_flight("get_archive_totals")
+@firestore_call("get_archive_totals")
+def get_archive_totals(max_age_s: Optional[float] = None) -> Dict:
+    """Resumo do que foi arquivado (quantidade e valor por status), via contador."""
+    valores = ARCHIVE_COUNTER.read(max_age_s)
+    return {
+        "total": int(valores.get("total", 0)),
+        "por_status": {s: int(valores.get(s, 0)) for s in STATUS_ARQUIVAVEIS},
+        "valor_por_status": {s: float(valores.get(f"valor_{s}", 0)) for s in STATUS_ARQUIVAVEIS},
+    }
 
-        valor = data.get("valor_previsto") or 0
-        try:
-            stats["total_valor_previsto"] += float(valor)
-        except:
-            pass
 
-    return stats
+def rebuild_pipeline_totals() -> Dict:
+    """Recalcula os totais do pipeline a partir da coleção (backfill/correção)."""
+    deltas = _pipeline_deltas(
+        {"status": d.get("status")}
+        for d in db.collection(LEADS_COLLECTION).select(["status"]).stream()
+    )
+    PIPELINE_COUNTER.reset(deltas)
+    return get_pipeline_totals(max_age_s=0)
+
+
+def compute_leads_stats(leads: Iterable[Dict]) -> Dict:
+    """
+    Mesmas estatísticas do get_leads_stats, a partir de leads já carregados,
+    em uma passada (ver services/streaming_stats.py).
+    """
+    return LeadStats(STATUS_PIPELINE).add_all(leads).summary()
+
+
+def _lead_tocado(lead_id: str, **dados) -> None:
+    """Reagenda o follow-up do lead que acabou de ser gravado."""
+    # Import tardio: followup_service depende deste módulo
+    from services.followup_service import note_lead_touched
+
+    note_lead_touched(lead_id, **dados)
+
 
 def _leads_ref():
     return db.collection(LEADS_COLLECTION)
 
 
+def write_lead_fields(lead_id: str, campos: dict) -> None:
+    """
+    Como update_lead_fields, mas levanta o erro: FirestoreIndisponivel para
+    falhas transitórias, as do cliente (NotFound, InvalidArgument...) para
+    as que não adianta repetir. Usada pelo write-behind.
+    """
+    agora = datetime.utcnow()
+    call_with_deadline(
+        "update_lead_fields",
+        lambda: _leads_ref()
+        .document(lead_id)
+        .update({**campos, "updated_at": agora}, timeout=rpc_timeout()),
+    )
+    record_writes("update_lead_fields", 1)
+    _lead_tocado(lead_id, nome=campos.get("nome"), agora=agora)
+
+
 def update_lead_fields(lead_id: str, campos: dict):
     """
     Atualiza campos genéricos de um lead (ex: valor_previsto, observacoes).
     """
     try:
-        _leads_ref().document(lead_id).update(campos)
+        write_lead_fields(lead_id, campos)
         return True, "Lead atualizado com sucesso."
     except Exception as e:
         return False, f"Erro ao atualizar lead: {e}"
+
+
+def parse_valor_previsto(texto) -> Optional[float]:
+    """
+    Converte o valor digitado ("1.234,56", "R$ 1500", "1500.5") em float,
+    para que o campo seja gravado como número e possa ser ordenado.
+    Vazio vira None; texto que não é número levanta ValueError.
+    """
+    if texto is None:
+        return None
+    if isinstance(texto, (int, float)):
+        return _finito(float(texto))
+    limpo = str(texto).replace("R$", "").replace(" ", "").strip()
+    if not limpo:
+        return None
+    if "," in limpo:
+        # Formato brasileiro: ponto separa milhar, vírgula separa decimal
+        limpo = limpo.replace(".", "").replace(",", ".")
+    elif limpo.count(".") > 1:
+        limpo = limpo.replace(".", "")
+    return _finito(float(limpo))
+
+
+def _finito(valor: float) -> float:
+    # "nan"/"inf" viram float sem erro, mas quebram somas e contadores
+    if not math.isfinite(valor):
+        raise ValueError(f"Valor inválido: {valor}")
+    return valor
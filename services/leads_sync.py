@@ -0,0 +1,297 @@
+# services/leads_sync.py
+"""
+Snapshot local dos leads mantido por sync incremental.
+
+Em vez de baixar a coleção inteira a cada refresh do dashboard, o snapshot
+guarda o maior updated_at já visto (watermark) e só consulta
+updated_at >= watermark - _SYNC_OVERLAP. Leads removidos chegam pelas
+lápides em leads_removidos. O custo de um refresh passa a ser proporcional
+ao que mudou, não ao tamanho da coleção.
+
+Remoções sem lápide (pelo console, lápide apagada) não aparecem no sync
+incremental; por isso a cada _RECARGA_TOTAL o sync relê a coleção inteira
+e substitui o mapa (e o arquivo local).
+
+Cada versão registra os ids alterados ou removidos (changes_since), para
+quem mantém estado derivado por delta; cargas completas são marcadas e
+quem depende delas recalcula do zero.
+
+O snapshot é um só por processo e compartilhado entre as sessões. Ele é
+persistido em disco (services/snapshot_store.py): depois de um restart o
+primeiro dashboard sai do arquivo local e a reconciliação com o Firestore
+roda em background.
+
+Se o Firestore estiver lento ou fora (services/resilience.py), o sync
+desiste dentro do prazo e as páginas continuam com o snapshot que já
+têm; `last_error` diz desde quando ele está desatualizado.
+"""
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from services.leads_service import (
+    LEADS_COLLECTION,
+    LEADS_TOMBSTONES_COLLECTION,
+    db,
+)
+from services.metrics_registry import record_reads
+from services.resilience import FirestoreIndisponivel, call_with_deadline, rpc_timeout
+from services.snapshot_store import SnapshotStore
+
+# Folga para escritas de outros servidores com relógio um pouco atrasado
+# (o updated_at é gravado pelo cliente). Re-lê só o que mudou nessa janela.
+_SYNC_OVERLAP = timedelta(seconds=30)
+
+# Sessões que dão refresh ao mesmo tempo reaproveitam o mesmo sync
+_MIN_SYNC_INTERVAL_S = 1.0
+
+# Intervalo entre cargas completas (reconciliação de remoções sem lápide)
+_RECARGA_TOTAL = timedelta(hours=6)
+
+# Versões com mudanças guardadas para changes_since
+_HISTORICO_VERSOES = 64
+
+# Campos com poucos valores distintos: uma única string para todos os leads
+_CAMPOS_INTERNADOS = ("status", "origem", "vendedor_email")
+
+
+def _freeze(data: Dict) -> Mapping:
+    """
+    Lead como fica no snapshot: somente leitura (é compartilhado por todas
+    as sessões) e com chaves e campos repetitivos internados. Quem precisa
+    alterar faz uma cópia ({**lead, ...}).
+    """
+    congelado = {sys.intern(k): v for k, v in data.items()}
+    for campo in _CAMPOS_INTERNADOS:
+        valor = congelado.get(campo)
+        if isinstance(valor, str):
+            congelado[campo] = sys.intern(valor)
+    return MappingProxyType(congelado)
+
+
+class LeadsSnapshot:
+    def __init__(self, store: Optional[SnapshotStore] = None):
+        self._leads: Dict[str, Mapping] = {}
+        self.watermark: Optional[datetime] = None
+        self.version = 0
+        self._loaded = False
+        self._last_sync = 0.0
+        self._sync_lock = threading.Lock()
+        self._store = store
+        self._warm_lock = threading.Lock()
+        self._warm_started = False
+        self.last_error: Optional[str] = None
+        self.stale_since: Optional[datetime] = None
+        self._carga_completa_em: Optional[datetime] = None  # UTC
+        # (versão, ids alterados ou removidos, completa), da mais antiga à atual.
+        # Tupla trocada inteira a cada versão: leitores não precisam de lock
+        self._mudancas: Tuple[Tuple[int, FrozenSet[str], bool], ...] = ()
+
+    def warm_start(self) -> bool:
+        """
+        Carrega o snapshot do disco (se houver) e dispara a reconciliação com
+        o Firestore em uma thread de background. Só roda uma vez; retorna
+        True apenas na chamada que carregou do disco.
+        """
+        with self._warm_lock:
+            if self._warm_started:
+                return False
+            self._warm_started = True
+            if self._store is None:
+                return False
+            leads, watermark = self._store.load()
+            if watermark is None:
+                return False
+            self._leads = {lead_id: _freeze(lead) for lead_id, lead in leads.items()}
+            self.watermark = watermark
+            self._carga_completa_em = self._store.full_load_at
+            self._loaded = True
+            self.version += 1
+            self._registrar(frozenset(), completa=True)
+
+        threading.Thread(
+            target=self.sync,
+            kwargs={"force": True},
+            name="leads-snapshot-reconcile",
+            daemon=True,
+        ).start()
+        return True
+
+    def sync(self, force: bool = False) -> int:
+        """
+        Traz as mudanças desde o watermark. Retorna quantos leads mudaram.
+        Se outra sessão já está sincronizando, usa o snapshot atual.
+        """
+        recente = time.monotonic() - self._last_sync < _MIN_SYNC_INTERVAL_S
+        if not force and self._loaded and recente:
+            return 0
+        if not self._sync_lock.acquire(blocking=not self._loaded):
+            return 0
+        try:
+            return self._sync_locked()
+        except FirestoreIndisponivel as e:
+            # Segue servindo o que já tem (vazio se nunca carregou)
+            self.last_error = str(e)
+            if self.stale_since is None:
+                self.stale_since = datetime.utcnow()
+            self._last_sync = time.monotonic()
+            return 0
+        finally:
+            self._sync_lock.release()
+
+    def _fetch_changes(self, watermark: Optional[datetime]):
+        query = db.collection(LEADS_COLLECTION)
+        tombstones = []
+        if watermark is not None:
+            desde = watermark - _SYNC_OVERLAP
+            query = query.where(filter=FieldFilter("updated_at", ">=", desde))
+            tombstones = db.collection(LEADS_TOMBSTONES_COLLECTION).where(
+                filter=FieldFilter("removed_at", ">=", desde)
+            ).stream(timeout=rpc_timeout())
+        docs = []
+        for d in query.stream(timeout=rpc_timeout()):
+            data = d.to_dict()
+            data["id"] = d.id
+            docs.append(data)
+        removidos = [t.id for t in tombstones]
+        record_reads(LEADS_COLLECTION, len(docs))
+        record_reads(LEADS_TOMBSTONES_COLLECTION, len(removidos))
+        return docs, removidos
+
+    def _recarga_vencida(self) -> bool:
+        return (
+            self._carga_completa_em is None
+            or datetime.utcnow() - self._carga_completa_em >= _RECARGA_TOTAL
+        )
+
+    def _sync_locked(self) -> int:
+        completo = not self._loaded or self._recarga_vencida()
+        # Carga completa pode ser grande: prazo maior que o das leituras pontuais
+        docs, removidos_ids = call_with_deadline(
+            "leads_sync",
+            self._fetch_changes,
+            None if completo else self.watermark,
+            deadline_s=60 if completo else 15,
+        )
+        self.last_error = None
+        self.stale_since = None
+
+        if completo:
+            # O que não veio na carga completa foi removido
+            presentes = {data["id"] for data in docs}
+            removidos_ids = [i for i in self._leads if i not in presentes]
+
+        alterados = {}
+        watermark = self.watermark
+        for data in docs:
+            d_id = data["id"]
+            # A janela de folga re-lê docs que não mudaram; esses não contam
+            if self._leads.get(d_id) != data:
+                alterados[d_id] = data
+            updated_at = data.get("updated_at")
+            if not isinstance(updated_at, datetime):
+                continue
+            if watermark is None or updated_at > watermark:
+                watermark = updated_at
+
+        removidos = [i for i in removidos_ids if i in self._leads]
+
+        if alterados or removidos or completo:
+            # Copy-on-write: leitores que já pegaram o dict antigo não são afetados
+            novo = dict(self._leads) if self._loaded else {}
+            novo.update((lead_id, _freeze(data)) for lead_id, data in alterados.items())
+            for lead_id in removidos:
+                novo.pop(lead_id, None)
+            self._leads = novo
+            self.version += 1
+            self._registrar(frozenset(alterados).union(removidos), completa=completo)
+
+        self.watermark = watermark
+        self._loaded = True
+        self._last_sync = time.monotonic()
+        if completo:
+            self._carga_completa_em = datetime.utcnow()
+        if self._store is not None and (alterados or removidos or completo):
+            if completo:
+                # Substitui o arquivo inteiro pelo que veio do Firestore
+                self._store.save(
+                    {data["id"]: data for data in docs}, [], watermark, completo=True
+                )
+            else:
+                self._store.save(alterados, removidos, watermark)
+        return len(alterados) + len(removidos)
+
+    def _registrar(self, ids: FrozenSet[str], completa: bool) -> None:
+        entrada = (self.version, ids, completa)
+        self._mudancas = (self._mudancas + (entrada,))[-_HISTORICO_VERSOES:]
+
+    def changes_since(self, version: int) -> Optional[Tuple[FrozenSet[str], int]]:
+        """
+        (ids, versão): leads alterados ou removidos depois de `version` até
+        a versão retornada; get(id) diz qual (None se removido) e pode já
+        estar numa versão adiante. None se não dá para saber por delta:
+        houve carga completa no meio ou `version` é antiga demais.
+        """
+        mudancas = self._mudancas
+        if not mudancas or version > mudancas[-1][0] or version < mudancas[0][0] - 1:
+            return None
+        ids = set()
+        for versao, alterados, completa in mudancas:
+            if versao <= version:
+                continue
+            if completa:
+                return None
+            ids |= alterados
+        return frozenset(ids), mudancas[-1][0]
+
+    @property
+    def loaded(self) -> bool:
+        """Já houve uma carga (do disco ou do Firestore); senão leads() é vazio."""
+        return self._loaded
+
+    def leads(
+        self,
+        status: Optional[str] = None,
+        vendedor_email: Optional[str] = None,
+    ) -> List[Mapping]:
+        """Leads do snapshot (somente leitura), com os mesmos filtros do list_leads."""
+        leads = self._leads.values()
+        return [
+            lead
+            for lead in leads
+            if (not status or lead.get("status") == status)
+            and (not vendedor_email or lead.get("vendedor_email") == vendedor_email)
+        ]
+
+    def get(self, lead_id: str) -> Optional[Mapping]:
+        """Um lead do snapshot pelo id (somente leitura)."""
+        return self._leads.get(lead_id)
+
+
+_snapshot = LeadsSnapshot(store=SnapshotStore(project=lambda: getattr(db, "project", None)))
+
+
+def get_snapshot(sync: bool = True) -> LeadsSnapshot:
+    """
+    Snapshot compartilhado do processo, já sincronizado. Na primeira chamada
+    após um restart, serve direto do disco e sincroniza em background.
+    """
+    if _snapshot.warm_start():
+        # Acabou de carregar do disco; a reconciliação já roda em background
+        return _snapshot
+    if sync:
+        _snapshot.sync()
+    return _snapshot
+
+
+def list_leads_synced(
+    status: Optional[str] = None,
+    vendedor_email: Optional[str] = None,
+) -> List[Mapping]:
+    """Equivalente ao list_leads, servido pelo snapshot incremental."""
+    return get_snapshot().leads(status=status, vendedor_email=vendedor_email)
@@ -0,0 +1,129 @@
+# services/memory_report.py
+"""
+Quanto de memória é compartilhado entre as sessões e quanto é de cada uma.
+
+Os leads ficam uma vez só no snapshot do processo (services/leads_sync.py),
+como mapeamentos somente leitura; as sessões guardam ids e views leves.
+Este relatório confirma isso: o compartilhado cresce com a base de leads e
+o por sessão fica pequeno e constante.
+
+- track_session(): chamado a cada rerun pelo app.py; mede o session_state
+  da sessão sem contar referências ao snapshot (leads congelados).
+- register_shared(): outras estruturas compartilhadas (ex.: cache de cards
+  do Kanban) entram no relatório.
+- memory_report(): RSS do processo, compartilhado e por sessão.
+"""
+import sys
+import threading
+import time
+from types import MappingProxyType
+from typing import Callable, Dict, Optional
+
+# Sessão sem rerun há mais que isso sai do relatório (aba fechada)
+_SESSAO_EXPIRA_S = 30 * 60
+
+_lock = threading.Lock()
+_sessoes: Dict[str, Dict] = {}
+_compartilhados: Dict[str, Callable[[], int]] = {}
+
+_ATOMICOS = (str, bytes, int, float, bool, type(None))
+
+
+def deep_sizeof(obj, seen: Optional[set] = None, pular_snapshot: bool = False) -> int:
+    """
+    Tamanho aproximado de obj e de tudo que ele referencia (dicts, listas,
+    tuplas, conjuntos, arrays numpy). Objetos já vistos em `seen` não contam
+    de novo; com pular_snapshot, leads do snapshot (MappingProxyType) também não.
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    pilha = [obj]
+    while pilha:
+        o = pilha.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        if isinstance(o, MappingProxyType):
+            if pular_snapshot:
+                continue
+            o = {k: o[k] for k in o}  # o dict por trás do proxy
+        nbytes = getattr(o, "nbytes", None)
+        if isinstance(nbytes, int) and hasattr(o, "dtype"):
+            total += sys.getsizeof(o) + (nbytes if getattr(o, "base", None) is None else 0)
+            continue
+        total += sys.getsizeof(o)
+        if isinstance(o, _ATOMICOS):
+            continue
+        if isinstance(o, dict):
+            pilha.extend(o.keys())
+            pilha.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            pilha.extend(o)
+    return total
+
+
+def track_session(session_id: str, state) -> None:
+    """Mede o session_state (itens chave -> valor) de uma sessão."""
+    itens = {k: state[k] for k in list(state.keys())}
+    tamanho = deep_sizeof(itens, pular_snapshot=True)
+    agora = time.monotonic()
+    with _lock:
+        _sessoes[session_id] = {"bytes": tamanho, "keys": len(itens), "visto_em": agora}
+        for sid in [s for s, info in _sessoes.items() if agora - info["visto_em"] > _SESSAO_EXPIRA_S]:
+            del _sessoes[sid]
+
+
+def register_shared(nome: str, medir: Callable[[], int]) -> None:
+    """Inclui no relatório uma estrutura compartilhada; medir() devolve bytes."""
+    with _lock:
+        _compartilhados[nome] = medir
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def memory_report() -> Dict:
+    """
+    {"rss_mb", "shared": {nome: mb}, "shared_mb", "sessions": {...}}.
+    Percorre o snapshot inteiro: use sob demanda, não a cada rerun.
+    """
+    from services.lead_scoring import get_lead_scorer
+    from services.leads_sync import get_snapshot
+
+    snapshot = get_snapshot(sync=False)
+    leads = snapshot.leads()
+    # Mesmo `seen`: o que o scorer referencia do snapshot não conta de novo
+    seen: set = set()
+    compartilhado = {
+        "snapshot": deep_sizeof(leads, seen) - sys.getsizeof(leads),
+        "lead_scoring": deep_sizeof(get_lead_scorer().__dict__, seen),
+    }
+    with _lock:
+        extras = dict(_compartilhados)
+        sessoes = {sid: dict(info) for sid, info in _sessoes.items()}
+    for nome, medir in extras.items():
+        compartilhado[nome] = medir()
+
+    por_sessao = sorted((info["bytes"] for info in sessoes.values()), reverse=True)
+    rss = _rss_bytes()
+    mb = 1024 * 1024
+    return {
+        "rss_mb": None if rss is None else round(rss / mb, 1),
+        "snapshot_leads": len(leads),
+        "shared": {nome: round(b / mb, 2) for nome, b in compartilhado.items()},
+        "shared_mb": round(sum(compartilhado.values()) / mb, 2),
+        "sessions": {
+            "count": len(por_sessao),
+            "total_kb": round(sum(por_sessao) / 1024, 1),
+            "max_kb": round(por_sessao[0] / 1024, 1) if por_sessao else 0.0,
+            "avg_kb": round(sum(por_sessao) / len(por_sessao) / 1024, 1) if por_sessao else 0.0,
+        },
+    }
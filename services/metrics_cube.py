@@ -0,0 +1,188 @@
+# services/metrics_cube.py
+"""
+Cubo de métricas vendedor × status × origem × mês de criação.
+
+Construído em uma passada sobre o snapshot de leads e guardado em arrays
+NumPy (contagem, soma de valor previsto e quantos têm valor). Qualquer
+recorte (um vendedor, algumas origens, um intervalo de meses) vira
+indexação + soma sobre arrays pequenos, sem tocar no Firestore.
+
+A origem é texto livre: ela é normalizada como no lead_scoring e só as
+_MAX_ORIGENS mais frequentes ganham posição própria no eixo; as demais
+somam em OUTRAS_ORIGENS, o que mantém o cubo (e o filtro da tela) com
+tamanho limitado.
+
+O cubo é reconstruído só quando a versão do snapshot muda.
+"""
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from services.lead_scoring import normalize_origem
+from services.leads_service import STATUS_PIPELINE
+from services.leads_sync import get_snapshot
+
+SEM_ORIGEM = "Sem origem"
+OUTRAS_ORIGENS = "outros"
+SEM_VENDEDOR = "Não atribuído"
+SEM_DATA = "sem data"
+
+# Origens com posição própria no eixo (as mais frequentes)
+_MAX_ORIGENS = 20
+
+
+def _mes(valor) -> str:
+    return valor.strftime("%Y-%m") if isinstance(valor, datetime) else SEM_DATA
+
+
+def _valor(lead: Dict) -> float:
+    try:
+        return float(lead.get("valor_previsto") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+@dataclass
+class CubeSlice:
+    """Resultado de um recorte: arrays alinhados com STATUS_PIPELINE."""
+
+    leads: np.ndarray
+    valor: np.ndarray
+    com_valor: np.ndarray
+
+    def por_status(self) -> Dict[str, int]:
+        return {s: int(n) for s, n in zip(STATUS_PIPELINE, self.leads)}
+
+    def valor_por_status(self) -> Dict[str, float]:
+        return {s: float(v) for s, v in zip(STATUS_PIPELINE, self.valor)}
+
+    @property
+    def total(self) -> int:
+        return int(self.leads.sum())
+
+    @property
+    def ticket_medio(self) -> float:
+        n = int(self.com_valor.sum())
+        return float(self.valor.sum()) / n if n else 0.0
+
+
+class MetricsCube:
+    def __init__(self, vendedores: List[str], origens: List[str], meses: List[str]):
+        self.vendedores = vendedores
+        self.origens = origens  # ordenadas; OUTRAS_ORIGENS (se houver) fica por último
+        self.meses = meses  # ordenados; SEM_DATA (se houver) fica por último
+        self._v_idx = {v: i for i, v in enumerate(vendedores)}
+        self._o_idx = {o: i for i, o in enumerate(origens)}
+        self._m_idx = {m: i for i, m in enumerate(meses)}
+        forma = (len(vendedores), len(STATUS_PIPELINE), len(origens), len(meses))
+        self.leads = np.zeros(forma, dtype=np.int64)
+        self.valor = np.zeros(forma, dtype=np.float64)
+        self.com_valor = np.zeros(forma, dtype=np.int64)
+
+    @classmethod
+    def build(cls, leads: Iterable[Dict]) -> "MetricsCube":
+        s_idx = {s: i for i, s in enumerate(STATUS_PIPELINE)}
+        linhas = []
+        for lead in leads:
+            status = lead.get("status")
+            if status not in s_idx:
+                continue
+            linhas.append(
+                (
+                    lead.get("vendedor_email") or SEM_VENDEDOR,
+                    s_idx[status],
+                    normalize_origem(lead.get("origem")) or SEM_ORIGEM,
+                    _mes(lead.get("created_at")),
+                    _valor(lead),
+                )
+            )
+
+        frequencia = Counter(l[2] for l in linhas)
+        # Empate na frequência: ordem alfabética, para o eixo não variar à toa
+        mais_frequentes = sorted(frequencia, key=lambda o: (-frequencia[o], o))[:_MAX_ORIGENS]
+        origens = sorted(set(mais_frequentes) - {OUTRAS_ORIGENS})
+        if len(frequencia) > _MAX_ORIGENS or OUTRAS_ORIGENS in frequencia:
+            mantidas = set(origens)
+            linhas = [l if l[2] in mantidas else (*l[:2], OUTRAS_ORIGENS, *l[3:]) for l in linhas]
+            origens.append(OUTRAS_ORIGENS)
+
+        meses = sorted({l[3] for l in linhas} - {SEM_DATA})
+        if any(l[3] == SEM_DATA for l in linhas):
+            meses.append(SEM_DATA)
+        cube = cls(
+            vendedores=sorted({l[0] for l in linhas}),
+            origens=origens,
+            meses=meses,
+        )
+        if not linhas:
+            return cube
+
+        v = np.fromiter((cube._v_idx[l[0]] for l in linhas), dtype=np.intp, count=len(linhas))
+        s = np.fromiter((l[1] for l in linhas), dtype=np.intp, count=len(linhas))
+        o = np.fromiter((cube._o_idx[l[2]] for l in linhas), dtype=np.intp, count=len(linhas))
+        m = np.fromiter((cube._m_idx[l[3]] for l in linhas), dtype=np.intp, count=len(linhas))
+        valores = np.fromiter((l[4] for l in linhas), dtype=np.float64, count=len(linhas))
+
+        idx = (v, s, o, m)
+        np.add.at(cube.leads, idx, 1)
+        np.add.at(cube.valor, idx, valores)
+        np.add.at(cube.com_valor, idx, (valores > 0).astype(np.int64))
+        return cube
+
+    def slice(
+        self,
+        vendedor: Optional[str] = None,
+        origens: Optional[Sequence[str]] = None,
+        mes_inicio: Optional[str] = None,
+        mes_fim: Optional[str] = None,
+    ) -> CubeSlice:
+        """
+        Soma por status do recorte pedido. Filtro vazio = sem filtro naquele
+        eixo. Com período, leads sem data de criação ficam de fora.
+        """
+        sel = [slice(None), slice(None), slice(None), slice(None)]
+        if vendedor is not None:
+            if vendedor not in self._v_idx:
+                return self._vazio()
+            i = self._v_idx[vendedor]
+            sel[0] = slice(i, i + 1)
+        if origens:
+            sel[2] = np.array([self._o_idx[o] for o in origens if o in self._o_idx], dtype=np.intp)
+        if mes_inicio or mes_fim:
+            datados = [m for m in self.meses if m != SEM_DATA]
+            ini = np.searchsorted(datados, mes_inicio) if mes_inicio else 0
+            fim = np.searchsorted(datados, mes_fim, side="right") if mes_fim else len(datados)
+            sel[3] = slice(int(ini), int(fim))
+
+        def reduzir(arr: np.ndarray) -> np.ndarray:
+            # Indexa eixo a eixo para não combinar arrays de índice entre si
+            out = arr[sel[0]]
+            out = out[:, :, sel[2]]
+            out = out[..., sel[3]]
+            return out.sum(axis=(0, 2, 3))
+
+        return CubeSlice(reduzir(self.leads), reduzir(self.valor), reduzir(self.com_valor))
+
+    def _vazio(self) -> CubeSlice:
+        zeros = np.zeros(len(STATUS_PIPELINE))
+        return CubeSlice(zeros.astype(np.int64), zeros, zeros.astype(np.int64))
+
+
+_cube: Optional[MetricsCube] = None
+_cube_version = -1
+_cube_lock = threading.Lock()
+
+
+def get_metrics_cube() -> MetricsCube:
+    """Cubo do snapshot atual (compartilhado; refeito só se o snapshot mudou)."""
+    global _cube, _cube_version
+    snapshot = get_snapshot()
+    with _cube_lock:
+        if _cube is None or _cube_version != snapshot.version:
+            _cube = MetricsCube.build(snapshot.leads())
+            _cube_version = snapshot.version
+        return _cube
@@ -0,0 +1,273 @@
+# services/metrics_registry.py
+"""
+Métricas do processo (latência, leituras/escritas, caches, logins, reruns)
+no formato OpenMetrics, para o Prometheus raspar ou para o textfile
+collector do node_exporter.
+
+    OPERATION_SECONDS.observe(0.042, op="list_leads", outcome="ok")
+    DOCS_READ.inc(120, collection="leads")
+
+Exportação (opcional, pelo ambiente; ver start_exporters):
+- LEAD_SYSTEM_METRICS_PORT: servidor HTTP local em /metrics;
+- LEAD_SYSTEM_METRICS_TEXTFILE: arquivo reescrito a cada
+  LEAD_SYSTEM_METRICS_TEXTFILE_INTERVAL_S (padrão 15 s).
+
+No caminho quente só há um bisect e um incremento sob lock por métrica;
+o texto é montado apenas quando alguém lê.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+_PREFIXO = "lead_system_"
+
+# Em segundos: de leituras pontuais (ms) a cargas completas do snapshot
+_BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_REGISTRY: List["_Metrica"] = []
+
+
+def _escape(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(nomes: Sequence[str], valores: Sequence, extra: str = "") -> str:
+    partes = [f'{n}="{_escape(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _num(valor: float) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, labelnames: Sequence[str] = ()):
+        self.nome = _PREFIXO + nome
+        self.ajuda = ajuda
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _chave(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def _cabecalho(self) -> List[str]:
+        return [f"# TYPE {self.nome} {self.tipo}", f"# HELP {self.nome} {_escape(self.ajuda)}"]
+
+
+class Counter(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, labelnames: Sequence[str] = ()):
+        super().__init__(nome, ajuda, labelnames)
+        self._valores: Dict[Tuple, float] = {}
+
+    def inc(self, valor: float = 1, **labels) -> None:
+        chave = self._chave(labels)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def render(self) -> List[str]:
+        with self._lock:
+            valores = sorted(self._valores.items())
+        linhas = self._cabecalho()
+        for chave, valor in valores:
+            linhas.append(f"{self.nome}_total{_labels(self.labelnames, chave)} {_num(valor)}")
+        return linhas
+
+
+class Histogram(_Metrica):
+    tipo = "histogram"
+
+    def __init__(
+        self,
+        nome: str,
+        ajuda: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = _BUCKETS_PADRAO,
+    ):
+        super().__init__(nome, ajuda, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # chave -> [contagem por bucket (não cumulativa) + overflow, soma]
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, valor: float, **labels) -> None:
+        chave = self._chave(labels)
+        i = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valor
+
+    @contextmanager
+    def time(self, **labels):
+        """Mede o bloco; os labels devolvidos podem ser trocados dentro dele."""
+        inicio = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - inicio, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((k, (list(c), s)) for k, (c, s) in self._series.items())
+        linhas = self._cabecalho()
+        for chave, (contagens, soma) in series:
+            acumulado = 0
+            for limite, n in zip(self.buckets + (float("inf"),), contagens):
+                acumulado += n
+                le = "+Inf" if limite == float("inf") else _num(limite)
+                rotulos = _labels(self.labelnames, chave, 'le="' + le + '"')
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            rotulos = _labels(self.labelnames, chave)
+            linhas.append(f"{self.nome}_count{rotulos} {acumulado}")
+            linhas.append(f"{self.nome}_sum{rotulos} {_num(soma)}")
+        return linhas
+
+
+# ================== MÉTRICAS DO APP ==================
+
+OPERATION_SECONDS = Histogram(
+    "operation_duration_seconds",
+    "Latência das operações do leads_service/auth_service (inclui espera por prazo e retentativas).",
+    ["op", "outcome"],
+)
+DOCS_READ = Counter(
+    "firestore_documents_read", "Documentos lidos do Firestore.", ["collection"]
+)
+DOCS_WRITTEN = Counter(
+    "firestore_documents_written", "Documentos gravados no Firestore (escritas em batch).", ["op"]
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests", "Consultas a caches internos, por resultado (hit/miss).", ["cache", "result"]
+)
+LOGIN_ATTEMPTS = Counter("login_attempts", "Tentativas de login.")
+LOGIN_FAILURES = Counter("login_failures", "Logins recusados, por motivo.", ["reason"])
+RERUN_SECONDS = Histogram(
+    "rerun_duration_seconds", "Duração de cada rerun do Streamlit, por página.", ["page"]
+)
+
+
+def record_reads(collection: str, n: int) -> None:
+    if n:
+        DOCS_READ.inc(n, collection=collection)
+
+
+def record_writes(op: str, n: int) -> None:
+    if n:
+        DOCS_WRITTEN.inc(n, op=op)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def timed(op: str) -> Callable:
+    """Decorator: latência de fn em OPERATION_SECONDS (outcome ok/error)."""
+
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            inicio = time.perf_counter()
+            outcome = "error"
+            try:
+                resultado = fn(*args, **kwargs)
+                outcome = "ok"
+                return resultado
+            finally:
+                OPERATION_SECONDS.observe(time.perf_counter() - inicio, op=op, outcome=outcome)
+
+        return wrapper
+
+    return decorator
+
+
+def render_openmetrics() -> str:
+    linhas: List[str] = []
+    for metrica in list(_REGISTRY):
+        linhas.extend(metrica.render())
+    linhas.append("# EOF")
+    return "\n".join(linhas) + "\n"
+
+
+# ================== EXPORTAÇÃO ==================
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = render_openmetrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        pass  # scrape a cada 15 s não precisa ir para o log
+
+
+def _escrever_textfile(path: str) -> None:
+    # Escreve ao lado e renomeia: o collector nunca lê um arquivo pela metade
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_openmetrics())
+    os.replace(tmp, path)
+
+
+def _loop_textfile(path: str, intervalo_s: float) -> None:
+    while True:
+        try:
+            _escrever_textfile(path)
+        except OSError as e:
+            logger.warning("Falha ao gravar métricas em %s: %s", path, e)
+        time.sleep(intervalo_s)
+
+
+_exporters_lock = threading.Lock()
+_exporters_iniciados = False
+
+
+def start_exporters() -> None:
+    """Liga o endpoint HTTP e/ou o textfile conforme o ambiente. Idempotente."""
+    global _exporters_iniciados
+    with _exporters_lock:
+        if _exporters_iniciados:
+            return
+        _exporters_iniciados = True
+
+    porta = os.getenv("LEAD_SYSTEM_METRICS_PORT")
+    if porta:
+        try:
+            servidor = ThreadingHTTPServer(("127.0.0.1", int(porta)), _Handler)
+        except (OSError, ValueError) as e:
+            logger.warning("Endpoint de métricas não iniciado (porta %s): %s", porta, e)
+        else:
+            servidor.daemon_threads = True
+            threading.Thread(
+                target=servidor.serve_forever, name="metrics-http", daemon=True
+            ).start()
+
+    textfile = os.getenv("LEAD_SYSTEM_METRICS_TEXTFILE")
+    if textfile:
+        intervalo = float(os.getenv("LEAD_SYSTEM_METRICS_TEXTFILE_INTERVAL_S", "15"))
+        threading.Thread(
+            target=_loop_textfile, args=(textfile, intervalo), name="metrics-textfile", daemon=True
+        ).start()
@@ -0,0 +1,33 @@
+# services/pipeline_totals.py
+"""
+Totais do pipeline (contador distribuído "pipeline", services/sharded_counter.py).
+
+Uso:
+    python -m services.pipeline_totals            # mostra os totais atuais
+    python -m services.pipeline_totals --rebuild  # recalcula a partir da coleção
+
+Os totais são mantidos por incrementos a cada cadastro, mudança de status,
+mescla e arquivamento. Numa base que já tinha leads antes do contador
+existir eles começam zerados: rode --rebuild uma vez no deploy (e sempre
+que os totais divergirem da coleção). O recálculo lê só o campo status de
+cada lead; escritas feitas durante ele podem ficar de fora, então rode com
+pouco movimento.
+"""
+import argparse
+
+from services.leads_service import get_pipeline_totals, rebuild_pipeline_totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Totais do pipeline de leads.")
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Recalcula os totais a partir da coleção de leads."
+    )
+    args = parser.parse_args()
+
+    totais = rebuild_pipeline_totals() if args.rebuild else get_pipeline_totals(max_age_s=0)
+    print(("Totais recalculados: " if args.rebuild else "Totais do pipeline: ") + str(totais))
+
+
+if __name__ == "__main__":
+    main()
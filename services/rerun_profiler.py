@@ -0,0 +1,167 @@
+# services/rerun_profiler.py
+"""
+Profiling opcional de cada rerun do app (desligado por padrão).
+
+Com LEAD_SYSTEM_PROFILE_DIR definido, cada rerun é amostrado por uma
+thread que lê a pilha do script a cada LEAD_SYSTEM_PROFILE_INTERVAL_MS
+(padrão 5 ms). Ao fim do rerun são gravados no diretório:
+
+- <instante>_<página>_<papel>.folded: pilhas no formato "folded" (uma
+  pilha por linha + contagem), que vira flame graph no speedscope.app
+  ou no flamegraph.pl;
+- <instante>_<página>_<papel>.json: duração, amostras e quanto do tempo
+  foi para Firestore, pandas/numpy, Streamlit (montagem/serialização dos
+  elementos) e código do app.
+
+Só os LEAD_SYSTEM_PROFILE_KEEP reruns mais recentes (padrão 50) ficam no
+diretório. Reruns abaixo de LEAD_SYSTEM_PROFILE_MIN_MS não são gravados.
+Desligado, profile_rerun() devolve um contexto vazio (custo desprezível).
+"""
+import contextlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+PROFILE_DIR = os.getenv("LEAD_SYSTEM_PROFILE_DIR", "")
+_INTERVALO_S = float(os.getenv("LEAD_SYSTEM_PROFILE_INTERVAL_MS", "5")) / 1000
+_MANTER = int(os.getenv("LEAD_SYSTEM_PROFILE_KEEP", "50"))
+_MIN_MS = float(os.getenv("LEAD_SYSTEM_PROFILE_MIN_MS", "0"))
+
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_rotacao_lock = threading.Lock()
+
+# Primeira biblioteca chamada a partir do código do app decide a categoria
+# da amostra (st.dataframe -> streamlit, mesmo que o tempo esteja no pyarrow).
+_CATEGORIAS = (
+    ("firestore", ("google/", "grpc/", "firebase_admin/", "tools/fake_firestore.py",
+                   "services/resilience.py")),
+    ("pandas", ("pandas/", "numpy/", "pyarrow/")),
+    ("streamlit", ("streamlit/",)),
+)
+
+
+def _label(frame) -> str:
+    caminho = frame.f_code.co_filename.replace("\\", "/")
+    if "site-packages/" in caminho:
+        caminho = caminho.split("site-packages/", 1)[1]
+    elif caminho.startswith(_RAIZ.replace("\\", "/")):
+        caminho = caminho[len(_RAIZ) + 1:]
+    else:
+        caminho = os.path.basename(caminho)
+    return f"{caminho}:{frame.f_code.co_name}".replace(";", ",")
+
+
+def _pilha(frame) -> List[str]:
+    pilha = []
+    while frame is not None:
+        pilha.append(_label(frame))
+        frame = frame.f_back
+    pilha.reverse()
+    return pilha
+
+
+def _categoria(pilha: List[str]) -> str:
+    # Ignora o runner do Streamlit por fora do script (até o app.py)
+    inicio = next((i for i, f in enumerate(pilha) if f.startswith("app.py:")), 0)
+    for rotulo in pilha[inicio + 1:]:
+        for nome, prefixos in _CATEGORIAS:
+            if any(p in rotulo for p in prefixos):
+                return nome
+    return "app"
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id: int, intervalo_s: float):
+        super().__init__(name="rerun-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.intervalo_s = intervalo_s
+        self.pilhas: Counter = Counter()
+        self._parar = threading.Event()
+
+    def run(self) -> None:
+        while not self._parar.wait(self.intervalo_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.pilhas[";".join(_pilha(frame))] += 1
+
+    def stop(self) -> Counter:
+        self._parar.set()
+        self.join()
+        return self.pilhas
+
+
+def _slug(texto: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", texto).strip("-").lower() or "x"
+
+
+def _rotacionar(diretorio: str) -> None:
+    with _rotacao_lock:
+        perfis = sorted(
+            (f for f in os.listdir(diretorio) if f.endswith(".folded")),
+            reverse=True,
+        )
+        for antigo in perfis[_MANTER:]:
+            base = os.path.join(diretorio, antigo[: -len(".folded")])
+            for ext in (".folded", ".json"):
+                with contextlib.suppress(OSError):
+                    os.remove(base + ext)
+
+
+def _gravar(tags: Dict, ms: float, pilhas: Counter, intervalo_s: float) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    # Nome ordenável pelo instante: a rotação mantém os mais recentes
+    base = os.path.join(
+        PROFILE_DIR,
+        f"{datetime.now():%Y%m%d-%H%M%S-%f}_{_slug(tags.get('page', ''))}_{_slug(tags.get('role', ''))}",
+    )
+    with open(base + ".folded", "w", encoding="utf-8") as f:
+        for pilha, n in pilhas.most_common():
+            f.write(f"{pilha} {n}\n")
+
+    total = sum(pilhas.values()) or 1
+    por_categoria = Counter()
+    for pilha, n in pilhas.items():
+        por_categoria[_categoria(pilha.split(";"))] += n
+    resumo = {
+        **tags,
+        "duration_ms": round(ms, 1),
+        "samples": sum(pilhas.values()),
+        "interval_ms": intervalo_s * 1000,
+        "share": {cat: round(n / total, 3) for cat, n in por_categoria.most_common()},
+    }
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(resumo, f, ensure_ascii=False, indent=2)
+    _rotacionar(PROFILE_DIR)
+
+
+@contextlib.contextmanager
+def _profile(tags: Dict) -> Iterator[Dict]:
+    sampler = _Sampler(threading.get_ident(), _INTERVALO_S)
+    inicio = time.perf_counter()
+    sampler.start()
+    try:
+        yield tags
+    finally:
+        pilhas = sampler.stop()
+        ms = (time.perf_counter() - inicio) * 1000
+        if ms >= _MIN_MS and pilhas:
+            try:
+                _gravar(tags, ms, pilhas, _INTERVALO_S)
+            except OSError:
+                pass  # perfil é diagnóstico: nunca derruba o rerun
+
+
+def profile_rerun(page: str = "", role: str = ""):
+    """
+    Envolve um rerun. O dict devolvido pode ser atualizado dentro do bloco
+    (ex.: a página final depois da navegação) e vai para o resumo.
+    """
+    if not PROFILE_DIR:
+        return contextlib.nullcontext({})
+    return _profile({"page": page, "role": role})
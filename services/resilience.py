@@ -0,0 +1,251 @@
+# services/resilience.py
+"""
+Chamadas ao Firestore com prazo, retentativas e circuit breaker.
+
+    @firestore_call("list_leads", deadline_s=8)
+    def list_leads(...): ...
+
+- Prazo: a função roda numa thread do pool e quem chamou espera no máximo
+  deadline_s (a thread da página do Streamlit não fica presa num RPC lento).
+  O prazo também vai para os RPCs: cada chamada ao cliente passa
+  timeout=rpc_timeout() (o que resta do prazo), então o RPC desiste junto
+  e a thread do pool volta livre em vez de ficar presa até ele responder.
+- Retentativas: erros transitórios (indisponível, timeout, cota) são
+  repetidos com backoff exponencial com jitter, dentro do mesmo prazo.
+  Só para operações idempotentes (leituras); escritas usam retries=0.
+- Escritas (retries=0) que estouram o prazo levantam GravacaoIncerta: o
+  commit pode ter sido aplicado, e a tela deve pedir para conferir em vez
+  de sugerir repetir.
+- Latência de cada operação (com o resultado: ok, error, unavailable) vai
+  para o histograma OPERATION_SECONDS (services/metrics_registry.py).
+- Circuit breaker: após _FALHAS_PARA_ABRIR falhas seguidas o circuito abre
+  e as chamadas falham na hora com FirestoreIndisponivel durante
+  _ESPERA_ABERTO_S; depois uma chamada de teste decide se fecha de novo.
+
+Quem chama trata FirestoreIndisponivel servindo dados em cache ou parciais.
+As contagens ficam em resilience_metrics().
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from functools import wraps
+from typing import Callable, Dict, Optional
+
+from google.api_core import exceptions as gexc
+
+from services.metrics_registry import OPERATION_SECONDS
+
+_DEADLINE_PADRAO_S = float(os.getenv("LEAD_SYSTEM_FIRESTORE_DEADLINE_S", "8"))
+_FALHAS_PARA_ABRIR = 5
+_ESPERA_ABERTO_S = 30.0
+_BACKOFF_BASE_S = 0.2
+_BACKOFF_MAX_S = 2.0
+# Quem chama espera um pouco além do prazo: o RPC, que recebeu o que
+# restava dele como timeout, costuma desistir e liberar a thread antes
+_FOLGA_RPC_S = 0.5
+
+TRANSIENT_ERRORS = (
+    gexc.ServiceUnavailable,
+    gexc.DeadlineExceeded,
+    gexc.InternalServerError,
+    gexc.GatewayTimeout,
+    gexc.TooManyRequests,
+    gexc.ResourceExhausted,
+)
+
+
+class FirestoreIndisponivel(Exception):
+    """Prazo estourado, erros transitórios esgotados ou circuito aberto."""
+
+
+class GravacaoIncerta(FirestoreIndisponivel):
+    """Escrita sem resposta dentro do prazo: pode ou não ter sido aplicada."""
+
+
+class CircuitBreaker:
+    FECHADO, ABERTO, MEIO_ABERTO = "closed", "open", "half_open"
+
+    def __init__(self, falhas_para_abrir: int = _FALHAS_PARA_ABRIR, espera_s: float = _ESPERA_ABERTO_S):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.espera_s = espera_s
+        self._lock = threading.Lock()
+        self._falhas = 0
+        self._aberto_em: Optional[float] = None
+        self._teste_em_andamento = False
+        self.aberturas = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state_locked()
+
+    def _state_locked(self) -> str:
+        if self._aberto_em is None:
+            return self.FECHADO
+        if time.monotonic() - self._aberto_em >= self.espera_s:
+            return self.MEIO_ABERTO
+        return self.ABERTO
+
+    def allow(self) -> bool:
+        """Libera a chamada? No meio-aberto, só uma chamada de teste por vez."""
+        with self._lock:
+            estado = self._state_locked()
+            if estado == self.FECHADO:
+                return True
+            if estado == self.MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._falhas = 0
+            self._aberto_em = None
+            self._teste_em_andamento = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._falhas += 1
+            self._teste_em_andamento = False
+            if self._aberto_em is not None or self._falhas >= self.falhas_para_abrir:
+                if self._aberto_em is None:
+                    self.aberturas += 1
+                self._aberto_em = time.monotonic()
+
+
+_breaker = CircuitBreaker()
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="firestore-call")
+_local = threading.local()
+_metrics_lock = threading.Lock()
+_metrics: Dict[str, Dict[str, int]] = {}
+
+
+def _count(op: str, campo: str) -> None:
+    with _metrics_lock:
+        m = _metrics.setdefault(
+            op,
+            {"calls": 0, "ok": 0, "timeouts": 0, "retries": 0, "failures": 0, "short_circuited": 0},
+        )
+        m[campo] += 1
+
+
+def _run_marked(fn: Callable, args, kwargs, limite: float):
+    # Chamadas protegidas aninhadas rodam direto nesta thread (sem novo prazo)
+    _local.dentro = True
+    _local.limite = limite
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _local.dentro = False
+        _local.limite = None
+
+
+def rpc_timeout() -> Optional[float]:
+    """
+    Segundos que restam do prazo da chamada protegida em andamento, para o
+    timeout= dos RPCs do cliente. None fora de uma (prazo padrão do cliente).
+    """
+    limite = getattr(_local, "limite", None)
+    if limite is None:
+        return None
+    return max(limite - time.monotonic(), 0.001)
+
+
+def call_with_deadline(
+    op: str,
+    fn: Callable,
+    *args,
+    deadline_s: Optional[float] = None,
+    retries: int = 3,
+    **kwargs,
+):
+    """Executa fn(*args, **kwargs) com prazo, retentativas e circuit breaker."""
+    if getattr(_local, "dentro", False):
+        return fn(*args, **kwargs)
+
+    inicio = time.perf_counter()
+    outcome = "error"
+    try:
+        resultado = _call_protegida(op, fn, args, kwargs, deadline_s, retries)
+        outcome = "ok"
+        return resultado
+    except FirestoreIndisponivel:
+        outcome = "unavailable"
+        raise
+    finally:
+        OPERATION_SECONDS.observe(time.perf_counter() - inicio, op=op, outcome=outcome)
+
+
+def _call_protegida(op: str, fn: Callable, args, kwargs, deadline_s: Optional[float], retries: int):
+    _count(op, "calls")
+    if not _breaker.allow():
+        _count(op, "short_circuited")
+        raise FirestoreIndisponivel(f"{op}: Firestore indisponível (circuito aberto).")
+
+    prazo = deadline_s or _DEADLINE_PADRAO_S
+    limite = time.monotonic() + prazo
+    tentativa = 0
+    while True:
+        restante = limite - time.monotonic()
+        future = _executor.submit(_run_marked, fn, args, kwargs, limite)
+        try:
+            resultado = future.result(timeout=max(restante, 0.001) + _FOLGA_RPC_S)
+        except FutureTimeout:
+            # Algum RPC sem timeout=rpc_timeout(): a thread continua até ele
+            # voltar; quem chamou não espera mais
+            _count(op, "timeouts")
+            _count(op, "failures")
+            _breaker.record_failure()
+            if retries == 0:
+                raise GravacaoIncerta(f"{op}: sem resposta do Firestore em {prazo:g}s.")
+            raise FirestoreIndisponivel(f"{op}: sem resposta do Firestore em {prazo:g}s.")
+        except TRANSIENT_ERRORS as e:
+            espera = min(_BACKOFF_BASE_S * 2 ** tentativa, _BACKOFF_MAX_S) * random.uniform(0.5, 1.5)
+            if tentativa >= retries or time.monotonic() + espera >= limite:
+                if isinstance(e, gexc.DeadlineExceeded):
+                    _count(op, "timeouts")
+                _count(op, "failures")
+                _breaker.record_failure()
+                if retries == 0 and isinstance(e, gexc.DeadlineExceeded):
+                    raise GravacaoIncerta(f"{op}: {e}") from e
+                raise FirestoreIndisponivel(f"{op}: {e}") from e
+            _count(op, "retries")
+            tentativa += 1
+            time.sleep(espera)
+            continue
+        except Exception:
+            # Erro "de negócio" (NotFound, Conflict...): o Firestore respondeu
+            _breaker.record_success()
+            raise
+        _count(op, "ok")
+        _breaker.record_success()
+        return resultado
+
+
+def firestore_call(op: str, deadline_s: Optional[float] = None, retries: int = 3):
+    """
+    Decorator de call_with_deadline. Use retries=0 em escritas não
+    idempotentes (e para que um prazo estourado vire GravacaoIncerta).
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            return call_with_deadline(op, fn, *args, deadline_s=deadline_s, retries=retries, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def resilience_metrics() -> Dict:
+    """Contadores por operação e estado do circuit breaker."""
+    with _metrics_lock:
+        operacoes = {op: dict(m) for op, m in _metrics.items()}
+    return {
+        "breaker": {"state": _breaker.state, "openings": _breaker.aberturas},
+        "operations": operacoes,
+    }
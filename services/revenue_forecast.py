@@ -0,0 +1,192 @@
+# services/revenue_forecast.py
+"""
+Previsão de faturamento: quanto do pipeline em aberto deve virar faturado.
+
+Para cada lead em aberto (novo, atendimento, negociação):
+
+    esperado = valor previsto × P(faturado | etapa) × ajuste do vendedor × ajuste da origem
+
+- P(faturado | etapa) vem do histórico de status (agregado do
+  services/funnel_analytics.py): as transições entre etapas formam uma
+  cadeia de Markov que termina em faturado ou perdido, resolvida num
+  sistema 3×3. Etapas com poucas saídas ficam perto da taxa geral.
+- Os ajustes são a taxa de ganho (faturado / fechados) do vendedor e da
+  origem dividida pela taxa geral, suavizadas como no lead_scoring.
+
+As colunas vêm do LeadScorer (arrays NumPy que só mudam nas linhas
+alteradas no snapshot); a previsão da base inteira é uma conta vetorizada.
+Parâmetros em cache: os ajustes são refeitos quando o snapshot muda de
+versão e as probabilidades por etapa a cada _MODELO_TTL_S.
+"""
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from services.funnel_analytics import get_funnel_aggregate
+from services.lead_scoring import conversion_rates, get_lead_scorer
+from services.leads_service import STATUS_PIPELINE
+
+ETAPAS_ABERTAS = ["novo", "atendimento", "negociacao"]
+
+# Quantas saídas/fechamentos "valem" a taxa geral ao suavizar
+_SUAVIZACAO = 5.0
+_MODELO_TTL_S = 300.0
+
+_STATUS_IDX = {s: i for i, s in enumerate(STATUS_PIPELINE)}
+_FATURADO = _STATUS_IDX["faturado"]
+_PERDIDO = _STATUS_IDX["perdido"]
+_ABERTOS_IDX = np.array([_STATUS_IDX[s] for s in ETAPAS_ABERTAS], dtype=np.intp)
+
+
+def stage_probabilities(transicoes: Dict[str, Dict[str, int]], geral: float) -> Dict[str, float]:
+    """
+    P(faturado) partindo de cada etapa aberta. transicoes[de][para] são as
+    contagens do funil; cada etapa recebe _SUAVIZACAO saídas "fictícias"
+    direto para faturado/perdido na proporção da taxa geral.
+    """
+    n = len(ETAPAS_ABERTAS)
+    q = np.zeros((n, n))  # etapa aberta -> etapa aberta
+    r = np.zeros(n)  # etapa aberta -> faturado
+    for i, etapa in enumerate(ETAPAS_ABERTAS):
+        trans = transicoes.get(etapa) or {}
+        denom = sum(trans.values()) + _SUAVIZACAO
+        for j, destino in enumerate(ETAPAS_ABERTAS):
+            q[i, j] = trans.get(destino, 0) / denom
+        r[i] = (trans.get("faturado", 0) + _SUAVIZACAO * geral) / denom
+    # Cada linha perde massa para faturado/perdido, então I - Q é inversível
+    p = np.linalg.solve(np.eye(n) - q, r)
+    return {etapa: float(v) for etapa, v in zip(ETAPAS_ABERTAS, np.clip(p, 0.0, 1.0))}
+
+
+def _taxa_geral(status: np.ndarray) -> float:
+    ganhos = int(np.count_nonzero(status == _FATURADO))
+    fechados = ganhos + int(np.count_nonzero(status == _PERDIDO))
+    return ganhos / fechados if fechados else 0.5
+
+
+def expected_revenue(
+    valor: np.ndarray,
+    status: np.ndarray,
+    p_status: np.ndarray,
+    ajuste_vendedor: np.ndarray,
+    ajuste_origem: np.ndarray,
+) -> np.ndarray:
+    """
+    Valor esperado por lead (0 para fechados). p_status tem uma posição por
+    status de STATUS_PIPELINE mais uma final (0) para status desconhecido (-1).
+    """
+    prob = np.clip(p_status[status] * ajuste_vendedor * ajuste_origem, 0.0, 1.0)
+    return valor * prob
+
+
+class RevenueForecaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao = -1
+        self._geral = 0.5
+        self._ajuste_vendedor = np.ones(0)
+        self._ajuste_origem = np.ones(0)
+        self._etapas: Dict[str, float] = {}
+        self._etapas_em = float("-inf")
+
+    def _ajustes(self, cols: Dict) -> None:
+        status = cols["status"]
+        geral = self._geral = _taxa_geral(status)
+        n_vendedores, n_origens = len(cols["vendedores"]), cols["n_origens"]
+        if geral > 0:
+            self._ajuste_vendedor = conversion_rates(cols["vendedor"], status, n_vendedores) / geral
+            self._ajuste_origem = conversion_rates(cols["origem"], status, n_origens) / geral
+        else:
+            # Nenhum ganho ainda: sem base para diferenciar vendedores/origens
+            self._ajuste_vendedor = np.ones(n_vendedores)
+            self._ajuste_origem = np.ones(n_origens)
+        self._versao = cols["version"]
+
+    def _probabilidades(self, geral: float) -> Dict[str, float]:
+        with self._lock:
+            if time.monotonic() - self._etapas_em <= _MODELO_TTL_S:
+                return self._etapas
+        # O agregado pode ir ao Firestore: fora do lock, para não segurar as
+        # outras sessões; só a troca de self._etapas é protegida
+        agg = get_funnel_aggregate()
+        etapas = stage_probabilities(agg.get("transicoes") or {}, geral)
+        with self._lock:
+            self._etapas = etapas
+            self._etapas_em = time.monotonic()
+        return etapas
+
+    def forecast(self) -> Dict:
+        """
+        {"leads_abertos", "sem_valor", "total_aberto", "total_esperado",
+        "taxa_geral", "por_etapa": [...], "por_vendedor": [...]}.
+        """
+        cols = get_lead_scorer().columns()
+        with self._lock:
+            desalinhado = (
+                len(self._ajuste_vendedor) != len(cols["vendedores"])
+                or len(self._ajuste_origem) != cols["n_origens"]
+            )
+            if cols["version"] != self._versao or desalinhado:
+                self._ajustes(cols)
+            ajuste_vendedor, ajuste_origem = self._ajuste_vendedor, self._ajuste_origem
+            geral = self._geral
+        etapas = self._probabilidades(geral)
+
+        valor, status, vendedor = cols["valor"], cols["status"], cols["vendedor"]
+        p_status = np.zeros(len(STATUS_PIPELINE) + 1)
+        for etapa, p in etapas.items():
+            p_status[_STATUS_IDX[etapa]] = p
+        esperado = expected_revenue(
+            valor, status, p_status, ajuste_vendedor[vendedor], ajuste_origem[cols["origem"]]
+        )
+        aberto = np.isin(status, _ABERTOS_IDX)
+
+        n_status = len(STATUS_PIPELINE) + 1
+        codigo = np.where(status < 0, n_status - 1, status)
+        leads_etapa = np.bincount(codigo[aberto], minlength=n_status)
+        valor_etapa = np.bincount(codigo[aberto], weights=valor[aberto], minlength=n_status)
+        esperado_etapa = np.bincount(codigo, weights=esperado, minlength=n_status)
+
+        n_vend = len(cols["vendedores"])
+        leads_vend = np.bincount(vendedor[aberto], minlength=n_vend)
+        valor_vend = np.bincount(vendedor[aberto], weights=valor[aberto], minlength=n_vend)
+        esperado_vend = np.bincount(vendedor, weights=esperado, minlength=n_vend)
+
+        por_vendedor: List[Dict] = [
+            {
+                "vendedor": cols["vendedores"][i],
+                "leads": int(leads_vend[i]),
+                "valor_aberto": float(valor_vend[i]),
+                "esperado": float(esperado_vend[i]),
+            }
+            for i in np.flatnonzero(leads_vend)
+        ]
+        por_vendedor.sort(key=lambda v: -v["esperado"])
+        return {
+            "leads_abertos": int(aberto.sum()),
+            "sem_valor": int(np.count_nonzero(aberto & (valor <= 0))),
+            "total_aberto": float(valor[aberto].sum()),
+            "total_esperado": float(esperado.sum()),
+            "taxa_geral": geral,
+            "por_etapa": [
+                {
+                    "etapa": etapa,
+                    "leads": int(leads_etapa[_STATUS_IDX[etapa]]),
+                    "valor_aberto": float(valor_etapa[_STATUS_IDX[etapa]]),
+                    "probabilidade": etapas[etapa],
+                    "esperado": float(esperado_etapa[_STATUS_IDX[etapa]]),
+                }
+                for etapa in ETAPAS_ABERTAS
+            ],
+            "por_vendedor": por_vendedor,
+        }
+
+
+_forecaster = RevenueForecaster()
+
+
+def get_revenue_forecast() -> Dict:
+    """Previsão do pipeline atual (parâmetros compartilhados entre as sessões)."""
+    return _forecaster.forecast()
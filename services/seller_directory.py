@@ -0,0 +1,151 @@
+# services/seller_directory.py
+"""
+Diretório de vendedores em cache, para os filtros e a atribuição de leads.
+
+Junta os usuários cadastrados (coleção usuarios) com os vendedor_email
+que aparecem nos leads (vendedores antigos, sem login). Trocar o filtro na
+tela só lê este cache, sem consulta ao Firestore.
+
+Atualização incremental: a cada _TTL_S só os usuários com created_at a
+partir do último visto (menos _FOLGA_CRIACAO, para relógios atrasados).
+Usuários sem created_at, edições de nome/perfil e remoções (feitas pelo
+console, sem updated_at) só aparecem na releitura completa, a cada
+_RECARGA_TOTAL_S; resolve() antecipa essa releitura (no máximo uma a cada
+_TTL_S) antes de dizer que um email não existe. Os emails dos leads vêm do
+snapshot do services/leads_sync.py e só são recontados quando ele muda de
+versão.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from services.firebase_init import db
+from services.metrics_registry import record_reads
+from services.resilience import FirestoreIndisponivel, call_with_deadline, rpc_timeout
+
+USERS_COLLECTION = "usuarios"
+_TTL_S = 30.0
+_RECARGA_TOTAL_S = 600.0
+_FOLGA_CRIACAO = timedelta(seconds=30)
+
+
+def _normalize(email: Optional[str]) -> str:
+    return (email or "").strip().lower()
+
+
+class SellerDirectory:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usuarios: Dict[str, Tuple[str, str]] = {}  # normalizado -> (email, nome)
+        self._de_leads: Dict[str, str] = {}  # email normalizado -> email como gravado
+        self._watermark: Optional[datetime] = None
+        self._lido_em = float("-inf")
+        self._recarga_em = float("-inf")
+        self._versao_leads = -1
+
+    def _buscar_usuarios(self, desde: Optional[datetime]):
+        q = db.collection(USERS_COLLECTION).select(["nome", "created_at"])
+        if desde is not None:
+            q = q.where(filter=FieldFilter("created_at", ">=", desde - _FOLGA_CRIACAO))
+        return list(q.stream(timeout=rpc_timeout()))
+
+    def _refresh_usuarios(self, max_age_s: float, recarga_s: float = _RECARGA_TOTAL_S) -> None:
+        agora = time.monotonic()
+        with self._lock:
+            if agora - self._lido_em < max_age_s:
+                return
+            completo = agora - self._recarga_em >= recarga_s
+            desde = None if completo else self._watermark
+
+        snaps = call_with_deadline("seller_directory", self._buscar_usuarios, desde)
+        record_reads(USERS_COLLECTION, len(snaps))
+
+        usuarios = {} if completo else dict(self._usuarios)
+        watermark = None if completo else self._watermark
+        for snap in snaps:
+            data = snap.to_dict() or {}
+            # O ID do documento é o email usado no login
+            usuarios[_normalize(snap.id)] = (snap.id, data.get("nome") or "")
+            criado = data.get("created_at")
+            if criado is not None and (watermark is None or criado > watermark):
+                watermark = criado
+        with self._lock:
+            self._usuarios = usuarios
+            self._watermark = watermark
+            self._lido_em = agora
+            if completo:
+                self._recarga_em = agora
+
+    def _refresh_leads(self) -> None:
+        # Import tardio: leads_sync depende de leads_service, que usa este módulo
+        from services.leads_sync import get_snapshot
+
+        snapshot = get_snapshot(sync=False)
+        if snapshot.version == self._versao_leads:
+            return
+        emails = {}
+        for lead in snapshot.leads():
+            email = lead.get("vendedor_email")
+            if email:
+                emails.setdefault(_normalize(email), email)
+        with self._lock:
+            self._de_leads = emails
+            self._versao_leads = snapshot.version
+
+    def sellers(self, com_conta: bool = False, max_age_s: float = _TTL_S) -> List[Dict]:
+        """
+        Vendedores ordenados por email: [{"email", "nome", "tem_conta"}].
+        Com com_conta=True, só quem está em usuarios (para atribuir leads).
+        Com o Firestore fora, serve a última lista lida.
+        """
+        try:
+            self._refresh_usuarios(max_age_s)
+        except FirestoreIndisponivel:
+            pass  # segue com a última lista lida
+        if not com_conta:
+            self._refresh_leads()
+        with self._lock:
+            vendedores = {
+                norm: {"email": email, "nome": nome, "tem_conta": True}
+                for norm, (email, nome) in self._usuarios.items()
+            }
+            if not com_conta:
+                for norm, email in self._de_leads.items():
+                    vendedores.setdefault(norm, {"email": email, "nome": "", "tem_conta": False})
+        return [vendedores[e] for e in sorted(vendedores)]
+
+    def emails(self, com_conta: bool = False) -> List[str]:
+        return [v["email"] for v in self.sellers(com_conta=com_conta)]
+
+    def resolve(self, email: Optional[str]) -> Optional[str]:
+        """
+        Email do usuário cadastrado como está no login (ignora caixa e
+        espaços), ou None se não existe. Relê usuarios antes de dizer que não.
+        """
+        norm = _normalize(email)
+        if not norm:
+            return None
+        for max_age_s, recarga_s in ((_TTL_S, _RECARGA_TOTAL_S), (0, _TTL_S)):
+            # Na segunda volta: pode ter sido cadastrado agora (ou em outro
+            # servidor, ou sem created_at); relê tudo se a última foi há mais de _TTL_S
+            self._refresh_usuarios(max_age_s, recarga_s)
+            with self._lock:
+                if norm in self._usuarios:
+                    return self._usuarios[norm][0]
+        return None
+
+    def label(self, email: Optional[str]) -> str:
+        """Texto para selectbox: "Nome (email)" ou só o email."""
+        with self._lock:
+            _, nome = self._usuarios.get(_normalize(email), (None, ""))
+        return f"{nome} ({email})" if nome else (email or "")
+
+
+_directory = SellerDirectory()
+
+
+def get_seller_directory() -> SellerDirectory:
+    return _directory
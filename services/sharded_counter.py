@@ -0,0 +1,94 @@
+# services/sharded_counter.py
+"""
+Contadores distribuídos em N documentos (shards) no Firestore.
+
+Um documento aguenta poucas escritas por segundo; um contador único
+("total de leads") viraria gargalo numa rajada de cadastros. Cada
+incremento vai para um shard sorteado e a leitura soma os shards, com
+um cache curto para não reler a cada refresh.
+
+    counters/{nome}/shards/{0..N-1}  ->  {campo: valor, ...}
+"""
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from google.cloud.firestore_v1 import Increment
+
+from services.firebase_init import db
+from services.metrics_registry import record_cache, record_reads, record_writes
+from services.resilience import rpc_timeout
+
+COUNTERS_COLLECTION = "counters"
+_SHARDS_SUBCOLLECTION = "shards"
+_DEFAULT_SHARDS = 10
+_CACHE_TTL_S = 5.0
+
+
+class ShardedCounter:
+    def __init__(self, name: str, num_shards: int = _DEFAULT_SHARDS, cache_ttl_s: float = _CACHE_TTL_S):
+        self.name = name
+        self.num_shards = num_shards
+        self.cache_ttl_s = cache_ttl_s
+        self._lock = threading.Lock()
+        self._cache: Optional[Dict[str, float]] = None
+        self._cache_em = 0.0
+
+    def _shards_ref(self):
+        return (
+            db.collection(COUNTERS_COLLECTION)
+            .document(self.name)
+            .collection(_SHARDS_SUBCOLLECTION)
+        )
+
+    def _shard_ref(self, shard: int):
+        return self._shards_ref().document(str(shard))
+
+    def stage_increment(self, batch, deltas: Dict[str, float]) -> None:
+        """
+        Adiciona ao batch um incremento (uma escrita, num shard sorteado)
+        para que o contador mude junto com a escrita que o motivou.
+        """
+        deltas = {campo: n for campo, n in deltas.items() if n}
+        if not deltas:
+            return
+        shard = self._shard_ref(random.randrange(self.num_shards))
+        batch.set(shard, {campo: Increment(n) for campo, n in deltas.items()}, merge=True)
+
+    def increment(self, deltas: Dict[str, float]) -> None:
+        """Incremento avulso, fora de um batch."""
+        batch = db.batch()
+        self.stage_increment(batch, deltas)
+        record_writes(f"counter_{self.name}", len(batch))
+        batch.commit(timeout=rpc_timeout())
+
+    def read(self, max_age_s: Optional[float] = None) -> Dict[str, float]:
+        """Soma dos shards; reaproveita a última soma por até cache_ttl_s."""
+        ttl = self.cache_ttl_s if max_age_s is None else max_age_s
+        with self._lock:
+            if self._cache is not None and time.monotonic() - self._cache_em < ttl:
+                record_cache("sharded_counter", True)
+                return dict(self._cache)
+        record_cache("sharded_counter", False)
+        totais: Dict[str, float] = {}
+        shards = list(self._shards_ref().stream(timeout=rpc_timeout()))
+        record_reads(COUNTERS_COLLECTION, len(shards))
+        for snap in shards:
+            for campo, valor in (snap.to_dict() or {}).items():
+                if isinstance(valor, (int, float)):
+                    totais[campo] = totais.get(campo, 0) + valor
+        with self._lock:
+            self._cache = totais
+            self._cache_em = time.monotonic()
+        return dict(totais)
+
+    def reset(self, valores: Dict[str, float]) -> None:
+        """Regrava o contador com `valores` (backfill/correção): shard 0 leva tudo."""
+        batch = db.batch()
+        for shard in range(self.num_shards):
+            batch.set(self._shard_ref(shard), dict(valores) if shard == 0 else {})
+        record_writes(f"counter_{self.name}", len(batch))
+        batch.commit()
+        with self._lock:
+            self._cache = None
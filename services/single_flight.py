@@ -0,0 +1,102 @@
+# services/single_flight.py
+"""
+Single-flight: chamadas idênticas e simultâneas viram uma consulta só.
+
+    @single_flight("list_top_leads")
+    @firestore_call("list_top_leads")
+    def list_top_leads(...): ...
+
+Às 8h dezenas de sessões abrem a home ao mesmo tempo e pedem as mesmas
+consultas: list_top_leads e list_negociacoes_sem_valor (home do vendedor),
+get_archive_totals e read_daily_metrics (home do admin) e
+get_pipeline_totals (/metrics da ingestão). A listagem e as estatísticas
+da base vêm do snapshot (services/leads_sync.py) e não passam por aqui.
+A primeira chamada (líder) consulta o Firestore; as que
+chegam com os mesmos argumentos enquanto ela está em voo esperam e
+recebem o mesmo resultado (ou a mesma exceção). Nada é guardado depois:
+a chamada seguinte, já com a líder concluída, consulta de novo.
+
+O resultado é compartilhado entre quem esperou: trate como somente leitura.
+Fica por fora do firestore_call, então o prazo e as retentativas valem
+uma vez para o grupo todo.
+"""
+import inspect
+import threading
+from functools import wraps
+from typing import Callable, Dict, Hashable
+
+from services.metrics_registry import record_cache
+
+_lock = threading.Lock()
+_em_voo: Dict[Hashable, "_Chamada"] = {}
+_metrics: Dict[str, Dict[str, int]] = {}
+
+
+class _Chamada:
+    __slots__ = ("pronta", "resultado", "erro")
+
+    def __init__(self):
+        self.pronta = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+def _hashable(valor) -> Hashable:
+    try:
+        hash(valor)
+        return valor
+    except TypeError:
+        return repr(valor)
+
+
+def _chave(op: str, assinatura: inspect.Signature, args, kwargs) -> Hashable:
+    # Posicional ou nomeado, com ou sem default: mesma chave
+    bound = assinatura.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return op, tuple((nome, _hashable(v)) for nome, v in bound.arguments.items())
+
+
+def single_flight(op: str):
+    def decorator(fn: Callable) -> Callable:
+        assinatura = inspect.signature(fn)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            chave = _chave(op, assinatura, args, kwargs)
+            with _lock:
+                chamada = _em_voo.get(chave)
+                lider = chamada is None
+                if lider:
+                    chamada = _em_voo[chave] = _Chamada()
+                # Por operação: os argumentos (vendedor, datas) não têm limite
+                m = _metrics.setdefault(op, {"calls": 0, "executed": 0, "coalesced": 0})
+                m["calls"] += 1
+                m["executed" if lider else "coalesced"] += 1
+            record_cache("single_flight", not lider)
+
+            if not lider:
+                chamada.pronta.wait()
+                if chamada.erro is not None:
+                    raise chamada.erro
+                return chamada.resultado
+
+            try:
+                chamada.resultado = fn(*args, **kwargs)
+                return chamada.resultado
+            except BaseException as e:
+                chamada.erro = e
+                raise
+            finally:
+                with _lock:
+                    _em_voo.pop(chave, None)
+                chamada.pronta.set()
+
+        return wrapper
+
+    return decorator
+
+
+def single_flight_metrics() -> Dict[str, Dict[str, int]]:
+    """Por operação: calls, executed e coalesced."""
+    with _lock:
+        return {op: dict(m) for op, m in _metrics.items()}
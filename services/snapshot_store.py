@@ -0,0 +1,144 @@
+# services/snapshot_store.py
+"""
+Persistência local (SQLite) do snapshot de leads e do watermark do sync.
+
+Permite que o servidor, depois de um deploy/restart, sirva o primeiro
+dashboard a partir do disco enquanto reconcilia com o Firestore em
+background (ver services/leads_sync.py). Cada sync grava apenas os leads
+que mudaram.
+
+O arquivo guarda o projeto Firebase de onde os leads vieram; um arquivo de
+outro projeto (troca de ambiente na mesma máquina) é ignorado e
+substituído na primeira carga completa.
+"""
+import json
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.getenv("LEAD_SYSTEM_SNAPSHOT_PATH", ".cache/leads_snapshot.sqlite3")
+
+_SCHEMA_VERSION = "1"
+
+# Leitura via mmap: o SO pagina o arquivo direto para a memória
+_MMAP_SIZE = 256 * 1024 * 1024
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__dt__": value.isoformat()}
+    raise TypeError(f"Tipo não serializável: {type(value)!r}")
+
+
+def _decode(obj: dict):
+    if "__dt__" in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj["__dt__"])
+    return obj
+
+
+class SnapshotStore:
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        project: Callable[[], Optional[str]] = lambda: None,
+    ):
+        self.path = path
+        # Chamado só ao ler/gravar: o cliente do Firestore é criado sob demanda
+        self._project = project
+        # Instante (UTC) da última carga completa gravada; preenchido por load()
+        self.full_load_at: Optional[datetime] = None
+
+    @contextmanager
+    def _open(self):
+        conn = self._connect()
+        try:
+            with conn:  # commit/rollback
+                yield conn
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute(f"PRAGMA mmap_size={_MMAP_SIZE}")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS leads (id TEXT PRIMARY KEY, data TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        return conn
+
+    def load(self) -> Tuple[Dict[str, Dict], Optional[datetime]]:
+        """Lê o snapshot salvo. Retorna ({}, None) se não houver nada válido."""
+        if not os.path.exists(self.path):
+            return {}, None
+        try:
+            with self._open() as conn:
+                meta = dict(conn.execute("SELECT key, value FROM meta"))
+                if meta.get("schema") != _SCHEMA_VERSION or not meta.get("watermark"):
+                    return {}, None
+                projeto = self._project() or ""
+                if meta.get("project", "") != projeto:
+                    logger.warning(
+                        "Snapshot local de outro projeto ignorado (%s): %r, atual %r",
+                        self.path, meta.get("project", ""), projeto,
+                    )
+                    return {}, None
+                leads = {
+                    lead_id: json.loads(data, object_hook=_decode)
+                    for lead_id, data in conn.execute("SELECT id, data FROM leads")
+                }
+                if meta.get("full_load_at"):
+                    self.full_load_at = datetime.fromisoformat(meta["full_load_at"])
+                return leads, datetime.fromisoformat(meta["watermark"])
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning("Snapshot local ignorado (%s): %s", self.path, e)
+            return {}, None
+
+    def save(
+        self,
+        alterados: Dict[str, Dict],
+        removidos: Iterable[str],
+        watermark: Optional[datetime],
+        completo: bool = False,
+    ) -> None:
+        """Grava só o delta. Com completo=True substitui o conteúdo inteiro."""
+        if watermark is None:
+            return
+        try:
+            pasta = os.path.dirname(self.path)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            with self._open() as conn:
+                if completo:
+                    conn.execute("DELETE FROM leads")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO leads (id, data) VALUES (?, ?)",
+                    [
+                        (lead_id, json.dumps(data, default=_encode))
+                        for lead_id, data in alterados.items()
+                    ],
+                )
+                conn.executemany(
+                    "DELETE FROM leads WHERE id = ?", [(i,) for i in removidos]
+                )
+                meta = [
+                    ("schema", _SCHEMA_VERSION),
+                    ("watermark", watermark.isoformat()),
+                    ("project", self._project() or ""),
+                ]
+                if completo:
+                    meta.append(("full_load_at", datetime.utcnow().isoformat()))
+                conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta)
+        except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+            # O snapshot em disco é só um acelerador; o app segue sem ele.
+            # TypeError/ValueError: campo que o JSON não representa (o lote
+            # inteiro é desfeito, o arquivo continua consistente)
+            logger.warning("Falha ao gravar snapshot local (%s): %s", self.path, e)
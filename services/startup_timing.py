@@ -0,0 +1,90 @@
+# services/startup_timing.py
+"""
+Medição do cold start do app: tempo de import de cada módulo de página
+(carregado sob demanda pelo app.py) e tempo até o primeiro render.
+
+Com LEAD_SYSTEM_STARTUP_REPORT=1 o relatório vai para o log na primeira
+renderização do processo, com aviso se passar da meta
+LEAD_SYSTEM_COLD_START_TARGET_MS (padrão 1500 ms). Para o detalhe de
+cada dependência, rode com `python -X importtime -m streamlit run app.py`.
+"""
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Primeiro import deste módulo = início do script do app neste processo
+_PROCESS_START = time.perf_counter()
+
+_HEAVY_MODULES = ("pandas", "numpy", "firebase_admin", "google.cloud.firestore")
+
+_lock = threading.Lock()
+_import_ms: Dict[str, float] = {}
+_first_render: Optional[Dict] = None
+
+
+def timed_import(module_name: str) -> ModuleType:
+    """importlib.import_module registrando quanto o primeiro import custou."""
+    if module_name in sys.modules:
+        # import_module espera, se outra sessão ainda estiver importando
+        return importlib.import_module(module_name)
+    inicio = time.perf_counter()
+    module = importlib.import_module(module_name)
+    with _lock:
+        _import_ms.setdefault(module_name, (time.perf_counter() - inicio) * 1000)
+    return module
+
+
+def mark_first_render(page: str) -> None:
+    """Registra o primeiro render do processo (chamar ao fim do script)."""
+    global _first_render
+    with _lock:
+        if _first_render is not None:
+            return
+        _first_render = {
+            "page": page,
+            "ms": (time.perf_counter() - _PROCESS_START) * 1000,
+            # Quais dependências pesadas já estavam carregadas nesse ponto
+            "heavy_loaded": [m for m in _HEAVY_MODULES if m in sys.modules],
+        }
+    if os.getenv("LEAD_SYSTEM_STARTUP_REPORT"):
+        log_startup_report()
+
+
+def startup_report() -> Dict:
+    with _lock:
+        return {
+            "imports_ms": dict(_import_ms),
+            "first_render": dict(_first_render) if _first_render else None,
+            "target_ms": float(os.getenv("LEAD_SYSTEM_COLD_START_TARGET_MS", "1500")),
+        }
+
+
+def log_startup_report() -> None:
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+    report = startup_report()
+    first = report["first_render"]
+    for name, ms in sorted(report["imports_ms"].items(), key=lambda kv: -kv[1]):
+        logger.info("import %-24s %8.1f ms", name, ms)
+    if first is None:
+        return
+    logger.info(
+        "primeiro render (%s): %.1f ms | dependências pesadas carregadas: %s",
+        first["page"],
+        first["ms"],
+        ", ".join(first["heavy_loaded"]) or "nenhuma",
+    )
+    if first["ms"] > report["target_ms"]:
+        logger.warning(
+            "Cold start de %.1f ms acima da meta de %.0f ms.",
+            first["ms"],
+            report["target_ms"],
+        )
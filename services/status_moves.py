@@ -0,0 +1,40 @@
+# services/status_moves.py
+"""
+Execução em background das mudanças de status feitas no Kanban.
+
+A UI aplica a mudança localmente na hora e usa o Future retornado para
+confirmar ou desfazer quando a gravação terminar. Movimentos do mesmo
+lead são encadeados, para que cliques rápidos (➡ ➡) sejam gravados na
+ordem em que foram feitos.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Tuple
+
+from services.leads_service import update_lead_status
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lead-status")
+_lock = threading.Lock()
+_ultimo_por_lead: Dict[str, Future] = {}
+
+
+def _run(anterior: Future, lead_id: str, novo_status: str) -> Tuple[bool, str]:
+    if anterior is not None:
+        # O pool é FIFO: o movimento anterior já está rodando ou terminou
+        anterior.exception()
+    return update_lead_status(lead_id, novo_status)
+
+
+def _forget(lead_id: str, future: Future) -> None:
+    with _lock:
+        if _ultimo_por_lead.get(lead_id) is future:
+            del _ultimo_por_lead[lead_id]
+
+
+def submit_status_move(lead_id: str, novo_status: str) -> Future:
+    """Agenda update_lead_status; o Future resolve para (ok, msg)."""
+    with _lock:
+        future = _executor.submit(_run, _ultimo_por_lead.get(lead_id), lead_id, novo_status)
+        _ultimo_por_lead[lead_id] = future
+    future.add_done_callback(lambda f: _forget(lead_id, f))
+    return future
@@ -0,0 +1,262 @@
+# services/streaming_stats.py
+"""
+Estatísticas de leads em uma passada, com resultados parciais mescláveis.
+
+- QuantileSketch: histograma logarítmico (estilo DDSketch) para mediana e
+  p90 do ticket com erro relativo de até _ERRO_RELATIVO. Dois sketches se
+  mesclam somando contagens, e um valor pode ser retirado (delta).
+- LeadStats: contagens por status, valor previsto, ticket médio (geral e
+  dos faturados), mediana/p90 e o mesmo por vendedor. add/remove/merge:
+  partes calculadas separadamente (shards, lotes, deltas do snapshot) se
+  juntam sem reler os leads.
+- get_snapshot_stats(): resumo do snapshot; o acumulador é atualizado por
+  delta quando o snapshot muda de versão (só os ids de changes_since) e
+  refeito do zero depois de uma carga completa, o que também descarta o
+  erro de arredondamento acumulado nas somas.
+
+Ticket = valor previsto dos leads que têm valor (> 0).
+"""
+import math
+import threading
+from typing import Dict, Iterable, Mapping, Optional, Sequence
+
+_ERRO_RELATIVO = 0.01
+_STATUS_PADRAO = "novo"
+
+
+def _valor(lead: Mapping) -> float:
+    try:
+        return max(float(lead.get("valor_previsto") or 0), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class QuantileSketch:
+    def __init__(self, erro_relativo: float = _ERRO_RELATIVO):
+        self.erro_relativo = erro_relativo
+        self._gamma = (1 + erro_relativo) / (1 - erro_relativo)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets: Dict[int, int] = {}
+        self.count = 0
+
+    def _indice(self, x: float) -> int:
+        return math.ceil(math.log(x) / self._log_gamma)
+
+    def add(self, x: float, n: int = 1) -> None:
+        """Só valores positivos; n negativo retira (ver remove)."""
+        if x <= 0:
+            return
+        i = self._indice(x)
+        novo = self._buckets.get(i, 0) + n
+        if novo > 0:
+            self._buckets[i] = novo
+        else:
+            self._buckets.pop(i, None)
+        self.count += n
+
+    def remove(self, x: float) -> None:
+        self.add(x, -1)
+
+    def merge(self, outro: "QuantileSketch") -> "QuantileSketch":
+        if outro.erro_relativo != self.erro_relativo:
+            raise ValueError("Sketches com precisões diferentes não se mesclam.")
+        for i, n in outro._buckets.items():
+            self._buckets[i] = self._buckets.get(i, 0) + n
+        self.count += outro.count
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Valor no quantil q (0..1), ou None se vazio."""
+        if self.count <= 0:
+            return None
+        posicao = q * (self.count - 1)
+        acumulado = 0
+        for i in sorted(self._buckets):
+            acumulado += self._buckets[i]
+            if acumulado > posicao:
+                # Meio do bucket (em escala log): erro relativo <= erro_relativo
+                return 2 * self._gamma ** i / (self._gamma + 1)
+        return 2 * self._gamma ** max(self._buckets) / (self._gamma + 1)
+
+    def to_dict(self) -> Dict:
+        return {"erro_relativo": self.erro_relativo, "buckets": dict(self._buckets)}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "QuantileSketch":
+        sketch = cls(data["erro_relativo"])
+        for i, n in data["buckets"].items():
+            sketch._buckets[int(i)] = n
+            sketch.count += n
+        return sketch
+
+
+class _Grupo:
+    """Acumuladores de um recorte (toda a base ou um vendedor)."""
+
+    __slots__ = ("total", "valor_total", "por_status", "valor_por_status", "tickets",
+                 "soma_tickets", "ganhos", "soma_ganhos", "sketch")
+
+    def __init__(self, status: Sequence[str], com_sketch: bool):
+        self.total = 0
+        self.valor_total = 0.0
+        self.por_status = {s: 0 for s in status}
+        self.valor_por_status = {s: 0.0 for s in status}
+        self.tickets = 0
+        self.soma_tickets = 0.0
+        self.ganhos = 0
+        self.soma_ganhos = 0.0
+        self.sketch = QuantileSketch() if com_sketch else None
+
+    def add(self, status: str, valor: float, sinal: int) -> None:
+        self.total += sinal
+        self.valor_total += sinal * valor
+        if status in self.por_status:
+            self.por_status[status] += sinal
+            self.valor_por_status[status] += sinal * valor
+        if valor > 0:
+            self.tickets += sinal
+            self.soma_tickets += sinal * valor
+            if self.sketch is not None:
+                self.sketch.add(valor, sinal)
+            if status == "faturado":
+                self.ganhos += sinal
+                self.soma_ganhos += sinal * valor
+
+    def merge(self, outro: "_Grupo") -> None:
+        self.total += outro.total
+        self.valor_total += outro.valor_total
+        for s, n in outro.por_status.items():
+            self.por_status[s] = self.por_status.get(s, 0) + n
+        for s, v in outro.valor_por_status.items():
+            self.valor_por_status[s] = self.valor_por_status.get(s, 0.0) + v
+        self.tickets += outro.tickets
+        self.soma_tickets += outro.soma_tickets
+        self.ganhos += outro.ganhos
+        self.soma_ganhos += outro.soma_ganhos
+        if self.sketch is not None and outro.sketch is not None:
+            self.sketch.merge(outro.sketch)
+
+    def resumo(self) -> Dict:
+        resumo = {
+            "total": self.total,
+            "por_status": dict(self.por_status),
+            "valor_por_status": dict(self.valor_por_status),
+            "total_valor_previsto": self.valor_total,
+            "ticket_medio": self.soma_tickets / self.tickets if self.tickets else 0.0,
+            "ticket_medio_ganho": self.soma_ganhos / self.ganhos if self.ganhos else 0.0,
+        }
+        if self.sketch is not None:
+            resumo["ticket_mediana"] = self.sketch.quantile(0.5) or 0.0
+            resumo["ticket_p90"] = self.sketch.quantile(0.9) or 0.0
+        return resumo
+
+
+class LeadStats:
+    """
+    Acumulador de estatísticas de leads. `status` é a lista de etapas do
+    funil (STATUS_PIPELINE); status fora dela contam só no total.
+    """
+
+    def __init__(self, status: Sequence[str], sketch_por_vendedor: bool = True):
+        self.status = list(status)
+        self.sketch_por_vendedor = sketch_por_vendedor
+        self.geral = _Grupo(self.status, com_sketch=True)
+        self.por_vendedor: Dict[str, _Grupo] = {}
+
+    def _vendedor(self, email: str) -> _Grupo:
+        grupo = self.por_vendedor.get(email)
+        if grupo is None:
+            grupo = self.por_vendedor[email] = _Grupo(self.status, self.sketch_por_vendedor)
+        return grupo
+
+    def add(self, lead: Mapping, sinal: int = 1) -> None:
+        status = lead.get("status", _STATUS_PADRAO)
+        valor = _valor(lead)
+        self.geral.add(status, valor, sinal)
+        self._vendedor(lead.get("vendedor_email") or "").add(status, valor, sinal)
+
+    def remove(self, lead: Mapping) -> None:
+        """Retira um lead já somado (mesma versão que foi adicionada)."""
+        self.add(lead, -1)
+
+    def add_all(self, leads: Iterable[Mapping]) -> "LeadStats":
+        for lead in leads:
+            self.add(lead)
+        return self
+
+    def merge(self, outro: "LeadStats") -> "LeadStats":
+        """Soma um resultado parcial (outro shard/lote) a este."""
+        self.geral.merge(outro.geral)
+        for email, grupo in outro.por_vendedor.items():
+            self._vendedor(email).merge(grupo)
+        return self
+
+    def summary(self, vendedor_email: Optional[str] = None) -> Dict:
+        """
+        Mesmo formato do get_leads_stats (toda a base ou um vendedor). Sem
+        vendedor, inclui "por_vendedor" com o resumo de cada um.
+        """
+        if vendedor_email is not None:
+            grupo = self.por_vendedor.get(vendedor_email) or _Grupo(self.status, True)
+            return grupo.resumo()
+        resumo = self.geral.resumo()
+        resumo["por_vendedor"] = {
+            email: grupo.resumo() for email, grupo in self.por_vendedor.items() if grupo.total
+        }
+        return resumo
+
+
+class _SnapshotStats:
+    """LeadStats do snapshot mantido por delta (identidade dos leads, como no scorer)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao = -1
+        self._leads: Dict[str, Mapping] = {}
+        self._stats: Optional[LeadStats] = None
+
+    def summary(self, snapshot, status: Sequence[str], vendedor_email: Optional[str]) -> Dict:
+        with self._lock:
+            self._sync_locked(snapshot, status)
+            return self._stats.summary(vendedor_email)
+
+    def _sync_locked(self, snapshot, status: Sequence[str]) -> None:
+        if self._stats is not None and snapshot.version == self._versao:
+            return
+        mudancas = None if self._stats is None else snapshot.changes_since(self._versao)
+        if mudancas is None:
+            # Versão lida antes dos leads: se eles já estiverem adiante, o
+            # próximo delta reaplica esses ids (comparação por identidade)
+            versao = snapshot.version
+            leads = snapshot.leads()
+            self._stats = LeadStats(status).add_all(leads)
+            self._leads = {lead["id"]: lead for lead in leads}
+            self._versao = versao
+            return
+        ids, versao = mudancas
+        for lead_id in ids:
+            antigo, novo = self._leads.get(lead_id), snapshot.get(lead_id)
+            if antigo is novo:
+                continue
+            if antigo is not None:
+                self._stats.remove(antigo)
+                del self._leads[lead_id]
+            if novo is not None:
+                self._stats.add(novo)
+                self._leads[lead_id] = novo
+        self._versao = versao
+
+
+_snapshot_stats = _SnapshotStats()
+
+
+def get_snapshot_stats(vendedor_email: Optional[str] = None) -> Dict:
+    """
+    Resumo (formato do get_leads_stats) do snapshot atual, de toda a base ou
+    de um vendedor. O acumulador é compartilhado e só o delta é recalculado.
+    """
+    # Import tardio: leads_sync depende de leads_service, que usa este módulo
+    from services.leads_service import STATUS_PIPELINE
+    from services.leads_sync import get_snapshot
+
+    return _snapshot_stats.summary(get_snapshot(), STATUS_PIPELINE, vendedor_email)
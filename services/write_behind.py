@@ -0,0 +1,166 @@
+# services/write_behind.py
+"""
+Write-behind para edições de campos de lead (valor, observações...).
+
+A edição é confirmada na hora para o usuário e gravada por uma thread em
+background. Edições do mesmo lead que chegam antes do flush são mescladas
+em uma única escrita (a mais nova vence campo a campo). Falhas
+transitórias (FirestoreIndisponivel) são re-tentadas com backoff
+exponencial, respeitado também durante um flush(); depois de
+_MAX_TENTATIVAS, ou na hora para erros que não adianta repetir (lead
+apagado, campo inválido), a edição vai para a lista de falhas, que a UI
+mostra ao usuário.
+"""
+import atexit
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.leads_service import write_lead_fields
+from services.resilience import FirestoreIndisponivel
+
+_FLUSH_INTERVAL_S = 0.5
+_MAX_TENTATIVAS = 5
+_BACKOFF_BASE_S = 0.5
+_BACKOFF_MAX_S = 30.0
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        write_fn: Callable[[str, Dict], None] = write_lead_fields,
+        flush_interval_s: float = _FLUSH_INTERVAL_S,
+    ):
+        self._write_fn = write_fn
+        self._flush_interval_s = flush_interval_s
+        self._cond = threading.Condition()
+        # lead_id -> (campos mesclados, instante em que pode ser gravado, tentativas)
+        self._pending: Dict[str, Tuple[Dict, float, int]] = {}
+        self._inflight: Dict[str, Dict] = {}
+        self._failures: List[Dict] = []
+        self._flush_now = False
+        self.writes = 0
+        self.coalesced = 0
+        self.retries = 0
+        self._worker = threading.Thread(target=self._run, name="lead-write-behind", daemon=True)
+        self._worker.start()
+
+    def enqueue(self, lead_id: str, campos: Dict) -> None:
+        """Registra a edição e retorna imediatamente."""
+        with self._cond:
+            if lead_id in self._pending:
+                atuais, due, tentativas = self._pending[lead_id]
+                self._pending[lead_id] = ({**atuais, **campos}, due, tentativas)
+                self.coalesced += 1
+            else:
+                due = time.monotonic() + self._flush_interval_s
+                self._pending[lead_id] = (dict(campos), due, 0)
+            self._cond.notify()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Grava tudo que está pendente agora. True se esvaziou a fila a tempo."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_now = True
+            self._cond.notify()
+            while self._pending or self._inflight:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._cond.wait(restante)
+        return True
+
+    def depth(self) -> int:
+        """Quantos leads têm edição ainda não gravada."""
+        with self._cond:
+            return len(self._pending.keys() | self._inflight.keys())
+
+    def pending_for(self, lead_id: str) -> Optional[Dict]:
+        """Campos ainda não gravados de um lead (para mostrar o valor novo)."""
+        with self._cond:
+            campos = dict(self._inflight.get(lead_id) or {})
+            if lead_id in self._pending:
+                campos.update(self._pending[lead_id][0])
+            return campos or None
+
+    def apply_pending(self, leads: Iterable[Dict]) -> List[Dict]:
+        """Sobrepõe as edições pendentes aos leads lidos do banco."""
+        out = []
+        for lead in leads:
+            campos = self.pending_for(lead.get("id"))
+            out.append({**lead, **campos} if campos else lead)
+        return out
+
+    def take_failures(self, lead_ids: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Retira (e retorna) as falhas definitivas, opcionalmente só destes leads."""
+        with self._cond:
+            ids = None if lead_ids is None else set(lead_ids)
+            minhas = [f for f in self._failures if ids is None or f["lead_id"] in ids]
+            self._failures = [f for f in self._failures if f not in minhas]
+            return minhas
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                agora = time.monotonic()
+                # O flush antecipa edições novas, não as que esperam backoff
+                prontos = {
+                    lead_id: item
+                    for lead_id, item in self._pending.items()
+                    if item[1] <= agora or (self._flush_now and item[2] == 0)
+                }
+                if not prontos:
+                    self._flush_now = False
+                    proximo = min((item[1] for item in self._pending.values()), default=None)
+                    self._cond.wait(None if proximo is None else max(proximo - agora, 0.01))
+                    continue
+                for lead_id, (campos, _, _) in prontos.items():
+                    del self._pending[lead_id]
+                    self._inflight[lead_id] = campos
+
+            for lead_id, (campos, _, tentativas) in prontos.items():
+                erro, transitorio = None, False
+                try:
+                    self._write_fn(lead_id, campos)
+                except FirestoreIndisponivel as e:
+                    erro, transitorio = str(e), True
+                except Exception as e:
+                    erro = str(e) or type(e).__name__
+                with self._cond:
+                    del self._inflight[lead_id]
+                    if erro is None:
+                        self.writes += 1
+                    elif transitorio:
+                        self._retry_locked(lead_id, campos, tentativas + 1, erro)
+                    else:
+                        self._failures.append({"lead_id": lead_id, "campos": campos, "erro": erro})
+                    self._cond.notify_all()
+
+    def _retry_locked(self, lead_id: str, campos: Dict, tentativas: int, erro: str) -> None:
+        if tentativas >= _MAX_TENTATIVAS:
+            self._failures.append({"lead_id": lead_id, "campos": campos, "erro": erro})
+            return
+        self.retries += 1
+        espera = min(_BACKOFF_BASE_S * 2 ** (tentativas - 1), _BACKOFF_MAX_S)
+        due = time.monotonic() + espera * random.uniform(0.5, 1.5)
+        if lead_id in self._pending:
+            # Edição mais nova chegou durante a tentativa: ela vence
+            novos, _, _ = self._pending[lead_id]
+            campos = {**campos, **novos}
+        self._pending[lead_id] = (campos, due, tentativas)
+
+
+_queue: Optional[WriteBehindQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_write_behind() -> WriteBehindQueue:
+    """Fila única do processo, compartilhada entre as sessões."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = WriteBehindQueue()
+            # Não perde edições confirmadas num shutdown normal
+            atexit.register(_queue.flush, timeout=5.0)
+        return _queue
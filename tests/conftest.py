@@ -0,0 +1,19 @@
+# tests/conftest.py
+import pytest
+
+from services import firebase_init, seller_directory
+from services.seller_directory import USERS_COLLECTION, SellerDirectory
+from tools.fake_firestore import FakeFirestore
+
+VENDEDOR = "vendedor@empresa.com"
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Firestore em memória com um vendedor cadastrado; diretório sem cache."""
+    fake = FakeFirestore()
+    fake.collection(USERS_COLLECTION).document(VENDEDOR).set({"nome": "Vendedor"})
+    firebase_init.set_db(fake)
+    monkeypatch.setattr(seller_directory, "_directory", SellerDirectory())
+    yield fake
+    firebase_init.set_db(None)
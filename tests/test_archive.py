@@ -0,0 +1,98 @@
+# tests/test_archive.py
+from datetime import datetime, timedelta
+
+import pytest
+from google.api_core.exceptions import FailedPrecondition
+
+from services.archive_service import _arquivar_lote, _candidatos, archive_closed_leads
+from services.leads_service import (
+    ARCHIVE_COUNTER,
+    LEADS_ARCHIVE_COLLECTION,
+    LEADS_COLLECTION,
+    LEADS_TOMBSTONES_COLLECTION,
+)
+from tests.conftest import VENDEDOR
+
+_ANTIGO = datetime.utcnow() - timedelta(days=400)
+_RECENTE = datetime.utcnow() - timedelta(days=10)
+
+
+def _lead(fake, lead_id, status, fechado_em=None, criado_em=_ANTIGO, valor=0.0):
+    dados = {
+        "nome": lead_id,
+        "status": status,
+        "vendedor_email": VENDEDOR,
+        "valor_previsto": valor,
+        "created_at": criado_em,
+    }
+    if fechado_em is not None:
+        dados["status_changed_at"] = fechado_em
+    fake.collection(LEADS_COLLECTION).document(lead_id).set(dados)
+
+
+def _ids(fake, colecao):
+    return sorted(d.id for d in fake.collection(colecao).stream())
+
+
+@pytest.fixture
+def leads(fake_db):
+    _lead(fake_db, "F1", "faturado", _ANTIGO, valor=100.0)
+    _lead(fake_db, "P1", "perdido", _ANTIGO)
+    _lead(fake_db, "F2", "faturado", _RECENTE, valor=50.0)  # fechado há pouco
+    _lead(fake_db, "N1", "novo", criado_em=_ANTIGO)  # em aberto
+    _lead(fake_db, "V1", "perdido")  # antigo, sem status_changed_at
+    return fake_db
+
+
+def test_dry_run_so_conta(leads):
+    assert archive_closed_leads(dias=180, dry_run=True) == {"arquivados": 3, "conflitos": 0}
+    assert _ids(leads, LEADS_ARCHIVE_COLLECTION) == []
+
+
+def test_arquiva_fechados_antigos(leads):
+    assert archive_closed_leads(dias=180, lote=2) == {"arquivados": 3, "conflitos": 0}
+
+    assert _ids(leads, LEADS_COLLECTION) == ["F2", "N1"]
+    assert _ids(leads, LEADS_ARCHIVE_COLLECTION) == ["F1", "P1", "V1"]
+    assert _ids(leads, LEADS_TOMBSTONES_COLLECTION) == ["F1", "P1", "V1"]
+    arquivado = leads.collection(LEADS_ARCHIVE_COLLECTION).document("F1").get().to_dict()
+    assert arquivado["valor_previsto"] == 100.0
+    assert "archived_at" in arquivado
+
+    totais = ARCHIVE_COUNTER.read(max_age_s=0)
+    assert totais["total"] == 3
+    assert totais["faturado"] == 1
+    assert totais["perdido"] == 2
+    assert totais["valor_faturado"] == 100.0
+
+    # Rodar de novo não encontra mais nada
+    assert archive_closed_leads(dias=180) == {"arquivados": 0, "conflitos": 0}
+
+
+def test_lead_alterado_depois_da_consulta_nao_e_arquivado(leads):
+    snaps = _candidatos("status_changed_at", datetime.utcnow() - timedelta(days=180), 10)
+    assert [s.id for s in snaps] == ["F1", "P1"]
+    # Reaberto entre a consulta e o batch
+    leads.collection(LEADS_COLLECTION).document("P1").update({"status": "negociacao"})
+
+    with pytest.raises(FailedPrecondition):
+        _arquivar_lote(snaps, datetime.utcnow())
+
+    # Tudo ou nada: nem o F1 saiu
+    assert _ids(leads, LEADS_ARCHIVE_COLLECTION) == []
+    assert "P1" in _ids(leads, LEADS_COLLECTION)
+
+    assert archive_closed_leads(dias=180) == {"arquivados": 2, "conflitos": 0}
+    assert _ids(leads, LEADS_ARCHIVE_COLLECTION) == ["F1", "V1"]
+
+
+def test_lead_ja_arquivado_por_outro_job_e_conflito(leads):
+    leads.collection(LEADS_ARCHIVE_COLLECTION).document("F1").set({"status": "faturado"})
+
+    resultado = archive_closed_leads(dias=180, lote=1)
+
+    # O F1 volta em toda consulta: a passada desiste depois de alguns
+    # conflitos em vez de repetir para sempre; os sem data seguem
+    assert resultado == {"arquivados": 1, "conflitos": 4}
+    assert "F1" in _ids(leads, LEADS_COLLECTION)
+    assert _ids(leads, LEADS_ARCHIVE_COLLECTION) == ["F1", "V1"]
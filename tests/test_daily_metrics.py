@@ -0,0 +1,93 @@
+# tests/test_daily_metrics.py
+from datetime import date, datetime
+
+from services.daily_metrics import (
+    METRICS_COLLECTION,
+    build_daily_metrics,
+    seller_view,
+    write_daily_metrics,
+    write_partial_daily_metrics,
+)
+from tools.fake_firestore import FakeDocumentReference
+
+DIA = date(2026, 10, 18)
+_NO_DIA = datetime(2026, 10, 18, 15, 0)
+_ANTES = datetime(2026, 9, 1, 10, 0)
+
+
+def _doc():
+    leads = [
+        {"status": "novo", "vendedor_email": "a@x", "created_at": _NO_DIA},
+        {
+            "status": "faturado",
+            "vendedor_email": "a@x",
+            "valor_previsto": 500.0,
+            "created_at": _ANTES,
+            "status_changed_at": _NO_DIA,
+        },
+        {"status": "perdido", "vendedor_email": "b.c@x", "created_at": _ANTES, "status_changed_at": _NO_DIA},
+        {"status": "negociacao", "vendedor_email": "b.c@x", "valor_previsto": 300.0, "created_at": _ANTES},
+    ]
+    return build_daily_metrics(leads, DIA)
+
+
+def _salvo(fake):
+    return fake.collection(METRICS_COLLECTION).document(DIA.isoformat()).get().to_dict()
+
+
+def test_documento_do_dia():
+    doc = _doc()
+
+    assert doc["dia"] == "2026-10-18"
+    assert doc["total"] == 4
+    assert doc["por_status"]["negociacao"] == 1
+    assert (doc["criados"], doc["faturados"], doc["perdidos"]) == (1, 1, 1)
+    assert doc["valor_faturado"] == 500.0
+    assert [v["email"] for v in doc["por_vendedor"]] == ["a@x", "b.c@x"]
+
+    a = seller_view(doc, "a@x")
+    assert (a["total"], a["criados"], a["faturados"], a["perdidos"]) == (2, 1, 1, 0)
+    assert seller_view(doc, "ninguem@x")["total"] == 0
+
+
+def test_parcial_cria_e_atualiza(fake_db):
+    assert write_partial_daily_metrics(_doc())
+    assert _salvo(fake_db)["parcial"] is True
+
+    doc = _doc()
+    doc["total"] = 5
+    assert write_partial_daily_metrics(doc)
+    assert _salvo(fake_db)["total"] == 5
+
+
+def test_parcial_nao_sobrescreve_o_documento_do_job(fake_db):
+    write_daily_metrics(_doc())
+
+    doc = _doc()
+    doc["total"] = 99
+    assert not write_partial_daily_metrics(doc)
+    salvo = _salvo(fake_db)
+    assert salvo["total"] == 4
+    assert "parcial" not in salvo
+
+
+def test_job_grava_entre_a_leitura_e_o_parcial(fake_db, monkeypatch):
+    write_partial_daily_metrics(_doc())
+    get_original = FakeDocumentReference.get
+    job = [_doc()]
+
+    def get_e_job_grava(self, *args, **kwargs):
+        snap = get_original(self, *args, **kwargs)
+        if self.id == DIA.isoformat() and job:
+            write_daily_metrics(job.pop())
+        return snap
+
+    monkeypatch.setattr(FakeDocumentReference, "get", get_e_job_grava)
+    doc = _doc()
+    doc["total"] = 99
+
+    # A condição last_update_time falha: o documento final fica intacto
+    assert not write_partial_daily_metrics(doc)
+    salvo = _salvo(fake_db)
+    assert salvo["total"] == 4
+    assert "parcial" not in salvo
@@ -0,0 +1,113 @@
+# tests/test_dedup.py
+from services.dedup_service import find_duplicate_clusters, merge_leads
+from services.leads_service import (
+    LEADS_COLLECTION,
+    LEADS_INDEX_COLLECTION,
+    LEADS_TOMBSTONES_COLLECTION,
+    PIPELINE_COUNTER,
+    create_lead,
+    dedup_keys,
+    normalize_email,
+    normalize_phone,
+)
+from tests.conftest import VENDEDOR
+
+
+def _criar(nome, email, telefone, **extra):
+    ok, msg = create_lead(nome, email, telefone, VENDEDOR, **extra)
+    assert ok, msg
+    return msg
+
+
+def _ids_por_nome(fake):
+    return {
+        d.to_dict()["nome"]: d.id for d in fake.collection(LEADS_COLLECTION).stream()
+    }
+
+
+def test_normalizacao_de_contato():
+    assert normalize_email("  Ana@Exemplo.COM ") == "ana@exemplo.com"
+    assert normalize_email("sem-arroba") == ""
+    assert normalize_phone("+55 (11) 98765-4321") == "11987654321"
+    assert normalize_phone("011 98765-4321") == "11987654321"
+    assert normalize_phone("1234") == ""
+    assert dedup_keys("ANA@exemplo.com", "(11) 98765-4321") == dedup_keys(
+        "ana@exemplo.com", "+55 11 98765 4321"
+    )
+    assert dedup_keys(None, "") == []
+
+
+def test_create_lead_recusa_email_ou_telefone_repetido(fake_db):
+    _criar("Ana", "ana@exemplo.com", "11 98765-4321")
+
+    ok, _ = create_lead("Ana 2", " ANA@exemplo.com", "", VENDEDOR)
+    assert not ok
+    ok, _ = create_lead("Ana 3", "outra@exemplo.com", "+55 (11) 98765-4321", VENDEDOR)
+    assert not ok
+    assert len(list(fake_db.collection(LEADS_COLLECTION).stream())) == 1
+
+
+def test_create_lead_com_permitir_duplicado(fake_db):
+    _criar("Ana", "ana@exemplo.com", "11 98765-4321")
+
+    ok, msg = create_lead("Ana 2", "ana@exemplo.com", "", VENDEDOR, permitir_duplicado=True)
+    assert ok, msg
+    assert len(list(fake_db.collection(LEADS_COLLECTION).stream())) == 2
+
+
+def test_clusters_juntam_email_e_telefone(fake_db):
+    # A~B pelo email, B~C pelo telefone: um cluster só; D fica de fora
+    _criar("A", "a@exemplo.com", "11 1111-1111")
+    _criar("B", "a@exemplo.com", "11 2222-2222", permitir_duplicado=True)
+    _criar("C", "c@exemplo.com", "(11) 2222-2222", permitir_duplicado=True)
+    _criar("D", "d@exemplo.com", "11 3333-3333")
+
+    clusters = find_duplicate_clusters()
+
+    assert len(clusters) == 1
+    assert sorted(l["nome"] for l in clusters[0]) == ["A", "B", "C"]
+
+
+def test_merge_leads(fake_db):
+    _criar("Ana", "ana@exemplo.com", "", valor_previsto=100.0, observacoes="primeiro contato")
+    _criar(
+        "Ana Souza",
+        "ana@exemplo.com",
+        "11 98765-4321",
+        valor_previsto=250.0,
+        origem="indicação",
+        observacoes="pediu proposta",
+        permitir_duplicado=True,
+    )
+    ids = _ids_por_nome(fake_db)
+    principal, duplicado = ids["Ana"], ids["Ana Souza"]
+
+    ok, msg = merge_leads(principal, [duplicado])
+
+    assert ok, msg
+    lead = fake_db.collection(LEADS_COLLECTION).document(principal).get().to_dict()
+    assert lead["nome"] == "Ana"  # campo preenchido do principal não muda
+    assert lead["telefone"] == "11 98765-4321"
+    assert lead["origem"] == "indicação"
+    assert lead["valor_previsto"] == 250.0
+    assert lead["observacoes"] == "primeiro contato\n---\npediu proposta"
+    assert lead["merged_ids"] == [duplicado]
+
+    assert not fake_db.collection(LEADS_COLLECTION).document(duplicado).get().exists
+    lapide = fake_db.collection(LEADS_TOMBSTONES_COLLECTION).document(duplicado).get()
+    assert lapide.to_dict()["merged_into"] == principal
+    for key in dedup_keys("ana@exemplo.com", "11 98765-4321"):
+        indice = fake_db.collection(LEADS_INDEX_COLLECTION).document(key).get()
+        assert indice.to_dict()["lead_id"] == principal
+
+    totais = PIPELINE_COUNTER.read(max_age_s=0)
+    assert totais["total"] == 1
+    assert totais["novo"] == 1
+
+
+def test_merge_leads_sem_duplicados(fake_db):
+    _criar("Ana", "ana@exemplo.com", "")
+    principal = _ids_por_nome(fake_db)["Ana"]
+
+    assert merge_leads(principal, [principal]) == (False, "Nenhum duplicado para mesclar.")
+    assert merge_leads("nao-existe", [principal]) == (False, "Lead principal não encontrado.")
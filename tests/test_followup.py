@@ -0,0 +1,102 @@
+# tests/test_followup.py
+from datetime import datetime, timedelta
+
+from services import followup_service
+from services.followup_service import FollowUpScheduler, find_stale_leads
+from services.leads_service import LEADS_COLLECTION
+from tests.conftest import VENDEDOR
+
+OUTRO = "outro@empresa.com"
+
+
+def _lead(fake, lead_id, status, parado, vendedor=VENDEDOR):
+    fake.collection(LEADS_COLLECTION).document(lead_id).set(
+        {
+            "nome": lead_id,
+            "status": status,
+            "vendedor_email": vendedor,
+            "updated_at": datetime.utcnow() - parado,
+        }
+    )
+
+
+def _ids(lembretes):
+    return [l["lead_id"] for l in lembretes]
+
+
+def test_find_stale_leads(fake_db):
+    _lead(fake_db, "N_velho", "novo", timedelta(days=5))
+    _lead(fake_db, "N_mais_velho", "novo", timedelta(days=9))
+    _lead(fake_db, "N_recente", "novo", timedelta(hours=3))
+    _lead(fake_db, "A_velho", "atendimento", timedelta(days=3))  # prazo de 5 dias
+
+    assert [l["id"] for l in find_stale_leads("novo")] == ["N_mais_velho", "N_velho"]
+    assert [l["id"] for l in find_stale_leads("novo", recentes_primeiro=True)] == [
+        "N_velho",
+        "N_mais_velho",
+    ]
+    assert find_stale_leads("atendimento") == []
+    assert find_stale_leads("novo", vendedor_email=OUTRO) == []
+
+
+def test_lembretes_por_vendedor(fake_db):
+    _lead(fake_db, "N1", "novo", timedelta(days=3))
+    _lead(fake_db, "N2", "novo", timedelta(days=4), vendedor=OUTRO)
+    _lead(fake_db, "G1", "negociacao", timedelta(days=8))
+    _lead(fake_db, "F1", "faturado", timedelta(days=30))  # fechado: sem follow-up
+    _lead(fake_db, "A1", "atendimento", timedelta(days=1))
+
+    agenda = FollowUpScheduler()
+    agenda.refresh(force=True)
+
+    assert _ids(agenda.reminders(VENDEDOR)) == ["G1", "N1"]
+    assert _ids(agenda.reminders(OUTRO)) == ["N2"]
+    assert _ids(agenda.reminders()) == ["G1", "N2", "N1"]
+    assert agenda.reminders(VENDEDOR)[0]["parado_dias"] == 8
+
+
+def test_vencimento_dentro_da_janela_entra_sem_nova_recarga(fake_db):
+    # Vence daqui a ~1 segundo, dentro da janela carregada
+    _lead(fake_db, "N1", "novo", timedelta(days=2) - timedelta(seconds=1))
+    agenda = FollowUpScheduler()
+    agenda.refresh(force=True)
+    assert agenda.reminders() == []
+
+    leituras = fake_db.reads
+    agenda._vencer(datetime.utcnow() + timedelta(seconds=2))
+    assert _ids(agenda.reminders()) == ["N1"]
+    assert fake_db.reads == leituras
+
+
+def test_touch_reagenda_so_o_lead(fake_db):
+    _lead(fake_db, "N1", "novo", timedelta(days=3))
+    _lead(fake_db, "N2", "novo", timedelta(days=3))
+    agenda = FollowUpScheduler()
+    agenda.refresh(force=True)
+
+    agenda.touch("N1")
+    assert _ids(agenda.reminders()) == ["N2"]
+
+    # Mudou de etapa: vence pelo prazo da nova etapa, a partir de agora
+    agenda.touch("N2", status="negociacao", agora=datetime.utcnow() - timedelta(days=8))
+    assert _ids(agenda.reminders()) == ["N2"]
+    assert agenda.reminders()[0]["status"] == "negociacao"
+
+    # Fechado: sai da agenda
+    agenda.touch("N2", status="faturado")
+    assert agenda.reminders() == []
+
+
+def test_recarga_mantem_os_recem_vencidos_alem_do_limite(fake_db, monkeypatch):
+    monkeypatch.setattr(followup_service, "_MAX_POR_STATUS", 5)
+    for i in range(12):
+        _lead(fake_db, f"velho{i:02d}", "novo", timedelta(days=20, hours=i))
+    _lead(fake_db, "recem_vencido", "novo", timedelta(days=2, minutes=1))
+
+    agenda = FollowUpScheduler()
+    agenda.refresh(force=True)
+    ids = _ids(agenda.reminders())
+
+    assert "recem_vencido" in ids
+    assert "velho11" in ids  # o mais parado
+    assert len(ids) == 10  # 5 de cada ponta
@@ -0,0 +1,101 @@
+# tests/test_funnel_analytics.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from services import funnel_analytics as fa
+from services.funnel_analytics import (
+    ANALYTICS_COLLECTION,
+    FUNNEL_DOC,
+    fold_new_events,
+    get_funnel_aggregate,
+    get_funnel_velocity,
+)
+from services.leads_service import LEADS_COLLECTION, STATUS_HISTORY_SUBCOLLECTION
+
+_INICIO = datetime(2026, 1, 5, 9, 0)
+
+
+@pytest.fixture
+def funil(fake_db, monkeypatch):
+    monkeypatch.setattr(fa, "_PAGE_SIZE", 3)
+    monkeypatch.setattr(fa, "_MAX_PAGES", 2)
+    monkeypatch.setattr(fa, "_ultimo_agregado", {})
+    monkeypatch.setattr(fa, "_agregado_em", float("-inf"))
+    monkeypatch.setattr(fa, "_dobrando", False)
+    return fake_db
+
+
+def _evento(fake, lead_id, n, de, para, at, dwell_s=None):
+    historico = fake.collection(LEADS_COLLECTION).document(lead_id).collection(
+        STATUS_HISTORY_SUBCOLLECTION
+    )
+    historico.document(f"{lead_id}-{n}").set({"de": de, "para": para, "at": at, "dwell_s": dwell_s})
+
+
+def _salvo(fake):
+    return fake.collection(ANALYTICS_COLLECTION).document(FUNNEL_DOC).get().to_dict()
+
+
+def test_dobra_em_paginas_e_continua_do_watermark(funil):
+    for i in range(10):
+        _evento(funil, f"L{i}", 1, "novo", "atendimento", _INICIO + timedelta(minutes=i), 86400.0)
+
+    agg = fold_new_events()
+    # Duas páginas de 3 por chamada; o resto fica para a próxima
+    assert agg["estagios"]["novo"]["saidas"] == 6
+    assert _salvo(funil)["estagios"]["novo"]["saidas"] == 6
+
+    fold_new_events()
+    agg = fold_new_events()
+    assert agg["estagios"]["novo"]["saidas"] == 10
+    assert agg["estagios"]["atendimento"]["entradas"] == 10
+    assert agg["transicoes"]["novo"] == {"atendimento": 10}
+    assert agg["watermark"].replace(tzinfo=None) == _INICIO + timedelta(minutes=9)
+
+    # Sem eventos novos: nada muda
+    assert fold_new_events()["estagios"]["novo"]["saidas"] == 10
+
+
+def test_eventos_com_o_mesmo_instante_nao_se_perdem_nem_repetem(funil):
+    for i in range(5):
+        _evento(funil, f"L{i}", 1, "novo", "atendimento", _INICIO)
+    fold_new_events()
+    _evento(funil, "L9", 1, "novo", "perdido", _INICIO)
+    agg = fold_new_events()
+
+    assert agg["estagios"]["novo"]["saidas"] == 6
+    assert agg["transicoes"]["novo"] == {"atendimento": 5, "perdido": 1}
+
+
+def test_eventos_recentes_esperam_a_proxima_passada(funil):
+    _evento(funil, "L1", 1, "novo", "atendimento", datetime.utcnow())
+    assert fold_new_events()["estagios"]["novo"]["saidas"] == 0
+
+
+def test_velocidade(funil):
+    _evento(funil, "L1", 1, "novo", "atendimento", _INICIO, 2 * 86400.0)
+    _evento(funil, "L2", 1, "novo", "perdido", _INICIO, 4 * 86400.0)
+    linhas = {l["etapa"]: l for l in get_funnel_velocity()}
+
+    assert linhas["novo"]["saidas"] == 2
+    assert linhas["novo"]["tempo_medio_dias"] == 3.0
+    assert linhas["novo"]["conversao_proxima"] == 50.0
+    assert set(linhas) == {"novo", "atendimento", "negociacao"}
+
+
+def test_agregado_em_cache_no_processo(funil, monkeypatch):
+    _evento(funil, "L1", 1, "novo", "atendimento", _INICIO)
+    assert get_funnel_aggregate()["estagios"]["novo"]["saidas"] == 1
+
+    _evento(funil, "L2", 1, "novo", "atendimento", _INICIO + timedelta(minutes=1))
+    leituras = funil.reads
+    assert get_funnel_aggregate()["estagios"]["novo"]["saidas"] == 1
+    assert funil.reads == leituras
+
+    # Vencido o TTL: devolve o que tem e dobra em background
+    monkeypatch.setattr(fa, "_agregado_em", float("-inf"))
+    get_funnel_aggregate()
+    limite = datetime.utcnow() + timedelta(seconds=5)
+    while get_funnel_aggregate()["estagios"]["novo"]["saidas"] != 2:
+        assert datetime.utcnow() < limite
@@ -0,0 +1,128 @@
+# tests/test_ingest.py
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import ingest_server
+from services import ingest_service
+from services.ingest_service import IngestQueue, lead_id_for_key, validate_lead
+from services.leads_service import LEADS_COLLECTION
+from tests.conftest import VENDEDOR
+
+
+def _lead(i=0, **extra):
+    return {
+        "nome": f"Lead {i}",
+        "email": f"lead{i}@exemplo.com",
+        "vendedor_email": VENDEDOR,
+        **extra,
+    }
+
+
+def _esperar(condicao, timeout=5.0):
+    limite = time.monotonic() + timeout
+    while not condicao():
+        assert time.monotonic() < limite, "tempo esgotado"
+        time.sleep(0.01)
+
+
+def test_validacao():
+    lead, erros = validate_lead(_lead(valor_previsto="12.5", origem="  site "))
+    assert erros == []
+    assert lead["valor_previsto"] == 12.5
+    assert lead["origem"] == "site"
+    assert lead["status"] == "novo"
+
+    _, erros = validate_lead({"nome": "", "vendedor_email": "sem-arroba", "valor_previsto": "nan"})
+    assert "'nome' é obrigatório." in erros
+    assert "'vendedor_email' é obrigatório e deve ser um email." in erros
+    assert "Informe 'email' ou 'telefone'." in erros
+    assert "'valor_previsto' deve ser um número >= 0." in erros
+
+    assert validate_lead([1, 2]) == (None, ["Cada lead deve ser um objeto JSON."])
+    _, erros = validate_lead(_lead(status="ganho", nome=3))
+    assert "'nome' deve ser texto." in erros
+    assert any(e.startswith("'status' deve ser um de") for e in erros)
+
+
+def test_grava_em_lote_com_idempotencia(fake_db):
+    fila = IngestQueue(flush_interval_s=0.01).start()
+    aceita, itens = fila.submit([_lead(1), _lead(2), {"nome": "x"}], idempotency_key="req-1")
+    assert aceita
+    assert [i["status"] for i in itens] == ["accepted", "accepted", "invalid"]
+    assert itens[0]["id"] == lead_id_for_key("req-1:0")
+
+    _, repetidos = fila.submit([_lead(1)], idempotency_key="req-1:0")
+    assert repetidos[0]["status"] == "duplicate_key"
+
+    fila.stop()
+    assert fila.status(itens[0]["id"])["status"] == "created"
+    assert len(list(fake_db.collection(LEADS_COLLECTION).stream())) == 2
+    assert fila.metrics_snapshot()["written"] == 2
+
+
+def test_fila_cheia_rejeita_a_requisicao_inteira():
+    fila = IngestQueue(capacity=3)  # sem start: nada sai da fila
+    assert fila.submit([_lead(i) for i in range(3)])[0]
+    aceita, itens = fila.submit([_lead(10), _lead(11)])
+    assert not aceita
+    assert [i["status"] for i in itens] == ["rejected", "rejected"]
+    assert fila.metrics_snapshot()["rejected_backpressure"] == 2
+
+
+def test_lotes_em_retentativa_ocupam_capacidade(monkeypatch):
+    def fora(leads):
+        raise RuntimeError("Firestore fora")
+
+    monkeypatch.setattr(ingest_service, "create_leads_batch", fora)
+    monkeypatch.setattr(ingest_service, "_BACKOFF_BASE_S", 10.0)
+    fila = IngestQueue(capacity=5, batch_size=5, flush_interval_s=0.01).start()
+    assert fila.submit([_lead(i) for i in range(5)])[0]
+    _esperar(lambda: fila.metrics_snapshot()["write_retries"] == 5)
+
+    assert fila.depth() == 5
+    aceita, _ = fila.submit([_lead(9)])
+    assert not aceita
+
+
+@pytest.fixture
+def servidor(fake_db):
+    fila = IngestQueue(flush_interval_s=0.01).start()
+    handler = type("Handler", (ingest_server.IngestHandler,), {"ingest": fila, "token": "segredo"})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    fila.stop()
+
+
+def _post(url, corpo, token=None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    req = urllib.request.Request(url, json.dumps(corpo).encode(), headers, method="POST")
+    try:
+        with urllib.request.urlopen(req) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_servidor_exige_token(servidor):
+    assert _post(f"{servidor}/leads", _lead())[0] == 401
+    assert _post(f"{servidor}/leads", _lead(), token="errado")[0] == 401
+    with urllib.request.urlopen(f"{servidor}/healthz") as resp:
+        assert resp.status == 200
+
+    status, corpo = _post(f"{servidor}/leads", _lead(), token="segredo")
+    assert status == 202
+    assert corpo["items"][0]["status"] == "accepted"
+
+    status, corpo = _post(f"{servidor}/leads", {"nome": "x"}, token="segredo")
+    assert status == 400
+    assert corpo["items"][0]["status"] == "invalid"
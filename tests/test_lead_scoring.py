@@ -0,0 +1,127 @@
+# tests/test_lead_scoring.py
+from datetime import datetime, timedelta
+from types import MappingProxyType
+
+import numpy as np
+import pytest
+
+from services.lead_scoring import (
+    LeadScorer,
+    compute_scores,
+    conversion_rates,
+    normalize_origem,
+)
+from services.leads_service import STATUS_PIPELINE
+
+_IDX = {s: i for i, s in enumerate(STATUS_PIPELINE)}
+_DIA = 86400.0
+
+
+def test_taxa_de_conversao_suavizada():
+    origem = np.array([0, 0, 0, 0, 1, 2])
+    status = np.array([_IDX[s] for s in ("faturado", "faturado", "faturado", "perdido", "perdido", "novo")])
+
+    taxas = conversion_rates(origem, status, 3)
+
+    geral = 3 / 5
+    assert taxas[0] == pytest.approx((3 + 5 * geral) / (4 + 5))
+    assert taxas[1] == pytest.approx((0 + 5 * geral) / (1 + 5))
+    assert taxas[2] == pytest.approx(geral)  # sem fechados: a taxa geral
+
+
+def test_score_por_componente():
+    agora = 1_000 * _DIA
+    base = dict(
+        valor=np.array([0.0, 1000.0]),
+        taxa_origem=np.array([0.5, 0.5]),
+        created=np.array([agora, agora]),
+        updated=np.array([agora, agora]),
+    )
+    sem_valor, com_valor = compute_scores(agora=agora, **base)
+    assert com_valor > sem_valor
+
+    novo, velho = compute_scores(
+        np.array([0.0, 0.0]), np.array([0.5, 0.5]),
+        np.array([agora, agora - 28 * _DIA]), np.array([agora, agora]), agora,
+    )
+    assert novo > velho
+
+    em_dia, parado = compute_scores(
+        np.array([0.0, 0.0]), np.array([0.5, 0.5]),
+        np.array([agora - _DIA, agora - _DIA]), np.array([agora, agora - 10 * _DIA]), agora,
+    )
+    assert parado > em_dia
+
+    sem_datas = compute_scores(np.array([0.0]), np.array([0.5]), np.array([np.nan]), np.array([np.nan]), agora)
+    assert 0.0 <= sem_datas[0] <= 100.0
+
+
+class _Snapshot:
+    def __init__(self, leads):
+        self.version = 0
+        self.definir(leads)
+
+    def definir(self, leads):
+        self._leads = [MappingProxyType(l) for l in leads]
+        self.version += 1
+
+    def leads(self):
+        return list(self._leads)
+
+
+def _lead(lead_id, **campos):
+    agora = datetime.utcnow()
+    return {
+        "id": lead_id,
+        "status": "novo",
+        "vendedor_email": "a@x",
+        "created_at": agora - timedelta(days=1),
+        "updated_at": agora - timedelta(days=1),
+        **campos,
+    }
+
+
+def test_top_e_ordenacao():
+    snapshot = _Snapshot(
+        [
+            _lead("barato", valor_previsto=10.0),
+            _lead("caro", valor_previsto=50_000.0),
+            _lead("medio", valor_previsto=2_000.0),
+            _lead("outro_vendedor", valor_previsto=90_000.0, vendedor_email="b@x"),
+            _lead("fechado", valor_previsto=99_000.0, status="faturado"),
+        ]
+    )
+    scorer = LeadScorer()
+    scorer.sync(snapshot)
+
+    assert [l["id"] for l in scorer.top("novo", "a@x", k=2)] == ["caro", "medio"]
+    assert [l["id"] for l in scorer.top(status="novo", k=1)] == ["outro_vendedor"]
+    assert scorer.top("atendimento") == []
+    ordenados = scorer.sort_leads([{"id": "fora"}, {"id": "barato"}, {"id": "caro"}])
+    assert [l["id"] for l in ordenados] == ["caro", "barato", "fora"]
+    assert scorer.score_of("fora") is None
+
+
+def test_sync_atualiza_so_as_linhas_alteradas():
+    leads = [_lead("L1", valor_previsto=10.0), _lead("L2", valor_previsto=20.0, origem=" Site ")]
+    snapshot = _Snapshot(leads)
+    scorer = LeadScorer()
+    scorer.sync(snapshot)
+    antes = scorer.score_of("L1")
+
+    snapshot.definir([_lead("L1", valor_previsto=80_000.0), leads[1], _lead("L3")])
+    scorer.sync(snapshot)
+
+    assert scorer.score_of("L1") > antes
+    assert scorer.score_of("L3") is not None
+    colunas = scorer.columns()
+    assert colunas["version"] == snapshot.version
+    assert len(colunas["valor"]) == 3
+    assert colunas["n_origens"] == 2
+    assert normalize_origem(" Site ") == "site"
+
+    # Remoção: recomeça do zero sem a linha
+    snapshot.definir([_lead("L3")])
+    scorer.sync(snapshot)
+    assert scorer.score_of("L1") is None
+    assert len(scorer.columns()["valor"]) == 1
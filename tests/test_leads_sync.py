@@ -0,0 +1,132 @@
+# tests/test_leads_sync.py
+import threading
+import time
+from datetime import datetime
+
+from services import leads_sync
+from services.leads_service import LEADS_COLLECTION, LEADS_TOMBSTONES_COLLECTION
+from services.leads_sync import LeadsSnapshot
+from services.snapshot_store import SnapshotStore
+from tests.conftest import VENDEDOR
+
+
+def _gravar(fake, lead_id, status="novo", **campos):
+    fake.collection(LEADS_COLLECTION).document(lead_id).set(
+        {
+            "nome": lead_id,
+            "status": status,
+            "vendedor_email": VENDEDOR,
+            "updated_at": datetime.utcnow(),
+            **campos,
+        }
+    )
+
+
+def _remover(fake, lead_id, lapide=True):
+    fake.collection(LEADS_COLLECTION).document(lead_id).delete()
+    if lapide:
+        fake.collection(LEADS_TOMBSTONES_COLLECTION).document(lead_id).set(
+            {"removed_at": datetime.utcnow()}
+        )
+
+
+def _ids(snapshot, **filtros):
+    return sorted(l["id"] for l in snapshot.leads(**filtros))
+
+
+def test_sync_incremental_traz_so_o_que_mudou(fake_db):
+    for i in range(5):
+        _gravar(fake_db, f"L{i}")
+    snapshot = LeadsSnapshot()
+    assert snapshot.sync(force=True) == 5
+    assert snapshot.loaded
+    versao = snapshot.version
+
+    # Reler a janela de folga sem mudanças não conta nem muda a versão
+    assert snapshot.sync(force=True) == 0
+    assert snapshot.version == versao
+
+    _gravar(fake_db, "L1", status="atendimento")
+    _gravar(fake_db, "L9")
+    assert snapshot.sync(force=True) == 2
+    assert snapshot.get("L1")["status"] == "atendimento"
+    assert _ids(snapshot, status="novo") == ["L0", "L2", "L3", "L4", "L9"]
+    assert snapshot.changes_since(versao) == (frozenset({"L1", "L9"}), snapshot.version)
+
+
+def test_remocao_chega_pela_lapide(fake_db):
+    _gravar(fake_db, "L1")
+    _gravar(fake_db, "L2")
+    snapshot = LeadsSnapshot()
+    snapshot.sync(force=True)
+    versao = snapshot.version
+
+    _remover(fake_db, "L1")
+    assert snapshot.sync(force=True) == 1
+    assert _ids(snapshot) == ["L2"]
+    assert snapshot.get("L1") is None
+    assert snapshot.changes_since(versao) == (frozenset({"L1"}), snapshot.version)
+
+
+def test_remocao_sem_lapide_sai_na_recarga_completa(fake_db):
+    _gravar(fake_db, "L1")
+    _gravar(fake_db, "L2")
+    snapshot = LeadsSnapshot()
+    snapshot.sync(force=True)
+    versao = snapshot.version
+
+    _remover(fake_db, "L1", lapide=False)
+    snapshot.sync(force=True)
+    assert _ids(snapshot) == ["L1", "L2"]  # o incremental não vê
+
+    snapshot._carga_completa_em -= leads_sync._RECARGA_TOTAL
+    assert snapshot.sync(force=True) == 1
+    assert _ids(snapshot) == ["L2"]
+    # Carga completa no meio: quem acompanha por delta recalcula do zero
+    assert snapshot.changes_since(versao) is None
+    assert snapshot.changes_since(snapshot.version) == (frozenset(), snapshot.version)
+
+
+def test_lead_somente_leitura(fake_db):
+    _gravar(fake_db, "L1")
+    snapshot = LeadsSnapshot()
+    snapshot.sync(force=True)
+    lead = snapshot.get("L1")
+    try:
+        lead["status"] = "perdido"
+    except TypeError:
+        pass
+    assert snapshot.get("L1")["status"] == "novo"
+
+
+def test_partida_a_quente_do_arquivo_local(fake_db, tmp_path, monkeypatch):
+    caminho = str(tmp_path / "snap.sqlite3")
+    _gravar(fake_db, "L1", valor_previsto=10.0)
+    _gravar(fake_db, "L2")
+    LeadsSnapshot(store=SnapshotStore(caminho)).sync(force=True)
+
+    # Novo processo: serve do disco antes de falar com o Firestore
+    _gravar(fake_db, "L3")
+    liberar = threading.Event()
+    sync_original = LeadsSnapshot.sync
+
+    def sync_segurado(self, force=False):
+        liberar.wait(5)
+        return sync_original(self, force)
+
+    monkeypatch.setattr(LeadsSnapshot, "sync", sync_segurado)
+    segundo = LeadsSnapshot(store=SnapshotStore(caminho))
+    leituras = fake_db.reads
+
+    assert segundo.warm_start()
+    assert fake_db.reads == leituras
+    assert _ids(segundo) == ["L1", "L2"]
+    assert segundo.get("L1")["valor_previsto"] == 10.0
+    assert not segundo.warm_start()  # só uma vez
+
+    # A reconciliação em background traz o que mudou desde o arquivo
+    liberar.set()
+    limite = time.monotonic() + 5
+    while _ids(segundo) != ["L1", "L2", "L3"]:
+        assert time.monotonic() < limite
+        time.sleep(0.01)
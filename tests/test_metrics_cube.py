@@ -0,0 +1,88 @@
+# tests/test_metrics_cube.py
+from datetime import datetime
+
+from services import metrics_cube
+from services.metrics_cube import (
+    OUTRAS_ORIGENS,
+    SEM_DATA,
+    SEM_ORIGEM,
+    SEM_VENDEDOR,
+    MetricsCube,
+)
+
+
+def _lead(vendedor, status, origem, criado, valor=0.0):
+    return {
+        "vendedor_email": vendedor,
+        "status": status,
+        "origem": origem,
+        "created_at": criado,
+        "valor_previsto": valor,
+    }
+
+
+_LEADS = [
+    _lead("a@x", "novo", "Site", datetime(2026, 1, 10), 100.0),
+    _lead("a@x", "faturado", " site ", datetime(2026, 2, 3), 300.0),
+    _lead("a@x", "perdido", "Indicação", datetime(2026, 3, 1)),
+    _lead("b@x", "novo", "", datetime(2026, 2, 20), 50.0),
+    _lead("b@x", "negociacao", "site", None, 200.0),
+    _lead(None, "novo", "site", datetime(2026, 1, 1)),
+    _lead("b@x", "arquivado", "site", datetime(2026, 1, 1)),  # fora do pipeline
+]
+
+
+def test_eixos():
+    cube = MetricsCube.build(_LEADS)
+
+    assert cube.vendedores == sorted(["a@x", "b@x", SEM_VENDEDOR])
+    assert cube.origens == [SEM_ORIGEM, "indicação", "site"]
+    assert cube.meses == ["2026-01", "2026-02", "2026-03", SEM_DATA]
+    assert cube.leads.shape == (3, 5, 3, 4)
+
+
+def test_recortes():
+    cube = MetricsCube.build(_LEADS)
+
+    tudo = cube.slice()
+    assert tudo.total == 6
+    assert tudo.por_status()["novo"] == 3
+    assert tudo.valor_por_status()["faturado"] == 300.0
+    assert tudo.ticket_medio == 650.0 / 4
+
+    a = cube.slice(vendedor="a@x")
+    assert (a.total, a.por_status()["perdido"]) == (3, 1)
+    assert cube.slice(vendedor="ninguem@x").total == 0
+
+    site = cube.slice(origens=["site", "nao-existe"])
+    assert site.total == 4
+
+    # Com período, o lead sem data de criação fica de fora
+    fevereiro = cube.slice(mes_inicio="2026-02", mes_fim="2026-02")
+    assert fevereiro.total == 2
+    assert cube.slice(mes_inicio="2026-02").total == 3
+    assert cube.slice(mes_fim="2026-01").total == 2
+
+    combinado = cube.slice(vendedor="b@x", origens=["site"], mes_inicio="2026-01")
+    assert combinado.total == 0
+    assert cube.slice(vendedor="b@x", origens=["site"]).valor_por_status()["negociacao"] == 200.0
+
+
+def test_origens_raras_somam_em_outros(monkeypatch):
+    monkeypatch.setattr(metrics_cube, "_MAX_ORIGENS", 2)
+    leads = (
+        [_lead("a@x", "novo", "site", None)] * 3
+        + [_lead("a@x", "novo", "feira", None)] * 2
+        + [_lead("a@x", "novo", "radio", None), _lead("a@x", "novo", "jornal", None)]
+    )
+    cube = MetricsCube.build(leads)
+
+    assert cube.origens == ["feira", "site", OUTRAS_ORIGENS]
+    assert cube.slice(origens=[OUTRAS_ORIGENS]).total == 2
+    assert cube.slice().total == 7
+
+
+def test_cubo_vazio():
+    cube = MetricsCube.build([])
+    assert cube.slice().total == 0
+    assert cube.slice(vendedor="a@x").ticket_medio == 0.0
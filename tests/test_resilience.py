@@ -0,0 +1,111 @@
+# tests/test_resilience.py
+import time
+
+import pytest
+from google.api_core import exceptions as gexc
+
+from services import resilience
+from services.resilience import (
+    CircuitBreaker,
+    FirestoreIndisponivel,
+    GravacaoIncerta,
+    call_with_deadline,
+    rpc_timeout,
+)
+
+
+@pytest.fixture(autouse=True)
+def breaker(monkeypatch):
+    """Circuit breaker próprio do teste e backoff curto."""
+    novo = CircuitBreaker(falhas_para_abrir=3, espera_s=0.1)
+    monkeypatch.setattr(resilience, "_breaker", novo)
+    monkeypatch.setattr(resilience, "_BACKOFF_BASE_S", 0.001)
+    monkeypatch.setattr(resilience, "_FOLGA_RPC_S", 0.05)
+    return novo
+
+
+def _falha_transitoria():
+    raise gexc.ServiceUnavailable("fora")
+
+
+def test_retentativas_em_erro_transitorio():
+    tentativas = []
+
+    def instavel():
+        tentativas.append(1)
+        if len(tentativas) < 3:
+            raise gexc.ServiceUnavailable("fora")
+        return "ok"
+
+    assert call_with_deadline("teste_retry", instavel, retries=3) == "ok"
+    assert len(tentativas) == 3
+
+
+def test_retentativas_esgotadas_viram_indisponivel():
+    with pytest.raises(FirestoreIndisponivel) as erro:
+        call_with_deadline("teste_esgota", _falha_transitoria, retries=2)
+    assert not isinstance(erro.value, GravacaoIncerta)
+
+
+def test_erro_de_negocio_nao_e_repetido(breaker):
+    tentativas = []
+
+    def inexistente():
+        tentativas.append(1)
+        raise gexc.NotFound("sem doc")
+
+    with pytest.raises(gexc.NotFound):
+        call_with_deadline("teste_negocio", inexistente)
+    assert len(tentativas) == 1
+    assert breaker.state == CircuitBreaker.FECHADO
+
+
+def test_prazo_estourado():
+    with pytest.raises(FirestoreIndisponivel) as erro:
+        call_with_deadline("teste_prazo", time.sleep, 1.0, deadline_s=0.05)
+    assert not isinstance(erro.value, GravacaoIncerta)
+
+
+def test_escrita_sem_resposta_e_incerta():
+    with pytest.raises(GravacaoIncerta):
+        call_with_deadline("teste_escrita", time.sleep, 1.0, deadline_s=0.05, retries=0)
+
+    def estoura():
+        raise gexc.DeadlineExceeded("prazo")
+
+    with pytest.raises(GravacaoIncerta):
+        call_with_deadline("teste_escrita", estoura, retries=0)
+
+
+def test_rpc_timeout_e_o_que_resta_do_prazo():
+    assert rpc_timeout() is None
+    restante = call_with_deadline("teste_timeout", rpc_timeout, deadline_s=2.0)
+    assert 1.0 < restante <= 2.0
+
+
+def test_circuito_abre_e_fecha(breaker):
+    for _ in range(3):
+        with pytest.raises(FirestoreIndisponivel):
+            call_with_deadline("teste_circuito", _falha_transitoria, retries=0)
+    assert breaker.state == CircuitBreaker.ABERTO
+
+    chamadas = []
+    with pytest.raises(FirestoreIndisponivel, match="circuito aberto"):
+        call_with_deadline("teste_circuito", lambda: chamadas.append(1))
+    assert chamadas == []
+
+    time.sleep(0.12)
+    assert breaker.state == CircuitBreaker.MEIO_ABERTO
+    assert call_with_deadline("teste_circuito", lambda: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.FECHADO
+    assert breaker.aberturas == 1
+
+
+def test_meio_aberto_libera_uma_chamada_de_teste(breaker):
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.12)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.ABERTO
@@ -0,0 +1,99 @@
+# tests/test_revenue_forecast.py
+import numpy as np
+import pytest
+
+from services import revenue_forecast as rf
+from services.leads_service import STATUS_PIPELINE
+from services.revenue_forecast import (
+    ETAPAS_ABERTAS,
+    RevenueForecaster,
+    expected_revenue,
+    stage_probabilities,
+)
+
+_IDX = {s: i for i, s in enumerate(STATUS_PIPELINE)}
+
+
+def test_sem_historico_todas_as_etapas_na_taxa_geral():
+    p = stage_probabilities({}, 0.3)
+    assert p == pytest.approx({etapa: 0.3 for etapa in ETAPAS_ABERTAS})
+
+
+def test_cadeia_de_etapas():
+    transicoes = {
+        "novo": {"atendimento": 1000},
+        "atendimento": {"negociacao": 500, "perdido": 500},
+        "negociacao": {"faturado": 800, "perdido": 200},
+    }
+    p = stage_probabilities(transicoes, 0.5)
+
+    # Com muitas saídas a suavização quase não pesa
+    assert p["negociacao"] == pytest.approx(0.8, abs=0.01)
+    assert p["atendimento"] == pytest.approx(0.4, abs=0.01)
+    assert p["novo"] == pytest.approx(0.4, abs=0.01)
+    assert all(0.0 <= v <= 1.0 for v in p.values())
+
+
+def test_poucas_saidas_ficam_perto_da_taxa_geral():
+    p = stage_probabilities({"negociacao": {"faturado": 1}}, 0.2)
+    assert 0.2 < p["negociacao"] < 0.5
+
+
+def test_valor_esperado():
+    valor = np.array([1000.0, 500.0, 200.0, 300.0])
+    status = np.array([_IDX["negociacao"], _IDX["novo"], _IDX["faturado"], -1])
+    p_status = np.zeros(len(STATUS_PIPELINE) + 1)
+    p_status[_IDX["negociacao"]] = 0.5
+    p_status[_IDX["novo"]] = 0.1
+    ajuste_vendedor = np.array([1.0, 2.0, 1.0, 1.0])
+    ajuste_origem = np.array([3.0, 1.0, 1.0, 1.0])
+
+    esperado = expected_revenue(valor, status, p_status, ajuste_vendedor, ajuste_origem)
+
+    # 0,5 × 3 passa de 1: limitado a 1; fechado e status desconhecido valem 0
+    assert esperado.tolist() == pytest.approx([1000.0, 100.0, 0.0, 0.0])
+
+
+def _colunas():
+    status = np.array([_IDX["negociacao"], _IDX["faturado"], _IDX["perdido"], _IDX["novo"]])
+    return {
+        "version": 1,
+        "valor": np.array([1000.0, 400.0, 0.0, 200.0]),
+        "status": status,
+        "vendedor": np.array([0, 0, 1, 1]),
+        "vendedores": ["a@x", "b@x"],
+        "origem": np.array([0, 0, 0, 0]),
+        "n_origens": 1,
+    }
+
+
+class _Scorer:
+    def columns(self):
+        return _colunas()
+
+
+def test_agregado_do_funil_e_lido_fora_do_lock(monkeypatch):
+    previsor = RevenueForecaster()
+    chamadas = []
+
+    def agregado():
+        # Outra sessão consegue pegar o lock enquanto o agregado é buscado
+        assert previsor._lock.acquire(blocking=False)
+        previsor._lock.release()
+        chamadas.append(1)
+        return {"transicoes": {"negociacao": {"faturado": 3, "perdido": 1}}}
+
+    monkeypatch.setattr(rf, "get_lead_scorer", lambda: _Scorer())
+    monkeypatch.setattr(rf, "get_funnel_aggregate", agregado)
+
+    previsao = previsor.forecast()
+    previsor.forecast()
+
+    assert chamadas == [1]  # dentro do _MODELO_TTL_S
+    assert previsao["leads_abertos"] == 2
+    assert previsao["total_aberto"] == 1200.0
+    assert previsao["taxa_geral"] == 0.5
+    etapas = {e["etapa"]: e for e in previsao["por_etapa"]}
+    assert etapas["negociacao"]["leads"] == 1
+    assert 0.5 < etapas["negociacao"]["probabilidade"] < 0.75
+    assert [v["vendedor"] for v in previsao["por_vendedor"]] == ["a@x", "b@x"]
@@ -0,0 +1,91 @@
+# tests/test_single_flight.py
+import threading
+import time
+
+import pytest
+
+from services import single_flight as sf
+from services.single_flight import single_flight, single_flight_metrics
+
+
+@pytest.fixture(autouse=True)
+def metricas_limpas(monkeypatch):
+    monkeypatch.setattr(sf, "_metrics", {})
+
+
+def _em_paralelo(fn, argumentos):
+    resultados = [None] * len(argumentos)
+
+    def rodar(i, args):
+        try:
+            resultados[i] = fn(*args)
+        except Exception as e:
+            resultados[i] = e
+
+    threads = [threading.Thread(target=rodar, args=(i, a)) for i, a in enumerate(argumentos)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return resultados
+
+
+def test_chamadas_simultaneas_iguais_executam_uma_vez():
+    execucoes = []
+    liberar = threading.Event()
+
+    @single_flight("teste_consulta")
+    def consulta(status, limit=5):
+        execucoes.append((status, limit))
+        liberar.wait(2)
+        return [status] * limit
+
+    threading.Timer(0.1, liberar.set).start()
+    # Posicional ou nomeado, com ou sem default: mesma chamada
+    resultados = _em_paralelo(consulta, [("novo",), ("novo", 5), ("novo",), ("novo", 5)])
+
+    assert execucoes == [("novo", 5)]
+    assert all(r == ["novo"] * 5 for r in resultados)
+    assert single_flight_metrics() == {
+        "teste_consulta": {"calls": 4, "executed": 1, "coalesced": 3}
+    }
+
+
+def test_argumentos_diferentes_nao_se_misturam():
+    @single_flight("teste_vendedor")
+    def por_vendedor(email):
+        time.sleep(0.05)
+        return email
+
+    assert _em_paralelo(por_vendedor, [("a@x",), ("b@x",)]) == ["a@x", "b@x"]
+    # Uma entrada por operação, não por argumento
+    assert single_flight_metrics() == {
+        "teste_vendedor": {"calls": 2, "executed": 2, "coalesced": 0}
+    }
+
+
+def test_erro_da_lider_vai_para_quem_esperou():
+    execucoes = []
+
+    @single_flight("teste_erro")
+    def falha():
+        execucoes.append(1)
+        time.sleep(0.1)
+        raise RuntimeError("fora")
+
+    resultados = _em_paralelo(falha, [(), (), ()])
+
+    assert len(execucoes) == 1
+    assert all(isinstance(r, RuntimeError) for r in resultados)
+
+
+def test_nada_fica_em_cache_depois_da_lider():
+    execucoes = []
+
+    @single_flight("teste_sem_cache")
+    def consulta():
+        execucoes.append(1)
+        return len(execucoes)
+
+    assert consulta() == 1
+    assert consulta() == 2
@@ -0,0 +1,89 @@
+# tests/test_snapshot_store.py
+import sqlite3
+from datetime import datetime, timezone
+
+from services.snapshot_store import SnapshotStore
+
+_WATERMARK = datetime(2026, 10, 18, 12, 30, tzinfo=timezone.utc)
+
+
+def _leads():
+    return {
+        "L1": {
+            "id": "L1",
+            "nome": "Ana",
+            "valor_previsto": 1500.5,
+            "created_at": datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            "tags": ["vip"],
+        },
+        "L2": {"id": "L2", "nome": "Bia", "valor_previsto": None},
+    }
+
+
+def test_ida_e_volta(tmp_path):
+    store = SnapshotStore(str(tmp_path / "cache" / "snap.sqlite3"), project=lambda: "proj")
+    store.save(_leads(), [], _WATERMARK, completo=True)
+
+    outra = SnapshotStore(store.path, project=lambda: "proj")
+    leads, watermark = outra.load()
+
+    assert leads == _leads()
+    assert watermark == _WATERMARK
+    assert outra.full_load_at is not None
+
+
+def test_delta(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snap.sqlite3"))
+    store.save(_leads(), [], _WATERMARK, completo=True)
+    store.save({"L3": {"id": "L3", "nome": "Caio"}}, ["L1"], _WATERMARK)
+
+    leads, _ = store.load()
+    assert sorted(leads) == ["L2", "L3"]
+
+    # Carga completa substitui tudo
+    store.save({"L9": {"id": "L9"}}, [], _WATERMARK, completo=True)
+    assert sorted(store.load()[0]) == ["L9"]
+
+
+def test_sem_arquivo_ou_sem_watermark(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snap.sqlite3"))
+    assert store.load() == ({}, None)
+    store.save(_leads(), [], None)  # nada a gravar sem watermark
+    assert store.load() == ({}, None)
+
+
+def test_arquivo_de_outro_projeto_e_ignorado(tmp_path):
+    caminho = str(tmp_path / "snap.sqlite3")
+    SnapshotStore(caminho, project=lambda: "producao").save(_leads(), [], _WATERMARK, completo=True)
+
+    assert SnapshotStore(caminho, project=lambda: "homologacao").load() == ({}, None)
+    assert SnapshotStore(caminho, project=lambda: "producao").load()[1] == _WATERMARK
+
+
+def test_falhas_ao_gravar_nao_propagam(tmp_path):
+    caminho = str(tmp_path / "snap.sqlite3")
+    store = SnapshotStore(caminho)
+    store.save(_leads(), [], _WATERMARK, completo=True)
+
+    # Valor que o JSON não representa: o lote é desfeito, o arquivo fica como estava
+    store.save({"L3": {"id": "L3", "x": object()}}, ["L1"], _WATERMARK)
+    assert sorted(store.load()[0]) == ["L1", "L2"]
+
+    # Pasta que não pode ser criada
+    arquivo = tmp_path / "arquivo"
+    arquivo.write_text("")
+    SnapshotStore(str(arquivo / "snap.sqlite3")).save(_leads(), [], _WATERMARK)
+
+
+def test_arquivo_corrompido_e_ignorado(tmp_path):
+    caminho = tmp_path / "snap.sqlite3"
+    caminho.write_bytes(b"isto nao e sqlite" * 100)
+    assert SnapshotStore(str(caminho)).load() == ({}, None)
+
+    outro = tmp_path / "schema.sqlite3"
+    conn = sqlite3.connect(str(outro))
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute("INSERT INTO meta VALUES ('schema', '0'), ('watermark', '2026-01-01T00:00:00')")
+    conn.commit()
+    conn.close()
+    assert SnapshotStore(str(outro)).load() == ({}, None)
@@ -0,0 +1,143 @@
+# tests/test_streaming_stats.py
+import random
+
+import pytest
+
+from services.leads_service import STATUS_PIPELINE
+from services.streaming_stats import LeadStats, QuantileSketch, _SnapshotStats
+
+
+def _exato(valores, q):
+    ordenados = sorted(valores)
+    return ordenados[int(q * (len(ordenados) - 1))]
+
+
+def test_sketch_respeita_o_erro_relativo():
+    gerador = random.Random(7)
+    valores = [gerador.lognormvariate(8, 1.5) for _ in range(5000)]
+    sketch = QuantileSketch(erro_relativo=0.01)
+    for v in valores:
+        sketch.add(v)
+
+    for q in (0.1, 0.5, 0.9, 0.99):
+        exato = _exato(valores, q)
+        assert abs(sketch.quantile(q) - exato) <= 0.01 * exato
+
+
+def test_sketch_merge_e_remove():
+    valores = [float(v) for v in range(1, 1001)]
+    inteiro, parte_a, parte_b = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for v in valores:
+        inteiro.add(v)
+        (parte_a if v % 2 else parte_b).add(v)
+
+    mesclado = parte_a.merge(parte_b)
+    assert mesclado.count == inteiro.count
+    assert mesclado.quantile(0.5) == inteiro.quantile(0.5)
+
+    for v in valores[500:]:
+        mesclado.remove(v)
+    assert mesclado.count == 500
+    assert mesclado.quantile(0.9) == pytest.approx(450, rel=0.01)
+
+    copia = QuantileSketch.from_dict(mesclado.to_dict())
+    assert copia.quantile(0.5) == mesclado.quantile(0.5)
+
+    with pytest.raises(ValueError):
+        inteiro.merge(QuantileSketch(erro_relativo=0.05))
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def _leads(n, vendedores=("a@x", "b@x")):
+    return [
+        {
+            "id": f"L{i}",
+            "status": STATUS_PIPELINE[i % len(STATUS_PIPELINE)],
+            "valor_previsto": float(i % 7) * 100,
+            "vendedor_email": vendedores[i % len(vendedores)],
+        }
+        for i in range(n)
+    ]
+
+
+def test_lead_stats_em_partes_igual_ao_todo():
+    leads = _leads(200)
+    todo = LeadStats(STATUS_PIPELINE).add_all(leads)
+    partes = LeadStats(STATUS_PIPELINE).add_all(leads[:120]).merge(
+        LeadStats(STATUS_PIPELINE).add_all(leads[120:])
+    )
+    resumo_partes, resumo_todo = partes.summary(), todo.summary()
+    assert resumo_partes["por_status"] == resumo_todo["por_status"]
+    assert resumo_partes["ticket_medio"] == pytest.approx(resumo_todo["ticket_medio"])
+    assert resumo_partes["ticket_mediana"] == resumo_todo["ticket_mediana"]
+    assert resumo_partes["por_vendedor"].keys() == resumo_todo["por_vendedor"].keys()
+
+    resumo = todo.summary("a@x")
+    assert resumo["total"] == 100
+    assert todo.summary("ninguem@x")["total"] == 0
+
+    todo.remove(leads[0])
+    assert todo.summary()["total"] == 199
+
+
+class _Snapshot:
+    """O mínimo do LeadsSnapshot que o acumulador usa."""
+
+    def __init__(self, leads):
+        self._leads = {l["id"]: l for l in leads}
+        self.version = 1
+        self._mudancas = [(1, frozenset(), True)]
+
+    def mudar(self, novos=(), removidos=(), completa=False):
+        self._leads = dict(self._leads)
+        for lead in novos:
+            self._leads[lead["id"]] = lead
+        for lead_id in removidos:
+            self._leads.pop(lead_id, None)
+        self.version += 1
+        ids = frozenset([l["id"] for l in novos] + list(removidos))
+        self._mudancas.append((self.version, ids, completa))
+
+    def leads(self):
+        return list(self._leads.values())
+
+    def get(self, lead_id):
+        return self._leads.get(lead_id)
+
+    def changes_since(self, version):
+        ids = set()
+        for versao, alterados, completa in self._mudancas:
+            if versao > version:
+                if completa:
+                    return None
+                ids |= alterados
+        return frozenset(ids), self.version
+
+
+def test_snapshot_stats_aplica_so_o_delta():
+    snapshot = _Snapshot(_leads(50))
+    stats = _SnapshotStats()
+    assert stats.summary(snapshot, STATUS_PIPELINE, None)["total"] == 50
+    acumulador = stats._stats
+
+    alterado = {**snapshot.get("L1"), "status": "faturado", "valor_previsto": 900.0}
+    snapshot.mudar(novos=[alterado, {"id": "L99", "status": "novo"}], removidos=["L2"])
+    resumo = stats.summary(snapshot, STATUS_PIPELINE, None)
+
+    assert stats._stats is acumulador  # não recalculou do zero
+    esperado = LeadStats(STATUS_PIPELINE).add_all(snapshot.leads()).summary()
+    assert resumo["total"] == esperado["total"] == 50
+    assert resumo["por_status"] == esperado["por_status"]
+    assert resumo["ticket_p90"] == esperado["ticket_p90"]
+
+
+def test_snapshot_stats_recalcula_na_carga_completa():
+    snapshot = _Snapshot(_leads(10))
+    stats = _SnapshotStats()
+    stats.summary(snapshot, STATUS_PIPELINE, None)
+    acumulador = stats._stats
+
+    snapshot.mudar(removidos=["L0"], completa=True)
+
+    assert stats.summary(snapshot, STATUS_PIPELINE, None)["total"] == 9
+    assert stats._stats is not acumulador
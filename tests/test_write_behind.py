@@ -0,0 +1,101 @@
+# tests/test_write_behind.py
+import time
+
+import pytest
+
+from services import write_behind
+from services.leads_service import LEADS_COLLECTION
+from services.resilience import FirestoreIndisponivel
+from services.write_behind import WriteBehindQueue
+
+
+class _Gravador:
+    """write_fn que registra as chamadas e falha as primeiras `falhas` vezes."""
+
+    def __init__(self, falhas: int = 0, erro: Exception = None):
+        self.falhas = falhas
+        self.erro = erro or FirestoreIndisponivel("fora")
+        self.chamadas = []
+
+    def __call__(self, lead_id, campos):
+        self.chamadas.append((time.monotonic(), lead_id, dict(campos)))
+        if len(self.chamadas) <= self.falhas:
+            raise self.erro
+
+
+@pytest.fixture(autouse=True)
+def backoff_curto(monkeypatch):
+    monkeypatch.setattr(write_behind, "_BACKOFF_BASE_S", 0.1)
+
+
+def test_edicoes_do_mesmo_lead_viram_uma_escrita():
+    gravador = _Gravador()
+    fila = WriteBehindQueue(write_fn=gravador, flush_interval_s=10)
+    fila.enqueue("L1", {"valor_previsto": 1.0})
+    fila.enqueue("L1", {"observacoes": "ligar"})
+    fila.enqueue("L1", {"valor_previsto": 2.0})
+
+    assert fila.depth() == 1
+    assert fila.apply_pending([{"id": "L1", "valor_previsto": None}]) == [
+        {"id": "L1", "valor_previsto": 2.0, "observacoes": "ligar"}
+    ]
+    assert fila.flush(timeout=2)
+    assert [c[1:] for c in gravador.chamadas] == [
+        ("L1", {"valor_previsto": 2.0, "observacoes": "ligar"})
+    ]
+    assert fila.coalesced == 2
+    assert fila.writes == 1
+
+
+def test_flush_respeita_o_backoff_das_retentativas():
+    gravador = _Gravador(falhas=2)
+    fila = WriteBehindQueue(write_fn=gravador, flush_interval_s=10)
+    fila.enqueue("L1", {"valor_previsto": 1.0})
+
+    assert fila.flush(timeout=5)
+    instantes = [c[0] for c in gravador.chamadas]
+    assert len(instantes) == 3
+    # Espera base de 0,1 s com jitter de 0,5 a 1,5; depois dobra
+    assert instantes[1] - instantes[0] >= 0.05
+    assert instantes[2] - instantes[1] >= 0.1
+    assert fila.retries == 2
+    assert fila.take_failures() == []
+
+
+def test_erro_definitivo_vai_direto_para_as_falhas():
+    gravador = _Gravador(falhas=1, erro=ValueError("campo inválido"))
+    fila = WriteBehindQueue(write_fn=gravador, flush_interval_s=10)
+    fila.enqueue("L1", {"valor_previsto": 1.0})
+
+    assert fila.flush(timeout=2)
+    assert len(gravador.chamadas) == 1
+    assert fila.retries == 0
+    assert fila.take_failures(["L1"]) == [
+        {"lead_id": "L1", "campos": {"valor_previsto": 1.0}, "erro": "campo inválido"}
+    ]
+    assert fila.take_failures() == []
+
+
+def test_tentativas_esgotadas(monkeypatch):
+    monkeypatch.setattr(write_behind, "_BACKOFF_BASE_S", 0.01)
+    gravador = _Gravador(falhas=100)
+    fila = WriteBehindQueue(write_fn=gravador, flush_interval_s=10)
+    fila.enqueue("L1", {"valor_previsto": 1.0})
+
+    assert fila.flush(timeout=5)
+    assert len(gravador.chamadas) == write_behind._MAX_TENTATIVAS
+    assert [f["lead_id"] for f in fila.take_failures()] == ["L1"]
+
+
+def test_lead_inexistente_no_firestore(fake_db):
+    fake_db.collection(LEADS_COLLECTION).document("L1").set({"nome": "Ana", "status": "novo"})
+    fila = WriteBehindQueue(flush_interval_s=10)
+    fila.enqueue("L1", {"valor_previsto": 10.0})
+    fila.enqueue("apagado", {"valor_previsto": 20.0})
+
+    assert fila.flush(timeout=5)
+    lead = fake_db.collection(LEADS_COLLECTION).document("L1").get().to_dict()
+    assert lead["valor_previsto"] == 10.0
+    assert "updated_at" in lead
+    assert [f["lead_id"] for f in fila.take_failures()] == ["apagado"]
+    assert fila.retries == 0
@@ -0,0 +1,398 @@
+# tools/fake_firestore.py
+"""
+Firestore em memória, com o subconjunto da API usado pelo app
+(collection/document/where/order_by/limit/stream/get_all/batch/
+collection_group/Increment). Usado pelo harness de carga e para rodar o
+app localmente sem credenciais.
+"""
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import DELETE_FIELD, FieldFilter, Increment, Query
+
+
+_TYPE_RANK = {type(None): 0, bool: 1, int: 2, float: 2, datetime: 3, str: 4}
+
+
+def _sort_key(value):
+    rank = _TYPE_RANK.get(type(value), 5)
+    if isinstance(value, datetime):
+        value = value.timestamp()
+    elif rank == 5:
+        value = str(value)
+    return rank, value
+
+
+def _normalize(value):
+    """Imita o Firestore: datetimes voltam sempre com timezone UTC."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _get_field(data: dict, path: str):
+    cur = data
+    for part in path.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return _MISSING
+        cur = cur[part]
+    return cur
+
+
+_MISSING = object()
+
+
+def _compare(a, op, b) -> bool:
+    if not isinstance(op, str):
+        # FieldFilter(campo, "==", None) vira filtro unário IS_NULL (3)
+        return a is None if op == 3 else a is not None
+    if op == "==":
+        return _sort_key(a) == _sort_key(b)
+    if op == "!=":
+        return a is not None and _sort_key(a) != _sort_key(b)
+    if op == "in":
+        return any(_sort_key(a) == _sort_key(x) for x in b)
+    if op == "not-in":
+        return a is not None and all(_sort_key(a) != _sort_key(x) for x in b)
+    if op == "array-contains":
+        return isinstance(a, list) and b in a
+    ka, kb = _sort_key(a), _sort_key(b)
+    if ka[0] != kb[0]:
+        return False
+    if op == "<":
+        return ka < kb
+    if op == "<=":
+        return ka <= kb
+    if op == ">":
+        return ka > kb
+    if op == ">=":
+        return ka >= kb
+    raise ValueError(f"Operador não suportado: {op}")
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.update_time = None
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self):
+        if self._data is None:
+            return None
+        return _normalize(dict(self._data))
+
+    def get(self, field):
+        value = _get_field(self._data or {}, field)
+        return None if value is _MISSING else _normalize(value)
+
+
+class FakeWriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class FakeDocumentReference:
+    def __init__(self, client, path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name: str):
+        return FakeCollectionReference(self._client, f"{self.path}/{name}")
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def get(self, *args, **kwargs):
+        self._client._simulate_latency()
+        with self._client._lock:
+            self._client.reads += 1
+            return self._client._snapshot(self)
+
+    def set(self, data, merge=False, **kwargs):
+        self._client._simulate_latency()
+        return self._client._apply([("set", self, data, merge, None)])
+
+    def create(self, data, **kwargs):
+        self._client._simulate_latency()
+        return self._client._apply([("create", self, data, False, None)])
+
+    def update(self, data, option=None, **kwargs):
+        self._client._simulate_latency()
+        return self._client._apply([("update", self, data, False, option)])
+
+    def delete(self, option=None, **kwargs):
+        self._client._simulate_latency()
+        return self._client._apply([("delete", self, None, False, option)])
+
+
+class FakeQuery:
+    def __init__(self, client, collection_path=None, group=None):
+        self._client = client
+        self._collection_path = collection_path
+        self._group = group
+        self._filters = []
+        self._orders = []
+        self._limit = None
+        self._start_after = None
+        self._fields = None
+
+    def _copy(self):
+        q = FakeQuery(self._client, self._collection_path, self._group)
+        q._filters = list(self._filters)
+        q._orders = list(self._orders)
+        q._limit = self._limit
+        q._start_after = self._start_after
+        q._fields = self._fields
+        return q
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        q = self._copy()
+        if filter is not None:
+            q._filters.append((filter.field_path, filter.op_string, filter.value))
+        else:
+            q._filters.append((field_path, op_string, value))
+        return q
+
+    def order_by(self, field_path, direction=Query.ASCENDING):
+        q = self._copy()
+        q._orders.append((field_path, direction))
+        return q
+
+    def limit(self, count):
+        q = self._copy()
+        q._limit = count
+        return q
+
+    def start_after(self, document_fields_or_snapshot):
+        q = self._copy()
+        q._start_after = document_fields_or_snapshot
+        return q
+
+    def select(self, field_paths):
+        q = self._copy()
+        q._fields = list(field_paths)
+        return q
+
+    def _matches_path(self, path: str) -> bool:
+        if self._group is not None:
+            parts = path.split("/")
+            return len(parts) >= 2 and parts[-2] == self._group
+        parent = path.rsplit("/", 1)[0]
+        return parent == self._collection_path
+
+    def _run(self):
+        with self._client._lock:
+            rows = [
+                (path, dict(data))
+                for path, data in self._client._docs.items()
+                if self._matches_path(path)
+            ]
+        out = []
+        for path, data in rows:
+            ok = True
+            for field, op, value in self._filters:
+                current = _get_field(data, field)
+                if current is _MISSING or not _compare(current, op, value):
+                    ok = False
+                    break
+            if ok:
+                out.append((path, data))
+
+        for field, _ in self._orders:
+            out = [r for r in out if _get_field(r[1], field) is not _MISSING]
+        for field, direction in reversed(self._orders):
+            out.sort(
+                key=lambda r: _sort_key(_get_field(r[1], field)),
+                reverse=direction == Query.DESCENDING,
+            )
+        if not self._orders:
+            out.sort(key=lambda r: r[0])
+
+        if self._start_after is not None:
+            cursor = self._start_after
+            ids = [r[0] for r in out]
+            if isinstance(cursor, FakeSnapshot) and cursor.reference.path in ids:
+                out = out[ids.index(cursor.reference.path) + 1:]
+            elif self._orders:
+                # Snapshot de doc que já saiu do resultado: posiciona pelo valor
+                if isinstance(cursor, FakeSnapshot):
+                    cursor = cursor.to_dict()
+                field, direction = self._orders[0]
+                value = cursor[field] if isinstance(cursor, dict) else cursor
+                op = "<" if direction == Query.DESCENDING else ">"
+                out = [r for r in out if _compare(_get_field(r[1], field), op, value)]
+
+        if self._limit is not None:
+            out = out[: self._limit]
+
+        snaps = []
+        for path, data in out:
+            if self._fields is not None:
+                data = {f: data[f] for f in self._fields if f in data}
+            snap = FakeSnapshot(FakeDocumentReference(self._client, path), data)
+            snap.update_time = self._client._update_times.get(path)
+            snaps.append(snap)
+        with self._client._lock:
+            self._client.reads += max(len(snaps), 1)
+        return snaps
+
+    def stream(self, *args, **kwargs):
+        self._client._simulate_latency()
+        return iter(self._run())
+
+    def get(self, *args, **kwargs):
+        self._client._simulate_latency()
+        return self._run()
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, path: str):
+        super().__init__(client, collection_path=path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id=None):
+        if document_id is None:
+            document_id = uuid.uuid4().hex[:20]
+        return FakeDocumentReference(self._client, f"{self._collection_path}/{document_id}")
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference, data, merge=False):
+        self._ops.append(("set", reference, data, merge, None))
+
+    def create(self, reference, data):
+        self._ops.append(("create", reference, data, False, None))
+
+    def update(self, reference, data, option=None):
+        self._ops.append(("update", reference, data, False, option))
+
+    def delete(self, reference, option=None):
+        self._ops.append(("delete", reference, None, False, option))
+
+    def __len__(self):
+        return len(self._ops)
+
+    def commit(self, *args, **kwargs):
+        if len(self._ops) > 500:
+            raise ValueError("Batch com mais de 500 operações.")
+        self._client._simulate_latency()
+        resultado = self._client._apply(self._ops)
+        n, self._ops = len(self._ops), []
+        return [resultado] * n
+
+
+class FakeFirestore:
+    """Cliente Firestore falso, thread-safe, com latência opcional por chamada."""
+
+    def __init__(self, latency_s: float = 0.0):
+        self._docs = {}
+        self._update_times = {}  # path -> instante da última gravação
+        self._ultima_gravacao = datetime.min.replace(tzinfo=timezone.utc)
+        self._lock = threading.RLock()
+        self.latency_s = latency_s
+        self.reads = 0
+        self.writes = 0
+
+    def _simulate_latency(self):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+    def collection(self, name: str):
+        return FakeCollectionReference(self, name)
+
+    def collection_group(self, name: str):
+        return FakeQuery(self, group=name)
+
+    def document(self, path: str):
+        return FakeDocumentReference(self, path)
+
+    def write_option(self, **kwargs):
+        return kwargs
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, references, *args, **kwargs):
+        self._simulate_latency()
+        with self._lock:
+            self.reads += len(references)
+            return [self._snapshot(ref) for ref in references]
+
+    def _snapshot(self, ref):
+        data = self._docs.get(ref.path)
+        snap = FakeSnapshot(ref, None if data is None else dict(data))
+        snap.update_time = self._update_times.get(ref.path)
+        return snap
+
+    def _apply(self, ops):
+        with self._lock:
+            for kind, ref, data, merge, option in ops:
+                if kind == "update" and ref.path not in self._docs:
+                    raise NotFound(f"Documento não encontrado: {ref.path}")
+                if kind == "create" and ref.path in self._docs:
+                    raise AlreadyExists(f"Documento já existe: {ref.path}")
+                esperado = (option or {}).get("last_update_time")
+                if esperado is not None and self._update_times.get(ref.path) != esperado:
+                    raise FailedPrecondition(f"Documento alterado desde a leitura: {ref.path}")
+            # Instantes estritamente crescentes, como os do servidor
+            agora = max(datetime.now(timezone.utc), self._ultima_gravacao + timedelta(microseconds=1))
+            self._ultima_gravacao = agora
+            for kind, ref, data, merge, _ in ops:
+                self.writes += 1
+                if kind == "delete":
+                    self._docs.pop(ref.path, None)
+                    self._update_times.pop(ref.path, None)
+                    continue
+                if kind in ("set", "create") and not merge:
+                    current = {}
+                else:
+                    current = dict(self._docs.get(ref.path) or {})
+                for key, value in data.items():
+                    self._write_field(current, key, value, dotted=(kind == "update"))
+                self._docs[ref.path] = current
+                self._update_times[ref.path] = agora
+            return FakeWriteResult(agora)
+
+    @staticmethod
+    def _write_field(doc: dict, key: str, value, dotted: bool):
+        parts = key.split(".") if dotted else [key]
+        target = doc
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        last = parts[-1]
+        if value is DELETE_FIELD:
+            target.pop(last, None)
+        elif isinstance(value, Increment):
+            target[last] = (target.get(last) or 0) + value.value
+        elif isinstance(value, dict) and not dotted:
+            nested = dict(target.get(last) or {}) if isinstance(target.get(last), dict) else {}
+            for k, v in value.items():
+                FakeFirestore._write_field(nested, k, v, dotted=False)
+            target[last] = nested
+        else:
+            target[last] = _normalize(value)
@@ -0,0 +1,345 @@
+# tools/load_test.py
+"""
+Teste de carga do app Streamlit com sessões simultâneas.
+
+Sobe um servidor Streamlit de verdade (tools/load_test_app.py: o app.py com
+o Firestore em memória) e abre N sessões por websocket, como N navegadores.
+Cada sessão faz o roteiro de um vendedor: login -> Home -> Pipeline ->
+movimentos de status -> Home. A latência de cada rerun é medida do envio
+da interação até o fim do script no servidor.
+
+    python -m tools.load_test --sessions 1,5,10,20 --moves 5
+    python -m tools.load_test --sessions 10 --latency-ms 40 --json
+
+Para cada quantidade de sessões, mostra p50/p95/p99 da latência de rerun
+(geral e por etapa), reruns por segundo e a memória (RSS) do servidor.
+Com --url, usa um servidor já rodando o load_test_app.py (sem RSS).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import bcrypt
+
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SENHA = "carga-123"
+_PAGINA_PIPELINE = "Leads (Pipeline)"
+
+# ================== LADO DO SERVIDOR ==================
+
+_backend_lock = threading.Lock()
+_backend = None
+
+
+def seed(fake, vendedores: int, leads_por_vendedor: int) -> List[str]:
+    """Cria os usuários vendedores e a carteira de leads de cada um."""
+    from services.leads_service import create_leads_batch
+
+    # Um hash só (custo padrão do bcrypt): o login mede o checkpw real
+    password_hash = bcrypt.hashpw(_SENHA.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    emails = []
+    for v in range(vendedores):
+        email = f"vendedor{v}@carga.local"
+        fake.collection("usuarios").document(email).set(
+            {"email": email, "nome": f"Vendedor {v}", "password_hash": password_hash, "role": "user"}
+        )
+        create_leads_batch(
+            [
+                {
+                    "nome": f"Lead {v}-{i}",
+                    "email": f"lead{v}-{i}@carga.local",
+                    "telefone": f"11{v:04d}{i:04d}",
+                    "vendedor_email": email,
+                    "valor_previsto": float(1000 + 137 * i),
+                    "origem": ("site", "indicação", "feira")[i % 3],
+                }
+                for i in range(leads_por_vendedor)
+            ]
+        )
+        emails.append(email)
+    return emails
+
+
+def install_fake_backend():
+    """Troca o Firestore pelo fake e popula a base (uma vez por processo)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            from services.firebase_init import set_db
+            from tools.fake_firestore import FakeFirestore
+
+            fake = FakeFirestore()
+            set_db(fake)
+            seed(
+                fake,
+                int(os.getenv("LEAD_LOADTEST_SELLERS", "10")),
+                int(os.getenv("LEAD_LOADTEST_LEADS", "40")),
+            )
+            fake.latency_s = float(os.getenv("LEAD_LOADTEST_LATENCY_MS", "0")) / 1000
+            _backend = fake
+        return _backend
+
+
+# ================== LADO DO CLIENTE ==================
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Sessao:
+    """Uma aba de navegador: websocket + estado dos widgets da última execução."""
+
+    def __init__(self, url: str, email: str, moves: int, timeout_s: float):
+        self.url = url
+        self.email = email
+        self.moves = moves
+        self.timeout_s = timeout_s
+        self.widgets: Dict[str, tuple] = {}  # id -> (tipo, proto)
+        self.valores: Dict[str, object] = {}  # id -> WidgetState com o valor atual
+        self.amostras: List[tuple] = []
+        self.erros: List[str] = []
+        self._ws = None
+
+    def _widget(self, tipo: str, label: Optional[str] = None, key_prefix: Optional[str] = None):
+        for wid, (t, proto) in self.widgets.items():
+            if t != tipo or (label is not None and proto.label != label):
+                continue
+            # id = "$$ID-<hash>-<key>"
+            if key_prefix is not None and not wid.split("-", 2)[-1].startswith(key_prefix):
+                continue
+            return wid, proto
+        return None, None
+
+    async def _receber_ate_o_fim(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await self._ws.recv())
+            tipo = msg.WhichOneof("type")
+            if tipo == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                elemento = msg.delta.new_element
+                tipo_el = elemento.WhichOneof("type")
+                if tipo_el == "exception":
+                    self.erros.append(elemento.exception.message)
+                elif tipo_el in ("button", "text_input", "radio", "selectbox", "checkbox"):
+                    proto = getattr(elemento, tipo_el)
+                    self.widgets[proto.id] = (tipo_el, proto)
+            elif tipo == "script_finished":
+                if msg.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    # st.rerun(): o servidor já começa a próxima execução
+                    self.widgets = {}
+                    continue
+                if msg.script_finished != ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY:
+                    return
+
+    async def _rerun(self, etapa: str, valores: Optional[Dict] = None, gatilho: Optional[str] = None):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        for wid, valor in (valores or {}).items():
+            # text_input e radio (a opção formatada) vão como string_value
+            self.valores[wid] = WidgetState(id=wid, string_value=valor)
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        # Como o navegador: manda o valor dos widgets que estão na tela
+        msg.rerun_script.widget_states.widgets.extend(
+            e for wid, e in self.valores.items() if wid in self.widgets
+        )
+        if gatilho:
+            msg.rerun_script.widget_states.widgets.append(WidgetState(id=gatilho, trigger_value=True))
+
+        self.widgets = {}
+        inicio = time.perf_counter()
+        await self._ws.send(msg.SerializeToString())
+        await asyncio.wait_for(self._receber_ate_o_fim(), self.timeout_s)
+        self.amostras.append((etapa, (time.perf_counter() - inicio) * 1000))
+
+    async def run(self) -> None:
+        from websockets.asyncio.client import connect
+
+        async with connect(
+            f"{self.url.replace('http', 'ws', 1)}/_stcore/stream",
+            subprotocols=["streamlit"],
+            max_size=None,
+        ) as ws:
+            self._ws = ws
+            await self._rerun("login_page")
+
+            email_id, _ = self._widget("text_input", key_prefix="login_email")
+            senha_id, _ = self._widget("text_input", key_prefix="login_password")
+            entrar_id, _ = self._widget("button", label="Entrar")
+            if not (email_id and senha_id and entrar_id):
+                self.erros.append("login: formulário não encontrado")
+                return
+            await self._rerun(
+                "login+home", {email_id: self.email, senha_id: _SENHA}, gatilho=entrar_id
+            )
+
+            nav_id, _ = self._widget("radio", label="Navegação")
+            if nav_id is None:
+                self.erros.append("login: não autenticou")
+                return
+            await self._rerun("pipeline", {nav_id: _PAGINA_PIPELINE})
+
+            for _ in range(self.moves):
+                proximo_id, _ = self._widget("button", key_prefix="next_")
+                if proximo_id is None:
+                    break
+                await self._rerun("move", gatilho=proximo_id)
+
+            nav_id, _ = self._widget("radio", label="Navegação")
+            await self._rerun("home", {nav_id: "Home"})
+
+
+async def _rodar_sessoes(sessoes: List[Sessao]) -> float:
+    async def uma(s: Sessao):
+        try:
+            await s.run()
+        except Exception as e:  # roteiro quebrado conta como erro, não derruba o teste
+            s.erros.append(f"{type(e).__name__}: {e}")
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(uma(s) for s in sessoes))
+    return time.perf_counter() - inicio
+
+
+def run_level(url: str, emails: List[str], n: int, moves: int, timeout_s: float) -> Dict:
+    sessoes = [Sessao(url, emails[i % len(emails)], moves, timeout_s) for i in range(n)]
+    duracao = asyncio.run(_rodar_sessoes(sessoes))
+
+    por_etapa = defaultdict(list)
+    for s in sessoes:
+        for etapa, ms in s.amostras:
+            por_etapa[etapa].append(ms)
+    todas = [ms for lista in por_etapa.values() for ms in lista]
+
+    def resumo(valores):
+        return {
+            "p50_ms": round(_percentil(valores, 0.50), 1),
+            "p95_ms": round(_percentil(valores, 0.95), 1),
+            "p99_ms": round(_percentil(valores, 0.99), 1),
+        }
+
+    return {
+        "sessions": n,
+        "reruns": len(todas),
+        "duration_s": round(duracao, 2),
+        "reruns_per_s": round(len(todas) / duracao, 1) if duracao else 0.0,
+        **resumo(todas),
+        "steps": {etapa: resumo(v) for etapa, v in por_etapa.items()},
+        "errors": [e for s in sessoes for e in s.erros][:10],
+    }
+
+
+def _subir_servidor(port: int, args) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        LEAD_LOADTEST_SELLERS=str(args.sellers),
+        LEAD_LOADTEST_LEADS=str(args.leads_per_seller),
+        LEAD_LOADTEST_LATENCY_MS=str(args.latency_ms),
+        # Snapshot local isolado: não reaproveita nem suja o cache do app
+        LEAD_SYSTEM_SNAPSHOT_PATH=os.path.join(_RAIZ, ".cache", f"load_test_{port}.sqlite3"),
+    )
+    servidor = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run",
+            os.path.join(_RAIZ, "tools", "load_test_app.py"),
+            "--server.headless", "true",
+            "--server.port", str(port),
+            "--browser.gatherUsageStats", "false",
+        ],
+        cwd=_RAIZ,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return servidor
+        except OSError:
+            time.sleep(0.3)
+    servidor.terminate()
+    raise RuntimeError("Servidor Streamlit não respondeu em 60s.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga com sessões Streamlit simultâneas.")
+    parser.add_argument("--sessions", default="1,5,10,20", help="Quantidades de sessões, separadas por vírgula.")
+    parser.add_argument("--moves", type=int, default=5, help="Movimentos de status por sessão.")
+    parser.add_argument("--sellers", type=int, default=10, help="Vendedores cadastrados.")
+    parser.add_argument("--leads-per-seller", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latência simulada por chamada ao Firestore.")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Tempo máximo de um rerun (s).")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--url", help="Usar um servidor já rodando tools/load_test_app.py.")
+    parser.add_argument("--json", action="store_true", help="Saída em JSON.")
+    args = parser.parse_args()
+
+    servidor = None if args.url else _subir_servidor(args.port, args)
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    emails = [f"vendedor{v}@carga.local" for v in range(args.sellers)]
+
+    resultados = []
+    try:
+        # Aquecimento (imports, snapshot, cubo): fora das medições
+        run_level(url, emails, 1, 1, args.timeout)
+        for n in (int(x) for x in args.sessions.split(",") if x.strip()):
+            resultado = run_level(url, emails, n, args.moves, args.timeout)
+            resultado["server_rss_mb"] = _rss_mb(servidor.pid) if servidor else None
+            resultados.append(resultado)
+            if args.json:
+                continue
+            rss = resultado["server_rss_mb"]
+            print(
+                f"{n:>4} sessões | {resultado['reruns']:>5} reruns em {resultado['duration_s']:>6.2f}s "
+                f"({resultado['reruns_per_s']:>6.1f}/s) | p50 {resultado['p50_ms']:>7.1f} ms "
+                f"p95 {resultado['p95_ms']:>7.1f} ms p99 {resultado['p99_ms']:>7.1f} ms | "
+                f"RSS {'-' if rss is None else f'{rss:.1f} MB'}"
+            )
+            for etapa, r in resultado["steps"].items():
+                print(f"       {etapa:<12} p50 {r['p50_ms']:>7.1f}  p95 {r['p95_ms']:>7.1f}  p99 {r['p99_ms']:>7.1f}")
+            for erro in resultado["errors"]:
+                print(f"       ! {erro}")
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.wait(timeout=10)
+            for sufixo in ("", "-wal", "-shm"):
+                try:
+                    os.remove(os.path.join(_RAIZ, ".cache", f"load_test_{args.port}.sqlite3{sufixo}"))
+                except OSError:
+                    pass
+
+    if args.json:
+        print(json.dumps(resultados, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# tools/load_test_app.py
+"""
+Entrada do app para o teste de carga: o mesmo app.py, mas com o Firestore
+em memória (tools/fake_firestore.py) já populado com vendedores e leads.
+
+    streamlit run tools/load_test_app.py
+
+Normalmente quem sobe este servidor é o tools/load_test.py. A massa de
+dados vem das variáveis LEAD_LOADTEST_SELLERS, LEAD_LOADTEST_LEADS e
+LEAD_LOADTEST_LATENCY_MS (latência simulada por chamada ao Firestore).
+"""
+import os
+import runpy
+import sys
+
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _RAIZ not in sys.path:
+    sys.path.insert(0, _RAIZ)
+
+from tools.load_test import install_fake_backend  # noqa: E402
+
+# Idempotente: o Streamlit re-executa este arquivo a cada rerun
+install_fake_backend()
+runpy.run_path(os.path.join(_RAIZ, "app.py"), run_name="__main__")
@@ -0,0 +1,14 @@
+# ui/formatting.py
+"""Formatação de valores compartilhada pelas telas."""
+
+# "1,234.56" -> "1.234,56" numa passada só (troca vírgula e ponto)
+_PADRAO_BR = str.maketrans(",.", ".,")
+
+
+def format_brl(valor, padrao: str = "R$ 0,00") -> str:
+    """Valor em reais no padrão brasileiro ("R$ 1.234,56"); `padrao` se não for número."""
+    try:
+        v = float(valor or 0)
+    except (TypeError, ValueError):
+        return padrao
+    return "R$ " + f"{v:,.2f}".translate(_PADRAO_BR)
@@ -4,36 +4,32 @@ import streamlit as st
 import pandas as pd
 
 from services.leads_service import (
-    get_leads_stats,
-    list_leads,
+    get_archive_totals,
+    list_negociacoes_sem_valor,
+    list_top_leads,
     STATUS_PIPELINE,
 )
+from services.lead_scoring import get_lead_scorer
+from services.leads_sync import get_snapshot, list_leads_synced
+from services.resilience import FirestoreIndisponivel
+from services.memory_report import memory_report
+from services.seller_directory import get_seller_directory
+from services.streaming_stats import get_snapshot_stats
+from services.daily_metrics import get_daily_trend, seller_view
+from services.followup_service import PRAZOS_DIAS, get_followup_scheduler
+from services.funnel_analytics import get_funnel_velocity
+from services.metrics_cube import SEM_DATA, get_metrics_cube
+from services.revenue_forecast import get_revenue_forecast
+from ui.formatting import format_brl
 
 
 # ================== HELPERS GERAIS ==================
 
 
-def _format_currency(valor):
-    try:
-        v = float(valor or 0)
-    except (TypeError, ValueError):
-        return "R$ 0,00"
-    return (
-        "R$ "
-        + f"{v:,.2f}"
-        .replace(",", "X")
-        .replace(".", ",")
-        .replace("X", ".")
-    )
-
-
 def _sum_valor_por_status(status, vendedor_email=None) -> float:
     """Soma o valor previsto dos leads em um determinado status."""
     total = 0.0
-    try:
-        leads = list_leads(status=status, vendedor_email=vendedor_email)
-    except TypeError:
-        leads = list_leads(status, vendedor_email)
+    leads = list_leads_synced(status=status, vendedor_email=vendedor_email)
     for lead in leads:
         try:
             total += float(lead.get("valor_previsto") or 0)
@@ -43,14 +39,12 @@ def _sum_valor_por_status(status, vendedor_email=None) -> float:
 
 
 def _count_por_status(vendedor_email=None) -> dict:
-    """Conta quantos leads existem em cada status, usando list_leads (fonte confiável)."""
-    counts = {}
-    for status in STATUS_PIPELINE:
-        try:
-            leads = list_leads(status=status, vendedor_email=vendedor_email)
-        except TypeError:
-            leads = list_leads(status, vendedor_email)
-        counts[status] = len(leads)
+    """Conta quantos leads existem em cada status, usando o snapshot sincronizado."""
+    counts = {status: 0 for status in STATUS_PIPELINE}
+    for lead in list_leads_synced(vendedor_email=vendedor_email):
+        status = lead.get("status")
+        if status in counts:
+            counts[status] += 1
     return counts
 
 
@@ -62,7 +56,7 @@ def _compute_status_metrics(vendedor_email=None):
     - faturados
     - perdidos
     - abertos
-    tudo calculado em cima do list_leads.
+    tudo calculado em cima do snapshot sincronizado (leads_sync).
     """
     por_status = _count_por_status(vendedor_email)
     total = sum(por_status.values())
@@ -74,13 +68,7 @@ def _compute_status_metrics(vendedor_email=None):
 
 def _load_all_leads():
     """Carrega todos os leads (de todos os status). Usado no dashboard de admin."""
-    all_leads = []
-    for status in STATUS_PIPELINE:
-        try:
-            all_leads.extend(list_leads(status=status, vendedor_email=None))
-        except TypeError:
-            all_leads.extend(list_leads(status, None))
-    return all_leads
+    return list_leads_synced(vendedor_email=None)
 
 
 def _build_status_dataframe(stats_por_status: dict) -> pd.DataFrame:
@@ -103,17 +91,28 @@ def _build_valor_status_dataframe(vendedor_email=None) -> pd.DataFrame:
     return pd.DataFrame(data)
 
 
+def _caption_ticket(stats: dict) -> None:
+    """Distribuição do ticket (leads com valor) abaixo dos KPIs."""
+    if not stats.get("ticket_medio"):
+        return
+    st.caption(
+        f"Ticket — mediana {format_brl(stats.get('ticket_mediana'))}, "
+        f"p90 {format_brl(stats.get('ticket_p90'))}, "
+        f"médio dos faturados {format_brl(stats.get('ticket_medio_ganho'))}."
+    )
+
+
 # ================== HOME VENDEDOR ==================
 
 
 def _render_vendedor_home(user: dict):
     vendedor_email = user.get("email")
 
-    # Ticket médio continua vindo da função de stats (se ela estiver correta)
-    stats = get_leads_stats(vendedor_email=vendedor_email)
+    # Ticket médio, mediana e p90 do acumulador compartilhado do snapshot
+    stats = get_snapshot_stats(vendedor_email)
     ticket_medio = stats.get("ticket_medio", 0.0)
 
-    # Todo o resto (por status, total, abertos etc) calculamos com list_leads
+    # Todo o resto (por status, total, abertos etc) calculamos com o snapshot
     por_status, total, faturados, perdidos, abertos = _compute_status_metrics(
         vendedor_email=vendedor_email
     )
@@ -144,7 +143,8 @@ def _render_vendedor_home(user: dict):
     with col3:
         st.metric("Leads faturados", faturados)
     with col4:
-        st.metric("Ticket médio (R$)", _format_currency(ticket_medio))
+        st.metric("Ticket médio (R$)", format_brl(ticket_medio))
+    _caption_ticket(stats)
 
     st.markdown("---")
 
@@ -159,20 +159,30 @@ def _render_vendedor_home(user: dict):
 
     with col2:
         st.metric("Taxa de conversão", f"{conversao:.1f}%")
-        st.metric("Valor em negociação", _format_currency(valor_negociacao))
-        st.metric("Valor faturado", _format_currency(valor_faturado))
+        st.metric("Valor em negociação", format_brl(valor_negociacao))
+        st.metric("Valor faturado", format_brl(valor_faturado))
         st.metric("Leads perdidos", perdidos)
 
     st.markdown("---")
 
-    # Atividades pendentes simples (sem campo de datas)
+    # Atividades pendentes: novos por prioridade (score), negociações mais antigas
     st.markdown("### 📝 Atividades sugeridas")
 
-    leads_novo = list_leads(status="novo", vendedor_email=vendedor_email)
-    leads_negociacao = list_leads(status="negociacao", vendedor_email=vendedor_email)
+    scorer = get_lead_scorer()
+    if get_snapshot(sync=False).loaded:
+        leads_novo = scorer.top(status="novo", vendedor_email=vendedor_email, k=5)
+    else:
+        # Sem snapshot (a carga completa falhou): os mais antigos, numa consulta limitada
+        try:
+            leads_novo = list_top_leads("novo", vendedor_email=vendedor_email, limit=5)
+        except FirestoreIndisponivel:
+            leads_novo = []
 
     # Leads em negociação sem valor preenchido
-    neg_sem_valor = [l for l in leads_negociacao if not l.get("valor_previsto")]
+    try:
+        neg_sem_valor = list_negociacoes_sem_valor(vendedor_email=vendedor_email, limit=5)
+    except FirestoreIndisponivel:
+        neg_sem_valor = None
 
     col1, col2 = st.columns(2)
 
@@ -181,21 +191,46 @@ def _render_vendedor_home(user: dict):
         if not leads_novo:
             st.caption("Nenhum lead novo aguardando contato.")
         else:
-            for lead in leads_novo[:5]:
+            for lead in leads_novo:
                 nome = lead.get("nome", "Sem nome")
                 email = lead.get("email", "")
-                st.write(f"• **{nome}**  —  {email}")
+                score = scorer.score_of(lead["id"])
+                if score is None:
+                    st.write(f"• **{nome}**  —  {email}")
+                else:
+                    st.write(f"• **{nome}**  —  {email}  ·  ⭐ {score:.0f}")
 
     with col2:
         st.subheader("💼 Negociações sem valor definido")
-        if not neg_sem_valor:
+        if neg_sem_valor is None:
+            st.caption("Não foi possível consultar agora; tente atualizar em instantes.")
+        elif not neg_sem_valor:
             st.caption("Todas as negociações possuem valor previsto.")
         else:
-            for lead in neg_sem_valor[:5]:
+            for lead in neg_sem_valor:
                 nome = lead.get("nome", "Sem nome")
                 email = lead.get("email", "")
                 st.write(f"• **{nome}**  —  {email}")
 
+    # Leads parados além do prazo da etapa (agenda de follow-up do servidor)
+    st.subheader("⏰ Follow-ups pendentes")
+    lembretes = get_followup_scheduler().reminders(vendedor_email)
+    if not lembretes:
+        st.caption(
+            "Nenhum lead parado. Prazos sem atualização: "
+            + ", ".join(f"{status} {dias} dias" for status, dias in PRAZOS_DIAS.items())
+            + "."
+        )
+    else:
+        for lembrete in lembretes[:10]:
+            nome = lembrete.get("nome") or "Sem nome"
+            st.write(
+                f"• **{nome}**  —  em {lembrete['status']} sem atualização "
+                f"há {lembrete['parado_dias']} dia(s)"
+            )
+        if len(lembretes) > 10:
+            st.caption(f"… e mais {len(lembretes) - 10} lead(s) parados.")
+
     st.markdown("---")
     st.caption(
         "Use a aba **'Cadastrar Lead'** para registrar novas oportunidades e "
@@ -206,6 +241,47 @@ def _render_vendedor_home(user: dict):
 # ================== HOME ADMIN ==================
 
 
+def _render_trend(docs: list, vendedor_email, semanal: bool) -> None:
+    """Gráficos de tendência a partir dos documentos diários."""
+    if vendedor_email:
+        docs = [seller_view(d, vendedor_email) for d in docs]
+    if len(docs) < 2:
+        st.caption("As tendências aparecem a partir do segundo dia de métricas gravadas.")
+        return
+    linhas = []
+    for d in docs:
+        fechados = d["por_status"].get("faturado", 0) + d["por_status"].get("perdido", 0)
+        linhas.append(
+            {
+                "Dia": pd.Timestamp(d["dia"]),
+                "Criados": d.get("criados", 0),
+                "Conversão (%)": (
+                    d["por_status"].get("faturado", 0) / fechados * 100 if fechados else 0.0
+                ),
+            }
+        )
+    df = pd.DataFrame(linhas).set_index("Dia")
+    criados = df["Criados"]
+    if semanal:
+        criados = criados.resample("W-MON", label="left", closed="left").sum()
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.caption("Leads criados por " + ("semana" if semanal else "dia") + ".")
+        st.bar_chart(criados)
+    with col2:
+        st.caption("Faturados sobre fechados (faturados + perdidos), no fim de cada dia.")
+        st.line_chart(df["Conversão (%)"])
+
+    # O último ponto é hoje (sempre parcial); antes dele, dias sem o job
+    parciais = sum(1 for d in docs[:-1] if d.get("parcial"))
+    if parciais:
+        st.caption(
+            f"{parciais} dia(s) sem o fechamento do job diário: valores do último "
+            "momento em que o app gravou o dia."
+        )
+
+
 def _render_admin_home(user: dict):
     st.markdown(
         '<div class="section-title">🏢 Dashboard (Admin) - Visão da operação</div>',
@@ -219,17 +295,36 @@ def _render_admin_home(user: dict):
         unsafe_allow_html=True,
     )
 
-    filtro_email = st.text_input(
-        "Filtrar métricas por email de vendedor (opcional):",
-        value="",
-        placeholder="ex: vendedor@empresa.com",
-    ).strip() or None
+    # Filtros servidos pelo cubo de métricas (sem consulta ao Firestore)
+    cube = get_metrics_cube()
+    col_f1, col_f2, col_f3 = st.columns([2, 2, 3])
+    with col_f1:
+        diretorio = get_seller_directory()
+        filtro_email = st.selectbox(
+            "Filtrar métricas por vendedor (opcional):",
+            diretorio.emails(),
+            index=None,
+            placeholder="Todos os vendedores",
+            format_func=diretorio.label,
+        )
+    with col_f2:
+        filtro_origens = st.multiselect("Origem", cube.origens, placeholder="Todas")
+    with col_f3:
+        meses = [m for m in cube.meses if m != SEM_DATA]
+        if len(meses) >= 2:
+            mes_inicio, mes_fim = st.select_slider(
+                "Período (mês de criação)", options=meses, value=(meses[0], meses[-1])
+            )
+            if (mes_inicio, mes_fim) == (meses[0], meses[-1]):
+                mes_inicio = mes_fim = None
+        else:
+            mes_inicio = mes_fim = None
 
-    # Ticket médio global ainda vindo da função de stats (se estiver correta)
-    stats_global = get_leads_stats(vendedor_email=None)
+    # Ticket médio, mediana e p90 do acumulador compartilhado do snapshot
+    stats_global = get_snapshot_stats()
     ticket_medio = stats_global.get("ticket_medio", 0.0)
 
-    # Por status, total, abertos, faturados, perdidos calculados via list_leads
+    # Por status, total, abertos, faturados, perdidos calculados via snapshot
     por_status, total, faturados, perdidos, abertos = _compute_status_metrics(
         vendedor_email=None
     )
@@ -245,7 +340,21 @@ def _render_admin_home(user: dict):
     with col3:
         st.metric("Leads faturados", faturados)
     with col4:
-        st.metric("Ticket médio (R$)", _format_currency(ticket_medio))
+        st.metric("Ticket médio (R$)", format_brl(ticket_medio))
+    _caption_ticket(stats_global)
+
+    # Leads fechados antigos saem do funil para o arquivo (services/archive_service.py)
+    try:
+        arquivo = get_archive_totals()
+    except FirestoreIndisponivel:
+        arquivo = None
+    if arquivo and arquivo["total"]:
+        st.caption(
+            f"📦 Arquivo (fora dos números acima): "
+            f"{arquivo['por_status']['faturado']} faturados "
+            f"({format_brl(arquivo['valor_por_status']['faturado'])}) e "
+            f"{arquivo['por_status']['perdido']} perdidos."
+        )
 
     st.markdown("---")
 
@@ -272,6 +381,94 @@ def _render_admin_home(user: dict):
 
     st.markdown("---")
 
+    # Velocidade do funil (agregado incremental do histórico de status)
+    st.markdown("### ⏱️ Velocidade do funil")
+    st.caption(
+        "Tempo médio que os leads ficam em cada etapa e quanto de cada etapa "
+        "avança para a próxima."
+    )
+    velocidade = get_funnel_velocity()
+    if not any(v["saidas"] for v in velocidade):
+        st.caption("Ainda não há mudanças de status suficientes para calcular.")
+    else:
+        df_velocidade = pd.DataFrame(
+            [
+                {
+                    "Etapa": v["etapa"],
+                    "Tempo médio (dias)": round(v["tempo_medio_dias"], 1),
+                    "Saídas": v["saidas"],
+                    "Avançaram (%)": round(v["conversao_proxima"], 1),
+                    "Perdidos (%)": round(v["perda"], 1),
+                }
+                for v in velocidade
+            ]
+        )
+        st.dataframe(df_velocidade, width="stretch", hide_index=True)
+
+    st.markdown("---")
+
+    # Previsão ponderada: valor em aberto × chance de faturar (etapa, vendedor, origem)
+    st.markdown("### 🔮 Previsão de faturamento")
+    st.caption(
+        "Quanto do pipeline em aberto deve virar faturado, pela chance histórica "
+        "de cada etapa ajustada pelo desempenho do vendedor e da origem."
+    )
+    previsao = get_revenue_forecast()
+    if not previsao["leads_abertos"]:
+        st.caption("Nenhum lead em aberto.")
+    else:
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            st.metric("Pipeline em aberto", format_brl(previsao["total_aberto"]))
+        with c2:
+            st.metric("Faturamento esperado", format_brl(previsao["total_esperado"]))
+        with c3:
+            st.metric("Taxa de ganho histórica", f"{previsao['taxa_geral'] * 100:.1f}%")
+        if previsao["sem_valor"]:
+            st.caption(f"{previsao['sem_valor']} lead(s) em aberto sem valor previsto não entram na conta.")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            df_etapas = pd.DataFrame(
+                [
+                    {
+                        "Etapa": e["etapa"],
+                        "Leads": e["leads"],
+                        "Chance (%)": round(e["probabilidade"] * 100, 1),
+                        "Em aberto": format_brl(e["valor_aberto"]),
+                        "Esperado": format_brl(e["esperado"]),
+                    }
+                    for e in previsao["por_etapa"]
+                ]
+            )
+            st.dataframe(df_etapas, width="stretch", hide_index=True)
+        with col2:
+            df_prev_vend = pd.DataFrame(
+                [
+                    {
+                        "Vendedor": v["vendedor"] or "Não atribuído",
+                        "Leads": v["leads"],
+                        "Em aberto": format_brl(v["valor_aberto"]),
+                        "Esperado": format_brl(v["esperado"]),
+                    }
+                    for v in previsao["por_vendedor"]
+                ]
+            )
+            st.dataframe(df_prev_vend, width="stretch", hide_index=True)
+
+    st.markdown("---")
+
+    # Tendências: um documento de métricas por dia (services/daily_metrics.py)
+    st.markdown("### 📅 Tendências")
+    dias = st.select_slider("Período (dias)", options=[7, 30, 90], value=30)
+    st.caption(
+        "Leads criados e taxa de conversão ao longo do tempo"
+        + (f" de `{filtro_email}`." if filtro_email else " (toda a empresa).")
+    )
+    _render_trend(get_daily_trend(dias), filtro_email, semanal=dias > 30)
+
+    st.markdown("---")
+
     # Ranking de vendedores (usando todos os leads)
     st.markdown("### 🏅 Ranking de vendedores")
 
@@ -324,16 +521,28 @@ def _render_admin_home(user: dict):
 
     st.markdown("---")
 
-    # Se admin filtrou um vendedor específico, mostrar um resumo comparativo
-    if filtro_email:
-        st.markdown(f"### 👤 Resumo do vendedor: `{filtro_email}`")
-        stats_vend = get_leads_stats(vendedor_email=filtro_email)
-
-        # Por status calculado via list_leads também
-        por_status_v, total_v, faturados_v, perdidos_v, abertos_v = _compute_status_metrics(
-            vendedor_email=filtro_email
+    # Se admin filtrou, mostrar um resumo do recorte (direto do cubo)
+    if filtro_email or filtro_origens or mes_inicio:
+        descricao = []
+        if filtro_email:
+            descricao.append(f"vendedor `{filtro_email}`")
+        if filtro_origens:
+            descricao.append("origem " + ", ".join(f"`{o}`" for o in filtro_origens))
+        if mes_inicio:
+            descricao.append(f"de `{mes_inicio}` a `{mes_fim}`")
+        st.markdown(f"### 👤 Resumo filtrado: {' · '.join(descricao)}")
+
+        recorte = cube.slice(
+            vendedor=filtro_email,
+            origens=filtro_origens,
+            mes_inicio=mes_inicio,
+            mes_fim=mes_fim,
         )
-        ticket_v = stats_vend.get("ticket_medio", 0.0)
+        por_status_v = recorte.por_status()
+        total_v = recorte.total
+        faturados_v = por_status_v["faturado"]
+        perdidos_v = por_status_v["perdido"]
+        abertos_v = total_v - faturados_v - perdidos_v
         conv_v = (faturados_v / total_v) * 100 if total_v else 0.0
 
         c1, c2, c3, c4 = st.columns(4)
@@ -344,13 +553,22 @@ def _render_admin_home(user: dict):
         with c3:
             st.metric("Leads faturados", faturados_v)
         with c4:
-            st.metric("Ticket médio (R$)", _format_currency(ticket_v))
+            st.metric("Ticket médio (R$)", format_brl(recorte.ticket_medio))
 
-        c5, c6 = st.columns(2)
+        c5, c6, c7 = st.columns(3)
         with c5:
             st.metric("Taxa de conversão", f"{conv_v:.1f}%")
         with c6:
             st.metric("Leads perdidos", perdidos_v)
+        with c7:
+            st.metric("Valor previsto", format_brl(float(recorte.valor.sum())))
+
+        st.bar_chart(
+            _build_status_dataframe(por_status_v),
+            x="Status",
+            y="Leads",
+            width="stretch",
+        )
 
     st.markdown("---")
     st.caption(
@@ -358,6 +576,15 @@ def _render_admin_home(user: dict):
         "de vendedor para analisar o pipeline individual de cada membro da equipe."
     )
 
+    # Diagnóstico sob demanda: percorre o snapshot inteiro
+    with st.expander("🧠 Memória do servidor"):
+        st.caption(
+            "Os leads ficam uma vez só no servidor, compartilhados entre as sessões; "
+            "cada sessão guarda apenas ids e filtros."
+        )
+        if st.button("Medir agora"):
+            st.json(memory_report())
+
 
 # ================== ROUTER ==================
 
@@ -365,6 +592,13 @@ def _render_admin_home(user: dict):
 def render_home_page(user: dict):
     role = user.get("role", "user")
 
+    snapshot = get_snapshot()
+    if snapshot.stale_since:
+        st.warning(
+            "⚠️ O banco não está respondendo. Mostrando os dados sincronizados até "
+            f"{snapshot.stale_since:%d/%m %H:%M} (UTC)."
+        )
+
     if role == "admin":
         _render_admin_home(user)
     else:
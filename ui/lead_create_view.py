@@ -1,5 +1,6 @@
 import streamlit as st
 from services.leads_service import create_lead
+from services.seller_directory import get_seller_directory
 
 
 def render_lead_create_page(user: dict):
@@ -32,13 +33,22 @@ def render_lead_create_page(user: dict):
             )
 
         st.markdown("### Vendedor responsável")
-        vendedor_email = st.text_input(
+        diretorio = get_seller_directory()
+        vendedores = diretorio.emails(com_conta=True)
+        vendedor_email = st.selectbox(
             "Email do vendedor",
-            value=usuario_email,
-            help="Digite o email do vendedor que ficará responsável por este lead.",
+            vendedores,
+            index=vendedores.index(usuario_email) if usuario_email in vendedores else None,
+            placeholder="Digite para buscar",
+            format_func=diretorio.label,
+            help="Vendedor (usuário cadastrado) que ficará responsável por este lead.",
         )
 
         observacoes = st.text_area("Observações", height=80)
+        permitir_duplicado = st.checkbox(
+            "Cadastrar mesmo se já existir lead com este email/telefone",
+            value=False,
+        )
 
         submitted = st.form_submit_button("Cadastrar lead")
         if submitted:
@@ -55,6 +65,7 @@ def render_lead_create_page(user: dict):
                     valor_previsto=valor_previsto,
                     origem=origem,
                     observacoes=observacoes,
+                    permitir_duplicado=permitir_duplicado,
                 )
                 if ok:
                     st.success(msg)
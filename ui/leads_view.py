@@ -1,10 +1,107 @@
+import html
+import threading
+from collections import OrderedDict
+
 import streamlit as st
-from services.leads_service import (
-    list_leads,
-    update_lead_status,
-    update_lead_fields,  # função que atualiza valor/observações
-    STATUS_PIPELINE,
-)
+from services.leads_service import STATUS_PIPELINE, parse_valor_previsto
+from services.leads_sync import get_snapshot
+from services.lead_scoring import get_lead_scorer
+from services.seller_directory import get_seller_directory
+from services.status_moves import submit_status_move
+from services.write_behind import get_write_behind  # grava valor/observações em background
+from services.memory_report import deep_sizeof, register_shared
+from services.metrics_registry import record_cache
+from services.resilience import GravacaoIncerta
+from ui.formatting import format_brl
+
+
+def _card_html(lead: dict, status: str, role: str, score) -> str:
+    """HTML de um card do Kanban (sem os botões)."""
+    # Campos do lead vêm de formulários e da ingestão pública: sempre escapados
+    nome = html.escape(str(lead.get("nome") or "Sem nome"))
+    email = html.escape(str(lead.get("email") or ""))
+    telefone = html.escape(str(lead.get("telefone") or ""))
+    valor = lead.get("valor_previsto")
+    vendedor = html.escape(str(lead.get("vendedor_email") or ""))
+
+    # Chips opcionais
+    valor_html = ""
+    if valor not in (None, ""):
+        valor_html = (
+            f"<span class='kanban-chip'>💰 {html.escape(format_brl(valor, padrao=str(valor)))}</span>"
+        )
+
+    if score is not None:
+        valor_html += (
+            f"<span class='kanban-chip-small' title='Prioridade'>⭐ {score:.0f}</span>"
+        )
+
+    if role == "admin" and vendedor:
+        vendedor_html = f"<span class='kanban-chip-small'>👤 {vendedor}</span>"
+    else:
+        vendedor_html = ""
+
+    # Classe extra para leads perdidos
+    card_class = "kanban-card"
+    if status == "perdido":
+        card_class += " kanban-card-lost"
+
+    # Sem indentação: o fragmento fica guardado no cache (e emoji ocupa 4 bytes/char)
+    return (
+        f'<div class="{card_class}">'
+        f'<div class="kanban-card-header"><div class="kanban-card-title">{nome}</div></div>'
+        f'<div class="kanban-card-sub">{email}</div>'
+        f'<div class="kanban-card-sub">{telefone}</div>'
+        f'<div class="kanban-card-meta"><div>{valor_html}</div><div>{vendedor_html}</div></div>'
+        "</div>"
+    )
+
+
+class _CardCache:
+    """
+    LRU dos cards já montados, compartilhado entre as sessões. A chave é
+    (id, updated_at, papel) mais o que muda o card sem passar pelo banco:
+    status de um movimento otimista, valor de uma edição pendente no
+    write-behind e o score arredondado (como aparece no chip).
+    """
+
+    def __init__(self, max_itens: int = 5000):
+        self.max_itens = max_itens
+        self._itens: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, lead: dict, status: str, role: str, score) -> str:
+        valor = lead.get("valor_previsto")
+        chave = (
+            lead["id"],
+            lead.get("updated_at"),
+            role,
+            status,
+            valor if isinstance(valor, (int, float, str, type(None))) else str(valor),
+            None if score is None else round(score),
+        )
+        with self._lock:
+            html = self._itens.get(chave)
+            if html is not None:
+                self._itens.move_to_end(chave)
+                self.hits += 1
+            else:
+                self.misses += 1
+        record_cache("kanban_cards", html is not None)
+        if html is not None:
+            return html
+        html = _card_html(lead, status, role, score)
+        with self._lock:
+            self._itens[chave] = html
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+        return html
+
+
+_CARDS = _CardCache()
+register_shared("kanban_cards", lambda: deep_sizeof(_CARDS._itens))
 
 
 def _proximo_status(status_atual: str):
@@ -30,18 +127,82 @@ def _status_anterior(status_atual: str):
 
 
 def _ensure_state_keys():
-    if "current_lead" not in st.session_state:
-        st.session_state["current_lead"] = None
+    if "current_lead_id" not in st.session_state:
+        # Só o id: o lead em si fica no snapshot compartilhado
+        st.session_state["current_lead_id"] = None
+    if "kanban_moves" not in st.session_state:
+        # lead_id -> movimento otimista ainda não confirmado
+        st.session_state["kanban_moves"] = {}
+
+
+# ===== MOVIMENTOS OTIMISTAS =====
+def _mover_lead(lead_id: str, nome: str, de: str, para: str):
+    """Callback dos botões: aplica a mudança localmente e grava em background."""
+    st.session_state.kanban_moves[lead_id] = {
+        "de": de,
+        "para": para,
+        "nome": nome,
+        "future": submit_status_move(lead_id, para),
+    }
+
+
+def _resolve_moves():
+    """Confirma os movimentos já gravados e desfaz (com aviso) os que falharam."""
+    moves = st.session_state.kanban_moves
+    confirmados = False
+    for lead_id, move in list(moves.items()):
+        future = move["future"]
+        if not future.done():
+            continue
+        del moves[lead_id]
+        try:
+            ok, msg = future.result()
+        except GravacaoIncerta:
+            # Pode ter sido gravado: o sync abaixo mostra o status real
+            confirmados = True
+            st.toast(
+                f"⚠️ Sem confirmação do movimento de **{move['nome']}** para "
+                f"{move['para']}. Confira o status antes de mover de novo."
+            )
+            continue
+        except Exception as e:
+            ok, msg = False, str(e)
+        if ok:
+            confirmados = True
+        else:
+            st.toast(
+                f"❌ Não foi possível mover **{move['nome']}** para {move['para']}. {msg}"
+            )
+    if confirmados:
+        # Traz a versão gravada para o snapshot antes de tirar a sobreposição
+        get_snapshot(sync=False).sync(force=True)
+
+
+def _apply_moves(leads):
+    moves = st.session_state.kanban_moves
+    return [
+        {**lead, "status": moves[lead["id"]]["para"]} if lead["id"] in moves else lead
+        for lead in leads
+    ]
+
+
+@st.fragment(run_every=1.0)
+def _watch_pending_moves():
+    """Enquanto há movimentos pendentes, re-renderiza quando algum terminar."""
+    moves = st.session_state.get("kanban_moves") or {}
+    if any(m["future"].done() for m in moves.values()):
+        st.rerun()
 
 
 # ===== MODAL NATIVO DO STREAMLIT =====
 @st.dialog("✏️ Detalhes do lead")
 def show_lead_details_dialog():
     """Modal central para editar valor e observações do lead selecionado."""
-    lead = st.session_state.get("current_lead")
+    lead = get_snapshot(sync=False).get(st.session_state.get("current_lead_id"))
     if not lead:
         st.write("Nenhum lead selecionado.")
         return
+    lead = get_write_behind().apply_pending([lead])[0]
 
     lead_id = lead.get("id")
     nome = lead.get("nome", "Sem nome")
@@ -71,20 +232,24 @@ def show_lead_details_dialog():
             fechar = st.form_submit_button("Fechar")
 
     if salvar:
+        try:
+            valor_num = parse_valor_previsto(novo_valor)
+        except ValueError:
+            st.error("Valor previsto inválido. Use, por exemplo, 1.500,00.")
+            return
         campos = {
-            "valor_previsto": novo_valor,
+            "valor_previsto": valor_num,
             "observacoes": novas_obs,
         }
-        ok, msg = update_lead_fields(lead_id, campos)
-        if ok:
-            st.success(msg)
-        else:
-            st.error(msg)
-        st.session_state.current_lead = None
+        # Confirma na hora; a gravação (mesclada com outras edições do
+        # mesmo lead) acontece em background.
+        get_write_behind().enqueue(lead_id, campos)
+        st.toast("Lead atualizado.")
+        st.session_state.current_lead_id = None
         st.rerun()
 
     elif fechar:
-        st.session_state.current_lead = None
+        st.session_state.current_lead_id = None
         st.rerun()
 
 
@@ -110,11 +275,15 @@ def render_leads_page(user: dict):
             unsafe_allow_html=True,
         )
 
-        filtro_email = st.text_input(
-            "Filtrar por email do vendedor (deixe em branco para ver todos):",
-            value="",
+        # Lista em cache: trocar o filtro não consulta o Firestore
+        diretorio = get_seller_directory()
+        vendedor_email = st.selectbox(
+            "Filtrar por vendedor (deixe em branco para ver todos):",
+            diretorio.emails(),
+            index=None,
+            placeholder="Todos os vendedores (digite para buscar)",
+            format_func=diretorio.label,
         )
-        vendedor_email = filtro_email or None
     else:
         st.markdown(
             '<div class="section-title">📊 Meu pipeline de leads (Kanban)</div>',
@@ -132,13 +301,44 @@ def render_leads_page(user: dict):
     st.markdown("---")
     st.subheader("📌 Pipeline Kanban")
 
+    write_behind = get_write_behind()
+    pendentes = write_behind.depth()
+    if pendentes:
+        st.caption(f"🔄 {pendentes} edição(ões) sendo sincronizada(s)…")
+
+    _resolve_moves()
+    if st.session_state.kanban_moves:
+        _watch_pending_moves()
+
+    # Uma leitura (delta) do snapshot para o quadro todo, agrupada aqui
+    snapshot = get_snapshot()
+    if snapshot.stale_since:
+        st.warning(
+            "⚠️ O banco não está respondendo. O quadro mostra os dados sincronizados até "
+            f"{snapshot.stale_since:%d/%m %H:%M} (UTC)."
+        )
+    leads = _apply_moves(
+        write_behind.apply_pending(snapshot.leads(vendedor_email=vendedor_email))
+    )
+    # Cada coluna sai ordenada pela prioridade (score), maior primeiro
+    scorer = get_lead_scorer()
+    leads_por_status = {status: [] for status in STATUS_PIPELINE}
+    for lead in scorer.sort_leads(leads):
+        if lead.get("status") in leads_por_status:
+            leads_por_status[lead["status"]].append(lead)
+    visiveis = [l["id"] for l in leads]
+    for falha in write_behind.take_failures(visiveis):
+        st.error(
+            f"Não foi possível salvar a edição do lead {falha['lead_id']}: {falha['erro']}"
+        )
+
     cols = st.columns(len(STATUS_PIPELINE))
 
     for idx, status in enumerate(STATUS_PIPELINE):
         with cols[idx]:
             st.markdown('<div class="kanban-column">', unsafe_allow_html=True)
 
-            leads_col = list_leads(status=status, vendedor_email=vendedor_email)
+            leads_col = leads_por_status[status]
             qtd = len(leads_col)
 
             # Cabeçalho da coluna
@@ -157,58 +357,9 @@ def render_leads_page(user: dict):
             else:
                 for lead in leads_col:
                     nome = lead.get("nome", "Sem nome")
-                    email = lead.get("email", "")
-                    telefone = lead.get("telefone", "")
-                    valor = lead.get("valor_previsto")
-                    vendedor = lead.get("vendedor_email", "")
-
-                    # Formatação do valor
-                    valor_str = ""
-                    if valor not in (None, ""):
-                        try:
-                            valor_float = float(valor)
-                            valor_str = (
-                                "R$ "
-                                + f"{valor_float:,.2f}"
-                                .replace(",", "X")
-                                .replace(".", ",")
-                                .replace("X", ".")
-                            )
-                        except Exception:
-                            valor_str = str(valor)
-
-                    # Chips opcionais
-                    if valor_str:
-                        valor_html = f"<span class='kanban-chip'>💰 {valor_str}</span>"
-                    else:
-                        valor_html = ""
-
-                    if role == "admin" and vendedor:
-                        vendedor_html = (
-                            f"<span class='kanban-chip-small'>👤 {vendedor}</span>"
-                        )
-                    else:
-                        vendedor_html = ""
-
-                    # Classe extra para leads perdidos
-                    card_class = "kanban-card"
-                    if status == "perdido":
-                        card_class += " kanban-card-lost"
-
-                    # Card visual
-                    card_html = f"""
-                        <div class="{card_class}">
-                            <div class="kanban-card-header">
-                                <div class="kanban-card-title">{nome}</div>
-                            </div>
-                            <div class="kanban-card-sub">{email or ""}</div>
-                            <div class="kanban-card-sub">{telefone or ""}</div>
-                            <div class="kanban-card-meta">
-                                <div>{valor_html}</div>
-                                <div>{vendedor_html}</div>
-                            </div>
-                        </div>
-                    """
+                    # Score só nas colunas abertas
+                    score = None if status in ("faturado", "perdido") else scorer.score_of(lead["id"])
+                    card_html = _CARDS.get_or_render(lead, status, role, score)
                     st.markdown(card_html, unsafe_allow_html=True)
 
                     # Linha de botões icon-only, coladinhos no card
@@ -220,49 +371,35 @@ def render_leads_page(user: dict):
                     # Voltar uma etapa
                     if status_anterior:
                         with col_prev:
-                            if st.button(
+                            st.button(
                                 "⬅",
                                 key=f"back_{lead['id']}_{status}",
                                 help=f"Voltar para {status_anterior}",
-                            ):
-                                ok, msg = update_lead_status(
-                                    lead["id"], status_anterior
-                                )
-                                if ok:
-                                    st.success(msg)
-                                    st.rerun()
-                                else:
-                                    st.error(msg)
+                                on_click=_mover_lead,
+                                args=(lead["id"], nome, status, status_anterior),
+                            )
 
                     # Marcar como perdido (se ainda não estiver perdido)
                     if status != "perdido":
                         with col_perdido:
-                            if st.button(
+                            st.button(
                                 "❌",
                                 key=f"lost_{lead['id']}_{status}",
                                 help="Marcar lead como perdido",
-                            ):
-                                ok, msg = update_lead_status(lead["id"], "perdido")
-                                if ok:
-                                    st.success(msg)
-                                    st.rerun()
-                                else:
-                                    st.error(msg)
+                                on_click=_mover_lead,
+                                args=(lead["id"], nome, status, "perdido"),
+                            )
 
                     # Avançar uma etapa
                     if proximo:
                         with col_next:
-                            if st.button(
+                            st.button(
                                 "➡",
                                 key=f"next_{lead['id']}_{status}",
                                 help=f"Avançar para {proximo}",
-                            ):
-                                ok, msg = update_lead_status(lead["id"], proximo)
-                                if ok:
-                                    st.success(msg)
-                                    st.rerun()
-                                else:
-                                    st.error(msg)
+                                on_click=_mover_lead,
+                                args=(lead["id"], nome, status, proximo),
+                            )
 
                     # Detalhes do lead (ícone ⋯) -> abre modal nativo
                     with col_details:
@@ -271,7 +408,7 @@ def render_leads_page(user: dict):
                             key=f"details_{lead['id']}_{status}",
                             help="Ver/editar detalhes do lead",
                         ):
-                            st.session_state.current_lead = lead
+                            st.session_state.current_lead_id = lead["id"]
                             show_lead_details_dialog()
 
             st.markdown("</div>", unsafe_allow_html=True)
@@ -26,9 +26,13 @@ def _do_login(email: str, password: str):
         st.error(f"Usuário ou senha inválidos. {msg}")
         return
 
-    # Aqui result é o dict com os dados do usuário (como antes)
+    # Na sessão só o necessário para as telas (nada de hash de senha)
     st.session_state["logged"] = True
-    st.session_state["user"] = result
+    st.session_state["user"] = {
+        "email": result.get("email") or email,
+        "nome": result.get("nome", ""),
+        "role": result.get("role", "user"),
+    }
 
     st.success("Login realizado com sucesso! Redirecionando…")
     st.rerun()